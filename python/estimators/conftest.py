@@ -0,0 +1,6 @@
+# conftest.py
+#
+# Developed by Liam McInroy
+#
+# Puts this directory on the path, so that the tests import the estimators
+# package from the source tree
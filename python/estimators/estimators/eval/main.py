@@ -4,21 +4,27 @@
 
 
 import argparse
+import os
 
 import numpy as np
 
-from estimators.models.bayesian import BayesNet
+from estimators.models.bayesian import BayesNetGenerator
 from estimators.models.evaluator import ModelEvaluator
 from estimators.models.cvm import CVMGenerator
 from estimators.models.dummy import DummyGenerator
 from estimators.models.feature_selection import FeatureSelectionPipeline
 from estimators.models.mim import MIMGenerator
 from estimators.models.modular import ModularGenerator
+from estimators.models.racing import RacingEvaluator
+from estimators.models.results import ResultsLog
 from estimators.models.search import (
     SimulatedAnnealingFeatureSearch,
     GeneticFeatureSearch,
-    MIMnFeatureSearch
+    MIMnFeatureSearch,
+    FloatingFeatureSearch
 )
+from estimators.models.store import ScoreStore
+from estimators.models.structure import StructureCache
 
 
 def parse_args():
@@ -31,10 +37,101 @@ def parse_args():
                         help='Whether to test all selected models.')
     parser.add_argument('--models', nargs='+', type=str,
                         help='The keys for the models to be tested.')
+    parser.add_argument('--score-store', type=str,
+                        help='The SQLite file to store the scores of the '
+                             'feature subsets tried by the searchers in, so '
+                             'that they are reused between runs.')
+    parser.add_argument('--structure-cache', type=str,
+                        help='The directory to save the learned BayesNet '
+                             'structures in, so that they are reused between '
+                             'runs.')
+    parser.add_argument('--structure-algorithm', type=str, default='exact',
+                        choices=['exact', 'branch-and-bound'],
+                        help='The structure search of the BayesNets. Only '
+                             '"branch-and-bound" counts their statistics, so '
+                             'that they are updated between folds rather '
+                             'than refit.')
+    parser.add_argument('--compiled', action='store_true',
+                        help='Whether to precompute the posterior tables of '
+                             'the BayesNets.')
+    parser.add_argument('--search-time-budget', type=float,
+                        help='The seconds each feature search may run for '
+                             'before stopping with its best support.')
+    parser.add_argument('--checkpoint-dir', type=str,
+                        help='The directory to checkpoint the feature '
+                             'searches in, so that an interrupted run '
+                             'resumes them.')
+    parser.add_argument('-j', '--n-jobs', type=int,
+                        help='The number of processes to train the models '
+                             'of each fold in (-1 for every cpu).')
+    parser.add_argument('--seed', type=int,
+                        help='The seed of the evaluation, so that its results '
+                             'are reproducible.')
+    parser.add_argument('--results', type=str,
+                        help='The file to append the result of each fold and '
+                             'model to as it completes, so that an '
+                             'interrupted run resumes where it stopped.')
+    parser.add_argument('--race-confidence', type=float,
+                        help='If given, then a model which a paired t-test '
+                             'finds worse than the best model with this '
+                             'confidence stops being trained.')
+    parser.add_argument('--race-min-folds', type=int, default=30,
+                        help='The number of folds every model runs before '
+                             'any are eliminated when racing.')
+    parser.add_argument('--tolerance', type=float,
+                        help='If given, then the folds run in a random order '
+                             'until the 95%% confidence intervals of each '
+                             'model\'s test accuracy and feature frequencies '
+                             'are within this of their means.')
+    parser.add_argument('--max-folds', type=int,
+                        help='If given, then the folds run in a random order '
+                             'and at most this many are run.')
     return parser.parse_args()
 
 
+def save_training_data(training_data, path='train_dat.csv'):
+    """Saves the scores of each model on the folds done so far, replacing
+    the file at once so that it is never left partially written
+
+    Arguments:
+        training_data: The dict of each model's name followed by its
+            training and test scores on each fold
+        path: The csv file to save to
+    """
+    train_dat_dump = np.full((len(training_data),
+                              max(len(data) for data in
+                                  training_data.values())),
+                             None,
+                             dtype=object)
+
+    for i, (model_name, model_data) in enumerate(training_data.items()):
+        for j, elem in enumerate(model_data):
+            train_dat_dump[i, j] = elem
+
+    np.savetxt(path + '.tmp', train_dat_dump, delimiter=',', fmt='%s')
+    os.replace(path + '.tmp', path)
+
+
 def main():
+    args = parse_args()
+
+    store = ScoreStore(path=args.score_store)
+    structure_cache = StructureCache(directory=args.structure_cache)
+    # every net shares the structures learned on the same support and data
+    BayesNet = BayesNetGenerator(structure_cache=structure_cache,
+                                 structure_algorithm=args.structure_algorithm,
+                                 compiled=args.compiled)
+    if args.checkpoint_dir is not None:
+        os.makedirs(args.checkpoint_dir, exist_ok=True)
+
+    def search_args(name):
+        """The arguments shared by the searcher of each model
+        """
+        checkpoint = None
+        if args.checkpoint_dir is not None:
+            checkpoint = os.path.join(args.checkpoint_dir, name + '.pkl')
+        return {'store': store, 'time_budget': args.search_time_budget,
+                'checkpoint': checkpoint}
 
     models = {
         'cvm': CVMGenerator(),
@@ -44,18 +141,23 @@ def main():
         'cvm_bayes': CVMGenerator(estimator=BayesNet),
         'mim_bayes': MIMGenerator(estimator=BayesNet, n=5),
         'annealing_bayes': FeatureSelectionPipeline(
-            SimulatedAnnealingFeatureSearch(BayesNet, iterations=20)),
+            SimulatedAnnealingFeatureSearch(BayesNet, iterations=20,
+                                            **search_args('annealing_bayes'))),
         'genetic_bayes': FeatureSelectionPipeline(
-            GeneticFeatureSearch(BayesNet, population=30, generations=100)),
+            GeneticFeatureSearch(BayesNet, population=30, generations=100,
+                                 **search_args('genetic_bayes'))),
         'genetic_mim_bayes': FeatureSelectionPipeline(
             GeneticFeatureSearch(MIMGenerator(estimator=BayesNet),
-                                 population=20, generations=20)),
+                                 population=20, generations=20,
+                                 **search_args('genetic_mim_bayes'))),
         'exhaustive_mim_bayes': FeatureSelectionPipeline(
-            MIMnFeatureSearch(estimator=BayesNet, min_n=3, max_n=10)),
+            MIMnFeatureSearch(estimator=BayesNet, min_n=3, max_n=10,
+                              **search_args('exhaustive_mim_bayes'))),
+        'floating_bayes': FeatureSelectionPipeline(
+            FloatingFeatureSearch(BayesNet, max_features=10, patience=3,
+                                  **search_args('floating_bayes'))),
         }
 
-    args = parse_args()
-
     train_models = models
     if not args.all:
         train_models = {model_name: models[model_name]
@@ -65,30 +167,57 @@ def main():
     X = dataset[:, 0:-1]
     y = dataset[:, -1].reshape(-1, 1)
 
-    model_evaluator = ModelEvaluator(train_models, X, y)
+    model_evaluator = ModelEvaluator(train_models, X, y,
+                                     random_state=args.seed)
 
     training_data = {model_name: (model_name,)
                      for model_name, _ in train_models.items()}
 
-    for i, fold_results in enumerate(model_evaluator.run(len(X) - 1)):
+    results = None
+    if args.results is not None:
+        results = ResultsLog(args.results)
+
+    racing = None
+    if args.race_confidence is not None:
+        racing = RacingEvaluator(min_folds=args.race_min_folds,
+                                 confidence=args.race_confidence, verbose=1)
+
+    n_splits = len(X) - 1
+    folds = model_evaluator.run(n_splits, n_jobs=args.n_jobs,
+                                results=results, racing=racing,
+                                tolerance=args.tolerance,
+                                max_folds=args.max_folds,
+                                counters=(store, structure_cache))
+    previous = None
+    for fold_results in folds:
+        # the last results are the totals over the folds (which may stop
+        # early), so each fold's are saved once the next results arrive
+        if previous is not None:
+            for model_name, _ in train_models.items():
+                if model_name in previous[0]:
+                    training_data[model_name] += previous[0][model_name]
+            save_training_data(training_data)
+        previous = fold_results
+
         print('\tFold finished. Results:')
         print(fold_results)
         print()
 
-        if i < 5:
-            for model_name, _ in train_models.items():
-                training_data[model_name] += fold_results[0][model_name]
-
-    print('Cross validation done! Saving training data to train_dat.csv')
-    train_dat_dump = np.full((len(train_models), 11),
-                             None,
-                             dtype=object)
-
-    for i, (model_name, model_data) in enumerate(training_data.items()):
-        for j, elem in enumerate(model_data):
-            train_dat_dump[i, j] = elem
-
-    np.savetxt('train_dat.csv', train_dat_dump, delimiter=',', fmt='%s')
+    print('Cross validation done! Score store hit rate:', store.hit_rate)
+    print('Structure cache hit rate:', structure_cache.hit_rate,
+          'seconds saved:', structure_cache.time_saved)
+    print('Test accuracies:')
+    for model_name, score in fold_results[0].items():
+        report = '\t{}: {}'.format(model_name, score)
+        if model_name in model_evaluator.intervals:
+            intervals = model_evaluator.intervals[model_name]
+            report += ' +/- {} (feature frequencies +/- {})'.format(
+                intervals['accuracy'], intervals['support'])
+        if model_name in model_evaluator.eliminated:
+            report += ' (eliminated after fold {})'.format(
+                model_evaluator.eliminated[model_name])
+        print(report)
+    print('Training data saved to train_dat.csv')
 
     return
 
@@ -13,49 +13,148 @@ from sklearn.model_selection import KFold
 
 from pomegranate import BayesianNetwork
 
-from estimators.models.bayesian import BayesNet
+from estimators.models.bayesian import BayesNet, BayesNetGenerator
 from estimators.models.feature_selection import FeatureSelectionPipeline
 from estimators.models.modular import ModularGenerator
+from estimators.models.racing import half_width
+from estimators.models.results import ResultsLog
 from estimators.models.search import MIMnFeatureSearch
+from estimators.models.store import ScoreStore, fingerprint
+from estimators.models.structure import StructureCache
 
 
 # Change this based on the dataset supplied. Should cover all the features
 # which are being considered (in the joint table)
 MODULES_SUPPORT = list(range(2, 41))
 
+# The scores of the feature subsets tried during feature selection. Give it a
+# path to reuse them between runs on the same dataset
+SCORE_STORE = ScoreStore()
+
+# The structures learned during feature selection, which are reused when a
+# support is fit on the same data again (and otherwise warm start the
+# search). Give it a directory to reuse them between runs. The nets use the
+# branch-and-bound search so that they learn from the count tables the
+# feature search shares, and so that the structure cached for a support on
+# another fold can warm start its search
+STRUCTURE_CACHE = StructureCache()
+CACHED_BAYES_NET = BayesNetGenerator(structure_cache=STRUCTURE_CACHE,
+                                     structure_algorithm='branch-and-bound')
+
 TRAIN_MODEL_T = ModularGenerator(
         cum_estimator=FeatureSelectionPipeline(
-           MIMnFeatureSearch(estimator=BayesNet, min_n=5, max_n=15)),
-        ind_estimators=BayesNet, modules_support=MODULES_SUPPORT)
+           MIMnFeatureSearch(estimator=CACHED_BAYES_NET, min_n=5, max_n=15,
+                             store=SCORE_STORE)),
+        ind_estimators=CACHED_BAYES_NET, modules_support=MODULES_SUPPORT)
 
 # Change this based on the number of cross validation folds desired.
 # I suggest leave one out cross validation, so change to the number of
 # datapoints minus one
 POPULATION_N = 223
 
+# The number of folds run before the confidence intervals of an adaptive
+# feature selection are trusted to stop it, and their confidence
+MIN_FOLDS = 10
+CONFIDENCE = .95
+
 
 def select_features(**kwargs):
-    """A method to select the most popular features from the population
+    """A method to select the most popular features from the population. If
+    given a results path, then each fold's accuracy and support are logged
+    to it as they complete, and the folds already in it are skipped. If
+    given a tolerance (or max_folds), then the folds run in a random order
+    until the confidence intervals of the accuracy and of the features'
+    probabilities are within the tolerance (or max_folds have run). Given a
+    random_state, the shuffle and that order are seeded by it
     """
     data = kwargs.get('dataset')
+    random_state = kwargs.get('random_state')
     ind = np.arange(len(data))
-    np.random.shuffle(ind)
+    if random_state is None:
+        np.random.shuffle(ind)
+    else:
+        np.random.RandomState(random_state).shuffle(ind)
+
+    tolerance = kwargs.get('tolerance')
+    max_folds = kwargs.get('max_folds')
+    adaptive = tolerance is not None or max_folds is not None
+    order = np.arange(POPULATION_N)
+    if adaptive and random_state is None:
+        order = np.random.permutation(POPULATION_N)
+    elif adaptive:
+        order = np.random.RandomState(np.random.SeedSequence(
+                [random_state, POPULATION_N]).generate_state(1)[0]) \
+            .permutation(POPULATION_N)
+
+    results = None
+    if kwargs.get('results') is not None:
+        results = ResultsLog(kwargs.get('results'))
+        plan = results.plan({'n_splits': POPULATION_N,
+                             'dataset': fingerprint(data[:, :-1],
+                                                    data[:, -1]),
+                             'random_state': random_state,
+                             'indices': ind.tolist(),
+                             'order': order.tolist()},
+                            match=('n_splits', 'dataset'))
+        ind = np.asarray(plan['indices'])
+        order = np.asarray(plan.get('order', order))
+
     X = data[ind, :-1]
     y = data[ind, -1]
 
     feature_proba = {i: 0 for i in range(len(MODULES_SUPPORT))}
 
     acc = 0
-    kfold = KFold(n_splits=POPULATION_N)
-    for train_idx, test_idx in kfold.split(X, y):
-        model = TRAIN_MODEL_T().fit(X[train_idx], y[train_idx])
-        for s in model.cum_estimator.support:
-            feature_proba[s] += 1. / POPULATION_N
-        accT = accuracy_score(y[test_idx], model.predict(X[test_idx]))
+    accs = []
+    supports = []
+    folds = list(KFold(n_splits=POPULATION_N).split(X, y))
+    for fold in order:
+        train_idx, test_idx = folds[fold]
+        done = None
+        if results is not None:
+            done = results.get(fold, 'select_features')
+
+        if done is not None:
+            (accT,), support = done
+        else:
+            model = TRAIN_MODEL_T().fit(X[train_idx], y[train_idx])
+            support = model.cum_estimator.support
+            accT = accuracy_score(y[test_idx], model.predict(X[test_idx]))
+            if results is not None:
+                results.record(fold, 'select_features', (accT,), support)
+
+        for s in support:
+            feature_proba[s] += 1
         acc += accT
+        accs.append(accT)
+        supports.append(np.isin(np.arange(len(MODULES_SUPPORT)), support))
+
+        if kwargs.get('verbose', False):
+            print('Fold', fold, 'accuracy:', accT, 'support:', support)
+
+        if max_folds is not None and len(accs) >= max_folds:
+            break
+        if tolerance is not None and len(accs) >= MIN_FOLDS and \
+                half_width(accs, CONFIDENCE) <= tolerance and \
+                np.max(half_width(supports, CONFIDENCE)) <= tolerance:
+            break
+
+    # the probabilities are over the folds which ran, which are fewer than
+    # POPULATION_N if it stopped early
+    for i in feature_proba:
+        feature_proba[i] /= len(accs)
+
+    if adaptive:
+        print('Ran', len(accs), 'folds. Accuracy confidence interval: +/-',
+              half_width(accs, CONFIDENCE), 'Feature probability '
+              'confidence interval: +/-',
+              np.max(half_width(supports, CONFIDENCE)))
 
     if kwargs.get('verbose', False):
-        print('Estimated accuracy: ', acc / POPULATION_N)
+        print('Estimated accuracy: ', acc / len(accs))
+        print('Score store hit rate:', SCORE_STORE.hit_rate)
+        print('Structure cache hit rate:', STRUCTURE_CACHE.hit_rate,
+              'seconds saved:', STRUCTURE_CACHE.time_saved)
 
     if kwargs.get('verbose', False):
         print('The features probabilities:', feature_proba)
@@ -90,6 +189,10 @@ def train_final_model(support, **kwargs):
 
 
 def save_final_model(model, **kwargs):
+    if kwargs.get('model_format', 'pickle') == 'compact':
+        model.save_arrays(kwargs.get('model_path'))
+        return
+
     save_data = {'json': model.model.to_json(),
                  'support': model.support,
                  'known_cls': model.known_cls}
@@ -98,6 +201,12 @@ def save_final_model(model, **kwargs):
 
 
 def load_final_model(**kwargs):
+    if kwargs.get('model_format', 'pickle') == 'compact':
+        model = BayesNet.load_arrays(kwargs.get('model_path'))
+        if kwargs.get('verbose', False):
+            print('Loaded support:', model.support)
+        return model
+
     with open(kwargs.get('model_path'), 'rb') as f:
         load_data = pickle.load(f)
     support = load_data.pop('support')
@@ -135,6 +244,30 @@ def parse_args():
                         help='Whether to output data while training.'),
     parser.add_argument('-s', '--support', type=int, nargs='+',
                         help='The input support features to use instead.')
+    parser.add_argument('-f', '--model-format', type=str, default='pickle',
+                        choices=['pickle', 'compact'],
+                        help='The format to save/load the model in. "pickle" '
+                             'stores the pomegranate network as json, while '
+                             '"compact" stores its arrays in the model_path '
+                             'directory, which are memory mapped when '
+                             'loaded.')
+    parser.add_argument('-r', '--results', type=str,
+                        help='The file to log the accuracy and support of '
+                             'each feature selection fold to as it '
+                             'completes, so that an interrupted run resumes '
+                             'where it stopped.')
+    parser.add_argument('-t', '--tolerance', type=float,
+                        help='If given, then the feature selection folds run '
+                             'in a random order until the 95%% confidence '
+                             'intervals of the accuracy and of the feature '
+                             'probabilities are within this.')
+    parser.add_argument('--max-folds', type=int,
+                        help='If given, then the feature selection folds run '
+                             'in a random order and at most this many are '
+                             'run.')
+    parser.add_argument('--random-state', type=int,
+                        help='The seed of the feature selection\'s shuffle '
+                             'of the dataset and of its fold order.')
     return parser.parse_args()
 
 
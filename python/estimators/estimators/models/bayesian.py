@@ -3,32 +3,106 @@
 # Developed by Liam McInroy
 
 
+import os
+import time
+
 import numpy as np
 
 import networkx as nx
 
-from pomegranate import BayesianNetwork
+from pomegranate import (
+    BayesianNetwork,
+    ConditionalProbabilityTable,
+    DiscreteDistribution,
+    State
+)
 
 from sklearn.base import BaseEstimator, ClassifierMixin
 from sklearn.metrics import accuracy_score
 
+from estimators.models.cache import LRUCache
+from estimators.models.encoding import CategoricalEncoder
+from estimators.models.statistics import CannotUpdate, SufficientStatistics
+from estimators.models.structure import LabelParentSearch
+
+
+# The version of the directory format written by BayesNet.save_arrays. Since
+# version 2, the dense posterior table is saved too (if it was computed)
+ARRAYS_FORMAT_VERSION = 2
+ARRAYS_FILES = ('version', 'support', 'vocab_sizes', 'vocabularies',
+                'classes', 'parents', 'cpt', 'marginals')
+
 
 class BayesNet(BaseEstimator, ClassifierMixin):
     """This class is a wrapper for a pomagranate BayesianNetwork classifier.
     It will learn the structure of the network
     """
 
-    def __init__(self, support=None):
+    def __init__(self, support=None, compiled=False, max_table_size=2 ** 20,
+                 cache_size=4096, stats=None, structure_algorithm='exact',
+                 max_parents=None, max_evals=None, time_budget=None,
+                 structure_cache=None, check_stats=False):
         """Initializes the bayes net. If default is passed, then all features
         are used.
 
         Arguments:
             support: The feature indices to use in the model (after
                 provided with all of them). If None, then it uses all features
+            compiled: Whether to precompute the posterior of the label over
+                every (possibly missing) observation of its parents, so that
+                predictions are a single lookup instead of belief propagation
+            max_table_size: The largest number of entries allowed in the
+                compiled posterior table. Larger networks are left factorized
+                and marginalized per pattern of missing values instead
+            cache_size: The number of distinct observations whose posteriors
+                are remembered between calls to predict and predict_proba.
+                Its hits and misses are counted in self.posterior_cache
+            stats: A statistics.SufficientStatistics of the dataset which will
+                be passed to fit. If given, the samples are not re-encoded and
+                the parameters are taken from its count tables (only the
+                'exact' structure search still scans the samples). It may
+                have rows removed (i.e. from SufficientStatistics.excluding),
+                in which case X and y must be its active rows. Only the
+                number of rows is checked, unless check_stats
+            structure_algorithm: Either 'exact' to use pomegranate's exact
+                structure search, or 'branch-and-bound' to use a
+                structure.LabelParentSearch over the count tables
+            max_parents: The most parents the label may have when using
+                'branch-and-bound'. If None, then pomegranate's default
+            max_evals: The number of parent sets 'branch-and-bound' may score
+                before using the best found so far. If None, then unlimited
+            time_budget: The seconds 'branch-and-bound' may search before
+                using the best found so far. If None, then unlimited
+            structure_cache: A structure.StructureCache shared between nets,
+                so that the structure is only learned once for the same
+                support and data (and otherwise warm starts the search)
+            check_stats: Whether fit compares X and y with every active row
+                of stats (which encodes them again), for debugging. The
+                searchers count the statistics from the data they fit on,
+                so by default only the number of rows is compared
         """
         self.support = support
+        self.compiled = compiled
+        self.max_table_size = max_table_size
+        self.cache_size = cache_size
+        self.posterior_cache = LRUCache(cache_size)
+        self.stats = stats
+        self.structure_algorithm = structure_algorithm
+        self.max_parents = max_parents
+        self.max_evals = max_evals
+        self.time_budget = time_budget
+        self.structure_cache = structure_cache
+        self.check_stats = check_stats
+        self.structure_search = None
+        self.fit_stats = None
         self.model = None
         self.known_cls = None
+        self.encoder = None
+        self.classes = None
+        self.label_parents = None
+        self.label_cpt = None
+        self.parent_marginals = None
+        self.posterior_table = None
 
     def fit(self, X, y=None):
         """Fits the model to the given data using UniformDistributions
@@ -37,33 +111,198 @@ class BayesNet(BaseEstimator, ClassifierMixin):
             X: The dataset features to train on
             y: The labels
         """
-        X = np.array(X).astype(str)
         y = y.reshape(-1, 1)
 
-        features_node = tuple(np.arange(X.shape[1]) if self.support is None
-                              else np.arange(len(self.support)))
-        outputs_node = tuple([X.shape[1] if self.support is None
-                              else len(self.support)])
-        constraint_graph = nx.DiGraph([(features_node,
-                                        outputs_node)])
+        stats = self.stats
+        self.fit_stats = None
+        if stats is not None and (len(X) != stats.n_samples or (
+                self.check_stats and not stats.matches(X, y, self.support))):
+            raise ValueError('The sufficient statistics do not match X')
+        if stats is None and self.structure_algorithm != 'exact':
+            stats = SufficientStatistics(X, y)
+            self.fit_stats = stats
+
+        return self._fit(X, y, stats)
+
+    def update(self, add_X, add_y, remove_X, remove_y):
+        """Updates the fitted model as if it were refit on its training set
+        with the rows of remove_X removed and those of add_X added (i.e. the
+        next fold of a cross validation). Only the counting is saved: the
+        count tables of its own statistics are adjusted by just those rows,
+        but the structure is then searched again over them in full, so the
+        model is the same as a refit. Raises statistics.CannotUpdate if it
+        didn't count its own statistics (i.e. with the 'exact' structure
+        search, which is the default), in which case it must be refit
 
+        Arguments:
+            add_X: The features of the rows to add
+            add_y: Their labels
+            remove_X: The features of the rows to remove
+            remove_y: Their labels
+        """
+        if self.fit_stats is None:
+            raise CannotUpdate('Only a BayesNet which counted its own '
+                               'statistics can be updated')
+
+        self.fit_stats = self.fit_stats.update(add_X, add_y, remove_X,
+                                               remove_y)
+        y = self.fit_stats.classes[self.fit_stats.active_labels]
+        return self._fit(None, y.reshape(-1, 1), self.fit_stats)
+
+    def _fit(self, X, y, stats):
+        """Fits the model to X (which is only used without statistics) or
+        to the active rows of stats
+
+        Arguments:
+            X: The dataset features to train on
+            y: The labels (as a column)
+            stats: The statistics.SufficientStatistics to fit from, or None
+        """
         if self.support is not None:
-            self.known_cls = {s_idx: np.unique(X[:, s_idx]).tolist()
-                              for s_idx in self.support}
-            X = self._preprocess_obs(np.array(X).astype(str))
-            self.model = BayesianNetwork.from_samples(
-                    np.hstack((X[:, self.support], y)),
-                    algorithm='exact', constraint_graph=constraint_graph)
+            columns = list(self.support)
+        elif stats is not None:
+            columns = list(range(stats.codes.shape[1]))
         else:
-            self.known_cls = {j: np.unique(X[:, j]).tolist()
-                              for j in range(X.shape[1])}
-            X = self._preprocess_obs(np.array(X).astype(str))
-            self.model = BayesianNetwork.from_samples(
-                    np.hstack((X, y)),
-                    algorithm='exact', constraint_graph=constraint_graph)
+            columns = list(range(X.shape[1]))
+
+        if stats is not None:
+            # only the categories in the active rows are known, as if the
+            # vocabulary was learned from X
+            observed = {j: stats.observed(j) for j in columns}
+            self.encoder = CategoricalEncoder(
+                    columns=columns,
+                    vocabularies={j: stats.encoder.vocabularies[j][
+                                        observed[j]]
+                                  for j in columns})
+            codes = stats.active_codes[:, columns]
+            for k, j in enumerate(columns):
+                recode = np.append(np.cumsum(observed[j]) - 1, -1)
+                recode[np.append(~observed[j], False)] = -1
+                codes[:, k] = recode[codes[:, k]]
+            self.classes = stats.classes
+        else:
+            self.encoder = CategoricalEncoder(columns=columns).fit(X)
+            codes = self.encoder.transform(X)
+            self.classes = np.unique(y.astype(str))
+        self.known_cls = {j: vocab.tolist()
+                          for j, vocab in self.encoder.vocabularies.items()}
+        self.posterior_cache = LRUCache(self.cache_size)
+
+        # only pomegranate's structure search (or fit) needs the samples
+        samples = None
+        if stats is None or self.structure_algorithm == 'exact':
+            samples = np.hstack((self._codes_to_obs(codes), y))
+        parents = self._learn_structure(samples, codes, y, stats, columns)
+
+        if stats is not None:
+            parent_columns = [columns[p] for p in parents]
+            cpt = stats.conditional(parent_columns)
+            cpt = cpt[np.ix_(*([observed[j] for j in parent_columns] +
+                               [np.ones(len(self.classes), dtype=bool)]))]
+            marginals = [stats.marginal(j)[observed[j]] for j in columns]
+            if self.compiled:
+                self._set_compiled(self.classes, parents, cpt,
+                                   [marginals[p] for p in parents])
+            elif self.model is None:
+                self.model = self._network(parents, cpt, marginals)
+        else:
+            if self.model is None:
+                structure = tuple(() for _ in columns) + (tuple(parents),)
+                self.model = BayesianNetwork.from_structure(samples,
+                                                            structure)
+            if self.compiled:
+                self._compile()
 
         return self
 
+    def _network(self, parents, cpt, marginals):
+        """Builds the pomegranate network from its parameters, so that it
+        is fit from count tables instead of the samples
+
+        Arguments:
+            parents: The positions (within the support) of the label's parents
+            cpt: The conditional probability table of the label, with an axis
+                for each parent (in order) and then the label
+            marginals: The distribution of each feature of the support
+        """
+        features = [DiscreteDistribution({str(v): prob
+                                          for v, prob in enumerate(marginal)})
+                    for marginal in marginals]
+        if len(parents) > 0:
+            rows = [[str(v) for v in index[:-1]] +
+                    [self.classes[index[-1]], cpt[index]]
+                    for index in np.ndindex(*cpt.shape)]
+            label = ConditionalProbabilityTable(
+                    rows, [features[p] for p in parents])
+        else:
+            label = DiscreteDistribution({c: prob for c, prob in
+                                          zip(self.classes, cpt)})
+
+        states = [State(dist, name=str(k))
+                  for k, dist in enumerate(features + [label])]
+        model = BayesianNetwork()
+        model.add_states(*states)
+        for p in parents:
+            model.add_edge(states[p], states[-1])
+        model.bake()
+        return model
+
+    def _learn_structure(self, samples, codes, y, stats, columns):
+        """Learns the parents of the label (as positions in the support),
+        unless they are in self.structure_cache. For 'exact', self.model is
+        also set to the learned network
+
+        Arguments:
+            samples: The pomegranate observations with the labels
+            codes: The encoded support
+            y: The labels
+            stats: The statistics.SufficientStatistics, if there are any
+            columns: The feature indices of the support
+        """
+        self.model = None
+        key = None
+        warm_start = None
+        if self.structure_cache is not None:
+            key = self.structure_cache.key(
+                    columns, codes, y,
+                    [self.encoder.vocabularies[j] for j in columns],
+                    (self.structure_algorithm, self.max_parents))
+            parents = self.structure_cache.get(key)
+            if parents is not None:
+                return list(parents)
+            warm_start = self.structure_cache.warm_start(key)
+
+        start = time.time()
+        completed = True
+        if self.structure_algorithm == 'exact':
+            features_node = tuple(np.arange(len(columns)))
+            outputs_node = tuple([len(columns)])
+            constraint_graph = nx.DiGraph([(features_node,
+                                            outputs_node)])
+            self.model = BayesianNetwork.from_samples(
+                    samples, algorithm='exact',
+                    constraint_graph=constraint_graph)
+            parents = list(self.model.structure[len(columns)])
+        elif self.structure_algorithm == 'branch-and-bound':
+            self.structure_search = LabelParentSearch(
+                    max_parents=self.max_parents, max_evals=self.max_evals,
+                    time_budget=self.time_budget)
+            initial = None if warm_start is None else \
+                [columns[p] for p in warm_start]
+            parents = [columns.index(f)
+                       for f in self.structure_search.search(
+                           stats, columns, initial=initial)]
+            completed = self.structure_search.completed
+        else:
+            raise ValueError('Unknown structure_algorithm: ' +
+                             str(self.structure_algorithm))
+
+        if self.structure_cache is not None:
+            self.structure_cache.put(key, parents, time.time() - start,
+                                     completed=completed)
+
+        return parents
+
     def predict(self, X, y=None):
         """Uses the model to predict for a set
 
@@ -71,17 +310,9 @@ class BayesNet(BaseEstimator, ClassifierMixin):
             X: The dataset features to predict on
             y: The labels
         """
-        X = self._preprocess_obs(np.array(X).astype(str))
-        if self.support is not None:
-            preds = self.model.predict(np.hstack((X[:, self.support],
-                                                  np.full((len(X), 1), None))))
-            return np.array([pred[-1]
-                             for pred in preds]).reshape(-1, 1).astype(int)
-        else:
-            preds = self.model.predict(np.hstack((X,
-                                                  np.full((len(X), 1), None))))
-            return np.array([pred[-1]
-                             for pred in preds]).reshape(-1, 1).astype(int)
+        posterior = self._posterior(self._encode(X))
+        return self.classes[np.argmax(posterior, axis=1)] \
+            .reshape(-1, 1).astype(int)
 
     def predict_proba(self, X, y=None):
         """Uses the model to get the probability of class 1 over
@@ -91,19 +322,12 @@ class BayesNet(BaseEstimator, ClassifierMixin):
             X: The dataset features to predict probs on
             y: The labels
         """
-        X = self._preprocess_obs(np.array(X).astype(str))
-        if self.support is not None:
-            preds = self.model.predict_proba(np.hstack((X[:, self.support],
-                                                        np.full((len(X), 1),
-                                                                None))))
-            return np.array([pred[-1].probability('1')
-                             for pred in preds]).reshape(-1, 1)
-        else:
-            preds = self.model.predict_proba(np.hstack((X,
-                                                        np.full((len(X), 1),
-                                                                None))))
-            return np.array([pred[-1].probability('1')
-                             for pred in preds]).reshape(-1, 1)
+        posterior = self._posterior(self._encode(X))
+        # a label which never occurred in training has no probability
+        ones = np.flatnonzero(self.classes == '1')
+        if len(ones) == 0:
+            return np.zeros((len(posterior), 1))
+        return posterior[:, ones[0]].reshape(-1, 1)
 
     def score(self, X, y=None):
         """Gets the current accuracy of the net
@@ -114,15 +338,266 @@ class BayesNet(BaseEstimator, ClassifierMixin):
         """
         return accuracy_score(y, self.predict(X))
 
+    def save_arrays(self, path):
+        """Saves the compiled network as a directory of .npy arrays (the
+        support, vocabularies, label classes, CPT, parent marginals and the
+        dense posterior table if there is one) which can be memory mapped by
+        load_arrays
+
+        Arguments:
+            path: The directory to save to
+        """
+        if self.label_cpt is None:
+            self._compile()
+
+        os.makedirs(path, exist_ok=True)
+        columns = self.encoder.columns
+        vocab_sizes = self.encoder.cardinalities
+        width = max([len(v) for j in columns
+                     for v in self.encoder.vocabularies[j]], default=1)
+        vocabularies = np.full((len(columns), max(vocab_sizes, default=0)),
+                               '', dtype='<U' + str(max(width, 1)))
+        for k, j in enumerate(columns):
+            vocabularies[k, :vocab_sizes[k]] = self.encoder.vocabularies[j]
+        marginals = np.zeros((len(self.parent_marginals),
+                              max([len(m) for m in self.parent_marginals],
+                                  default=0)))
+        for k, marginal in enumerate(self.parent_marginals):
+            marginals[k, :len(marginal)] = marginal
+
+        arrays = {'version': np.array(ARRAYS_FORMAT_VERSION),
+                  'support': np.array(columns, dtype=int),
+                  'vocab_sizes': vocab_sizes,
+                  'vocabularies': vocabularies,
+                  'classes': np.asarray(self.classes).astype(str),
+                  'parents': self.label_parents,
+                  'cpt': np.asarray(self.label_cpt, dtype=float),
+                  'marginals': marginals}
+        if self.posterior_table is not None:
+            arrays['posterior'] = np.asarray(self.posterior_table)
+        for name, arr in arrays.items():
+            np.save(os.path.join(path, name + '.npy'), arr)
+
+    @classmethod
+    def load_arrays(cls, path, mmap_mode='r', **kwargs):
+        """Loads a network saved by save_arrays straight into compiled
+        inference, without rebuilding the pomegranate network. A saved
+        posterior table is used as it is loaded (i.e. memory mapped) rather
+        than computed again
+
+        Arguments:
+            path: The directory saved to
+            mmap_mode: The numpy memory map mode to load the arrays with
+            kwargs: Any other arguments for the new BayesNet
+        """
+        arrays = {name: np.load(os.path.join(path, name + '.npy'),
+                                mmap_mode=mmap_mode)
+                  for name in ARRAYS_FILES}
+        if not 1 <= int(arrays['version']) <= ARRAYS_FORMAT_VERSION:
+            raise ValueError('Unsupported model format version: ' +
+                             str(int(arrays['version'])))
+
+        columns = arrays['support'].tolist()
+        vocab_sizes = arrays['vocab_sizes']
+        parents = np.asarray(arrays['parents'], dtype=int)
+        posterior_table = None
+        if os.path.exists(os.path.join(path, 'posterior.npy')):
+            posterior_table = np.load(os.path.join(path, 'posterior.npy'),
+                                      mmap_mode=mmap_mode)
+
+        model = cls(support=columns, compiled=True, **kwargs)
+        model.known_cls = {j: arrays['vocabularies'][k, :vocab_sizes[k]]
+                           .tolist()
+                           for k, j in enumerate(columns)}
+        model.encoder = CategoricalEncoder(columns=columns,
+                                           vocabularies=model.known_cls)
+        model._set_compiled(np.asarray(arrays['classes']), parents,
+                            arrays['cpt'],
+                            [arrays['marginals'][k, :vocab_sizes[p]]
+                             for k, p in enumerate(parents)],
+                            posterior_table=posterior_table)
+        return model
+
+    def _compile(self):
+        """Converts the learned network into the arrays used for compiled
+        inference. Since the features may only be parents of the label (and
+        are otherwise independent), the posterior of the label only depends
+        on the observed values of its parents. Each parent is given an extra
+        category for a missing observation, whose posterior is marginalized
+        over that parent's distribution
+        """
+        n_columns = len(self.encoder.columns)
+        cardinalities = self.encoder.cardinalities
+        classes = self.classes.tolist()
+        parents = list(self.model.structure[n_columns])
+        label_dist = self.model.states[n_columns].distribution
+
+        if len(parents) > 0:
+            rows = label_dist.parameters[0]
+            cpt = np.zeros(tuple(cardinalities[p] for p in parents) +
+                           (len(classes),))
+            for row in rows:
+                cpt[tuple(int(v) for v in row[:-2]) +
+                    (classes.index(str(row[-2])),)] = row[-1]
+        else:
+            probs = label_dist.parameters[0]
+            cpt = np.zeros(len(classes))
+            for c, prob in probs.items():
+                cpt[classes.index(str(c))] = prob
+
+        marginals = []
+        for p in parents:
+            marginal = np.zeros(cardinalities[p])
+            for v, prob in self.model.states[p].distribution \
+                    .parameters[0].items():
+                marginal[int(v)] = prob
+            marginals.append(marginal)
+
+        self._set_compiled(self.classes, parents, cpt, marginals)
+
+    def _set_compiled(self, classes, parents, cpt, marginals,
+                      posterior_table=None):
+        """Stores the arrays for compiled inference, and precomputes the
+        dense posterior table if it is small enough (unless it is given)
+
+        Arguments:
+            classes: The label values (as strings) of the last axis of cpt
+            parents: The positions (within the support) of the label's parents
+            cpt: The conditional probability table of the label, with an axis
+                for each parent (in order) and then the label
+            marginals: The distribution of each parent
+            posterior_table: The dense posterior table, i.e. as saved by
+                save_arrays. If None, then it is computed
+        """
+        self.classes = classes
+        self.label_parents = np.asarray(parents, dtype=int)
+        self.label_cpt = cpt
+        self.parent_marginals = marginals
+        self.posterior_table = posterior_table
+        if posterior_table is not None:
+            return
+
+        size = len(classes) * np.prod([len(m) + 1 for m in marginals])
+        if size <= self.max_table_size:
+            table = cpt
+            for axis, marginal in enumerate(marginals):
+                missing = np.tensordot(table, marginal, axes=([axis], [0]))
+                table = np.concatenate(
+                        (table, np.expand_dims(missing, axis)), axis=axis)
+            self.posterior_table = table
+
+    def _posterior(self, codes):
+        """Computes the posterior of the label for each of the encoded rows.
+        Unless compiled, each distinct row is only inferred once, and the
+        posteriors are remembered in self.posterior_cache
+
+        Arguments:
+            codes: The encoded features from self._encode
+        """
+        if self.label_cpt is not None:
+            return self._compiled_posterior(codes)
+
+        unique, inverse = np.unique(codes, axis=0, return_inverse=True)
+        keys = [row.tobytes() for row in unique]
+        posterior = np.empty((len(unique), len(self.classes)))
+        missed = []
+        for k, key in enumerate(keys):
+            cached = self.posterior_cache.get(key)
+            if cached is None:
+                missed.append(k)
+            else:
+                posterior[k] = cached
+
+        if len(missed) > 0:
+            obs = self._codes_to_obs(unique[missed])
+            preds = self.model.predict_proba(
+                    np.hstack((obs, np.full((len(obs), 1), None))))
+            for k, pred in zip(missed, preds):
+                probs = {str(c): prob
+                         for c, prob in pred[-1].parameters[0].items()}
+                posterior[k] = [probs.get(c, 0.) for c in self.classes]
+                self.posterior_cache.put(keys[k], posterior[k].copy())
+
+        return posterior[inverse.ravel()]
+
+    def _compiled_posterior(self, codes):
+        """Looks up the posterior of the label for each of the encoded rows.
+        Since the last category of each axis of the dense table is the
+        missing observation, the MISSING code (-1) indexes it directly
+
+        Arguments:
+            codes: The encoded features from self._encode
+        """
+        evidence = codes[:, self.label_parents]
+        if self.posterior_table is not None:
+            return np.broadcast_to(self.posterior_table[tuple(evidence.T)],
+                                   (len(codes), len(self.classes)))
+
+        # factorized, so marginalize the table for each pattern of missing
+        # parents and then gather the rows with that pattern
+        posterior = np.empty((len(codes), len(self.classes)))
+        patterns, inverse = np.unique(evidence < 0, axis=0,
+                                      return_inverse=True)
+        for k, pattern in enumerate(patterns):
+            rows, = np.where(inverse.ravel() == k)
+            table = self.label_cpt
+            for axis in np.where(pattern)[0][::-1]:
+                table = np.tensordot(table, self.parent_marginals[axis],
+                                     axes=([axis], [0]))
+            posterior[rows] = table[tuple(evidence[rows][:, ~pattern].T)]
+
+        return posterior
+
+    def _encode(self, X):
+        """Encodes the supported features of X as integer codes, where
+        unknown categories are encoding.MISSING
+
+        Arguments:
+            X: The dataset (with all of the features)
+        """
+        if self.encoder is None:
+            # i.e. loaded from a saved model, so only known_cls is available
+            self.encoder = CategoricalEncoder(
+                    columns=(sorted(self.known_cls) if self.support is None
+                             else list(self.support)),
+                    vocabularies=self.known_cls)
+        if self.classes is None:
+            label_dist = self.model.states[-1].distribution
+            if len(self.model.structure[-1]) > 0:
+                classes = [row[-2] for row in label_dist.parameters[0]]
+            else:
+                classes = list(label_dist.parameters[0])
+            self.classes = np.unique(np.array(classes).astype(str))
+        return self.encoder.transform(X)
+
     def _preprocess_obs(self, X):
-        if isinstance(X, np.ndarray):
-            X_ = X.astype(object)
-            for j in range(X.shape[1]):
-                if j in self.known_cls:
-                    for i in range(X.shape[0]):
-                        if X[i, j] not in self.known_cls[j]:
-                            X_[i, j] = None
-                        else:
-                            X_[i, j] = str(self.known_cls[j].index(X[i, j]))
-            return X_
-        return X
+        """Converts X into the observations of the supported features for the
+        pomegranate network, i.e. the category codes as strings and None for
+        anything unknown
+
+        Arguments:
+            X: The dataset (with all of the features)
+        """
+        return self._codes_to_obs(self._encode(X))
+
+    def _codes_to_obs(self, codes):
+        """Converts encoded features into pomegranate observations
+
+        Arguments:
+            codes: The encoded features from self._encode
+        """
+        # the MISSING code (-1) indexes the trailing None
+        n_names = max(codes.max(initial=0), 0) + 1
+        names = np.array([str(i) for i in range(n_names)] + [None],
+                         dtype=object)
+        return names[codes]
+
+
+def BayesNetGenerator(name='BayesNetGen', **kwargs):
+    """Returns a BayesNet class whose nets are constructed with kwargs (i.e.
+    a shared structure_cache), so that it can be given to the searchers and
+    evaluators in place of BayesNet
+    """
+    def __init__(self, support=None, stats=None):
+        BayesNet.__init__(self, support=support, stats=stats, **kwargs)
+    return type(name, (BayesNet,), {'__init__': __init__})
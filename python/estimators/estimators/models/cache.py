@@ -0,0 +1,70 @@
+# cache.py
+#
+# Developed by Liam McInroy
+
+
+from collections import OrderedDict
+
+
+class LRUCache:
+    """A bounded mapping which evicts the least recently used entry once it
+    is full. It counts its hits and misses so that its usefulness can be
+    reported
+    """
+
+    def __init__(self, capacity=1024):
+        """Initializes a new empty cache
+
+        Arguments:
+            capacity: The maximum number of entries to keep
+        """
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Returns the entry for key (marking it as recently used), or
+        default if it isn't cached
+
+        Arguments:
+            key: The key to look up
+            default: The value returned on a miss
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        """Caches value under key, evicting the least recently used entry if
+        the cache is full
+
+        Arguments:
+            key: The key to store under
+            value: The value to store
+        """
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Removes every entry (but keeps the hit and miss counts)
+        """
+        self.entries.clear()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def hit_rate(self):
+        """The fraction of lookups which were hits
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.
@@ -3,10 +3,70 @@
 # Developed by Liam McInroy
 
 
+import numpy as np
+
 from sklearn.dummy import DummyClassifier
 
+from estimators.models.statistics import CannotUpdate
+
+
+class UpdatableDummyClassifier(DummyClassifier):
+    """A sklearn DummyClassifier which counts its labels, so that it can be
+    updated with rows added to and removed from its training set
+    """
+
+    def fit(self, X, y, sample_weight=None):
+        """Fits the classifier, counting each of its classes
+
+        Arguments:
+            X: The dataset features
+            y: The labels
+            sample_weight: The weight of each sample
+        """
+        super().fit(X, y, sample_weight=sample_weight)
+        self.class_counts = None
+        if sample_weight is None and self.n_outputs_ == 1:
+            _, self.class_counts = np.unique(np.ravel(y), return_counts=True)
+        return self
+
+    def update(self, add_X, add_y, remove_X, remove_y):
+        """Updates the class priors as if the classifier were refit on its
+        training set with the rows of remove_X removed and those of add_X
+        added. Raises statistics.CannotUpdate if it can't be (it was weighted,
+        or the classes would change), in which case it must be refit
+
+        Arguments:
+            add_X: The features of the rows to add
+            add_y: Their labels
+            remove_X: The features of the rows to remove
+            remove_y: Their labels
+        """
+        if self.class_counts is None:
+            raise CannotUpdate('Only an unweighted classifier of a single '
+                               'output can be updated')
+
+        add_y = np.ravel(add_y)
+        remove_y = np.ravel(remove_y)
+        if not np.all(np.isin(add_y, self.classes_)):
+            raise CannotUpdate('A new class was added, so the classifier '
+                               'must be refit')
+
+        n_classes = len(self.classes_)
+        counts = self.class_counts + \
+            np.bincount(np.searchsorted(self.classes_, add_y),
+                        minlength=n_classes) - \
+            np.bincount(np.searchsorted(self.classes_, remove_y),
+                        minlength=n_classes)
+        if np.any(counts <= 0):
+            raise CannotUpdate('A class was removed, so the classifier '
+                               'must be refit')
+
+        self.class_counts = counts
+        self.class_prior_ = counts / counts.sum()
+        return self
+
 
 def DummyGenerator(support=None):
-    model = DummyClassifier(strategy='stratified')
+    model = UpdatableDummyClassifier(strategy='stratified')
     model.support = None
     return model
@@ -0,0 +1,92 @@
+# encoding.py
+#
+# Developed by Liam McInroy
+
+
+import numpy as np
+
+
+# The code given to any value which is missing or outside of the vocabulary
+MISSING = -1
+
+
+class CategoricalEncoder:
+    """Maps the categories of each column of a dataset to integer codes.
+    The vocabulary of a column is its sorted unique values (as strings), so
+    a value's code is its position in that vocabulary. Values which are not
+    in the vocabulary (or are missing) are given the code MISSING
+    """
+
+    def __init__(self, columns=None, missing_values=(), vocabularies=None):
+        """Initializes a new encoder
+
+        Arguments:
+            columns: The column indices to encode (in order). If None, then
+                all of the columns seen in fit are used
+            missing_values: The values (as strings) which are treated as
+                missing instead of as a category
+            vocabularies: A dict of column index to a sorted vocabulary,
+                if the encoder was already fit (i.e. from a saved model)
+        """
+        self.columns = columns
+        self.missing_values = missing_values
+        self.vocabularies = None
+        if vocabularies is not None:
+            self.vocabularies = {j: np.asarray(vocab).astype(str)
+                                 for j, vocab in vocabularies.items()}
+            if self.columns is None:
+                self.columns = sorted(self.vocabularies)
+
+    def fit(self, X):
+        """Learns the vocabulary of each column
+
+        Arguments:
+            X: The dataset to learn the categories of
+        """
+        X = np.asarray(X).astype(str)
+        if self.columns is None:
+            self.columns = list(range(X.shape[1]))
+
+        self.vocabularies = {}
+        for j in self.columns:
+            vocab = np.unique(X[:, j])
+            if len(self.missing_values) > 0:
+                vocab = vocab[~np.isin(vocab, self.missing_values)]
+            self.vocabularies[j] = vocab
+
+        return self
+
+    def transform(self, X):
+        """Encodes the columns of X as integer codes, where unknown values
+        are given the code MISSING
+
+        Arguments:
+            X: The dataset to encode (with all of its original columns)
+        """
+        X = np.asarray(X).astype(str)
+        codes = np.full((X.shape[0], len(self.columns)), MISSING, dtype=int)
+        for k, j in enumerate(self.columns):
+            vocab = self.vocabularies[j]
+            if len(vocab) == 0:
+                continue
+            pos = np.searchsorted(vocab, X[:, j])
+            pos[pos == len(vocab)] = 0
+            known = vocab[pos] == X[:, j]
+            codes[known, k] = pos[known]
+
+        return codes
+
+    def fit_transform(self, X):
+        """Learns the vocabulary of each column and then encodes X
+
+        Arguments:
+            X: The dataset to learn and encode
+        """
+        return self.fit(X).transform(X)
+
+    @property
+    def cardinalities(self):
+        """The number of categories in each encoded column
+        """
+        return np.array([len(self.vocabularies[j]) for j in self.columns],
+                        dtype=int)
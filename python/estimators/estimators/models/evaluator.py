@@ -9,65 +9,386 @@ from sklearn.metrics import accuracy_score
 from sklearn.model_selection import KFold
 from sklearn.utils import check_X_y
 
+from estimators.models.racing import dominated, half_width
+from estimators.models.shared import attach, process_pool, share
+from estimators.models.statistics import CannotUpdate
+from estimators.models.store import fingerprint
+
+
+# The models and dataset of a worker process, which are set once by
+# _init_worker so that each job only needs to send its fold
+_WORKER = {}
+
+
+def _init_worker(models, X, y, counters=()):
+    """Initializes a worker process of an evaluator's pool. The models are
+    passed once when the worker starts (and are inherited rather than
+    pickled when the pool forks, so generated classes work too), and the
+    data is attached from shared memory
+    """
+    _WORKER['models'] = models
+    _WORKER['X'] = attach(X)
+    _WORKER['y'] = attach(y)
+    _WORKER['counters'] = counters
+
+
+def _init_modular_worker(models, evaluator, counters=()):
+    """Initializes a worker process of a ModularModelEvaluator's pool, which
+    assembles the folds from the evaluator's tables
+    """
+    _WORKER['models'] = models
+    _WORKER['evaluator'] = evaluator
+    _WORKER['counters'] = counters
+
+
+def _counted(job, *args):
+    """Runs a job in a worker, returning its result and what each of the
+    worker's counters (its copies of them) counted during it
+    """
+    before = [counter.counts() for counter in _WORKER['counters']]
+    result = job(*args)
+    return result, [{name: value - counts[name]
+                     for name, value in counter.counts().items()}
+                    for counter, counts in zip(_WORKER['counters'], before)]
+
+
+def _add_counts(counters, counts):
+    """Adds what a worker's copies of the counters counted to them
+    """
+    for counter, count in zip(counters, counts):
+        counter.add_counts(count)
+
+
+def _fit_and_score(model, X, y, train_idx, test_idx, seed, previous=None):
+    """Fits a model on a fold's training set, returning its training and
+    test accuracies, its support and the fitted model with its training
+    indices. The fold is given as row indices of X. If seed isn't None, then
+    numpy's global random state is seeded with it while the model is fit
+    (and restored after), so that the job gives the same result in any
+    process.
+
+    If previous is the (fitted model, training indices) of the model on
+    another fold and it has an update method, then it is updated with just
+    the rows which differ instead of a new model being fit, unless it
+    raises statistics.CannotUpdate
+    """
+    state = None
+    if seed is not None:
+        # the caller's global random state is put back afterwards
+        state = np.random.get_state()
+        np.random.seed(seed)
+
+    try:
+        train_X = X[train_idx]
+        train_y = y[train_idx]
+        test_X = X[test_idx]
+        test_y = y[test_idx]
+
+        val_model = None
+        if previous is not None and hasattr(previous[0], 'update'):
+            added = np.setdiff1d(train_idx, previous[1])
+            removed = np.setdiff1d(previous[1], train_idx)
+            try:
+                val_model = previous[0].update(X[added], y[added], X[removed],
+                                               y[removed])
+            except CannotUpdate:
+                val_model = None
+        if val_model is None:
+            val_model = model().fit(train_X, train_y)
+
+        scores = (accuracy_score(train_y.astype(int),
+                                 val_model.predict(train_X)),
+                  accuracy_score(test_y.astype(int),
+                                 val_model.predict(test_X)))
+        return scores, val_model.support, (val_model, train_idx)
+    finally:
+        if state is not None:
+            np.random.set_state(state)
+
+
+def _worker_fit_and_score(name, train_idx, test_idx, seed):
+    """Fits and scores the worker's model name on a fold, also returning
+    what its counters counted
+    """
+    result, counts = _counted(_fit_and_score, _WORKER['models'][name],
+                              _WORKER['X'], _WORKER['y'], train_idx,
+                              test_idx, seed)
+    return result[:2], counts
+
+
+def _fit_and_score_modular(model, train_X, train_y, test_X, test_y):
+    """Fits a modular model on a fold's tables, returning its training and
+    test accuracies and its supports
+    """
+    val_model = model().fit(train_X, train_y)
+    return ((accuracy_score(train_y, val_model.predict(train_X)),
+             accuracy_score(test_y, val_model.predict(test_X))),
+            val_model.support)
+
+
+def _worker_fit_and_score_modular(name, train_pids_idx, test_pids_idx):
+    """Assembles a fold of the worker's ModularModelEvaluator from the
+    indices of its sequence IDs, then fits and scores the worker's model
+    name on it
+    """
+    evaluator = _WORKER['evaluator']
+    train_X, train_y = evaluator.get_data_with_id(
+            [evaluator.pids[i] for i in train_pids_idx])
+    test_X, test_y = evaluator.get_data_with_id(
+            [evaluator.pids[i] for i in test_pids_idx])
+    return _counted(_fit_and_score_modular, _WORKER['models'][name],
+                    train_X, train_y, test_X, test_y)
+
 
 class ModelEvaluator:
     """Class to evaluate multiple sklearn.base.ClassifierMixIn models
     on a binary classification task using LOO cross validation
     """
 
-    def __init__(self, models, X, y):
+    def __init__(self, models, X, y, random_state=None):
         """Initializes a new ModelEvaluator
 
         Arguments:
             models: The dict of models (IN CLASSES so they can be initialized)
             X: The dataset features
             y: The dataset labels
+            random_state: The seed of the shuffle and of every (fold, model)
+                job, so that the results are reproducible (even in
+                parallel). If None, then numpy's global random state is used
         """
         self.models = models
-        indices = np.arange(X.shape[0])
-        np.random.shuffle(indices)
-        self.X, self.y = check_X_y(X=X[indices], y=y[indices].flatten())
+        self.random_state = random_state
+        # the data is shuffled through a permutation of its rows instead of
+        # being copied, so self.X and self.y keep their original order
+        self.X, self.y = check_X_y(X=X, y=np.asarray(y).flatten())
+        self.indices = np.arange(X.shape[0])
+        if random_state is None:
+            np.random.shuffle(self.indices)
+        else:
+            np.random.RandomState(random_state).shuffle(self.indices)
+        self.eliminated = {}
+        self.intervals = {}
 
-    def run(self, n_splits):
+    def run(self, n_splits, n_jobs=None, results=None, racing=None,
+            tolerance=None, max_folds=None, confidence=.95, min_folds=10,
+            counters=()):
         """Iteratively runs the cross validation, returning all the models'
         scores after each successive fold
 
         Arguments:
             n_splits: The number of splits to use for cross validation
+            n_jobs: The number of processes to run the (fold, model) jobs
+                in (-1 for every cpu). The dataset is put in shared memory
+                once, so each job only sends its fold's row indices. The
+                folds are still yielded in the order they're run. If None,
+                then they're run serially, and a model with an update method
+                (i.e. models.bayesian.BayesNet) is updated from its previous
+                fold with just the rows which differ instead of being refit
+            results: The models.results.ResultsLog to append each (fold,
+                model) result to as it completes. If it already has results
+                (of the same dataset and number of splits), then its shuffle,
+                fold order (and random_state) are used and their jobs are
+                skipped
+            racing: The models.racing.RacingEvaluator whose min_folds and
+                confidence decide when the models are raced. After each
+                fold, a model which a paired t-test (on the test accuracies
+                of the folds so far) finds worse than the leader stops being
+                trained, and self.eliminated maps it to the number of folds
+                it ran. Its totals are then over those folds. If None, then
+                every model runs every fold
+            tolerance: If given, then the folds are run in a random order
+                until the confidence intervals of every (remaining) model's
+                mean test accuracy and of its support's feature frequencies
+                have half widths of at most tolerance. The totals are then
+                over the folds which ran, and self.intervals maps each model
+                to the half widths it achieved
+            max_folds: If given, then the folds are run in a random order
+                and the cross validation stops after this many (as with
+                tolerance)
+            confidence: The confidence of the intervals
+            min_folds: The number of folds run before the intervals are
+                trusted to stop the cross validation
+            counters: The objects with counts and add_counts methods (i.e.
+                a models.store.ScoreStore) which the models count their hits
+                and misses in. With n_jobs, the workers count in their own
+                copies, so each job's counts are added to them
         """
+        adaptive = tolerance is not None or max_folds is not None
+        order = np.arange(n_splits)
+        if adaptive and self.random_state is None:
+            order = np.random.permutation(n_splits)
+        elif adaptive:
+            order = np.random.RandomState(np.random.SeedSequence(
+                    [self.random_state, n_splits]).generate_state(1)[0]) \
+                .permutation(n_splits)
+
+        if results is not None:
+            plan = results.plan({'n_splits': n_splits,
+                                 'dataset': fingerprint(self.X, self.y),
+                                 'random_state': self.random_state,
+                                 'indices': self.indices.tolist(),
+                                 'order': order.tolist()},
+                                match=('n_splits', 'dataset'))
+            self.random_state = plan['random_state']
+            self.indices = np.asarray(plan['indices'])
+            order = np.asarray(plan.get('order', order))
+
         sk_k_fold = KFold(n_splits=n_splits)
+        # the folds of the shuffled rows, as indices of the original rows
+        folds = [(self.indices[train_idx], self.indices[test_idx])
+                 for train_idx, test_idx in sk_k_fold.split(self.indices)]
+        names = list(self.models)
         total_val_scores = {name: 0 for name, _ in self.models.items()}
         total_val_supp = {name: {i: 0 for i in range(self.X.shape[1])}
                           for name, _ in self.models.items()}
-        for train_idx, test_idx in sk_k_fold.split(self.X, self.y):
-            print('Beginning a new fold training cycle')
-
-            train_X = self.X[train_idx]
-            train_y = self.y[train_idx]
-            test_X = self.X[test_idx]
-            test_y = self.y[test_idx]
-
-            val_scores = {}
-            val_supports = {}
-            for name, model in self.models.items():
-                val_model = model().fit(train_X, train_y)
-                val_scores[name] = (accuracy_score(train_y.astype(int),
-                                                   val_model.predict(train_X)),
-                                    accuracy_score(test_y.astype(int),
-                                                   val_model.predict(test_X)))
-                total_val_scores[name] += val_scores[name][1] / n_splits
-
-                val_supports[name] = val_model.support
-                if val_model.support is not None and \
-                        isinstance(val_model.support[0], int):
-                    for supp in val_model.support:
-                        total_val_supp[name][supp] += 1. / n_splits
-
-            yield val_scores, val_supports
+        remaining = list(names)
+        fold_scores = {name: [] for name in names}
+        fold_supports = {name: [] for name in names}
+        # the (fitted model, training indices) of each model's previous fold
+        fitted = {}
+        self.eliminated = {}
+        self.intervals = {}
+
+        pool = None
+        if n_jobs is not None:
+            shared = (share(self.X), share(self.y))
+            pool = process_pool(n_jobs, _init_worker,
+                                (self.models,) + shared + (counters,))
+            # submitted in the order they're run, but indexed by fold
+            jobs = [None] * n_splits
+            for f in order:
+                jobs[f] = [pool.submit(_worker_fit_and_score, name,
+                                       folds[f][0], folds[f][1],
+                                       self._seed(f, m))
+                           if results is None or results.get(f, name) is None
+                           else None
+                           for m, name in enumerate(names)]
+
+        try:
+            for k, f in enumerate(order):
+                train_idx, test_idx = folds[f]
+                print('Beginning a new fold training cycle')
+
+                val_scores = {}
+                val_supports = {}
+                for m, name in enumerate(names):
+                    if name not in remaining:
+                        continue
+                    done = None if results is None else results.get(f, name)
+                    if done is not None:
+                        val_scores[name], support = done
+                    elif pool is not None:
+                        (val_scores[name], support), counts = \
+                            jobs[f][m].result()
+                        _add_counts(counters, counts)
+                    else:
+                        val_scores[name], support, fitted[name] = \
+                            _fit_and_score(self.models[name], self.X,
+                                           self.y, train_idx, test_idx,
+                                           self._seed(f, m),
+                                           fitted.get(name))
+                    if done is None and results is not None:
+                        results.record(f, name, val_scores[name], support)
+                    fold_scores[name].append(val_scores[name][1])
+
+                    val_supports[name] = support
+                    if support is not None and \
+                            isinstance(support[0], int):
+                        for supp in support:
+                            total_val_supp[name][supp] += 1
+                        fold_supports[name].append(
+                                np.isin(np.arange(self.X.shape[1]), support))
+
+                if racing is not None:
+                    remaining = self._race(remaining, fold_scores, k + 1,
+                                           racing)
+                    if pool is not None:
+                        for m, name in enumerate(names):
+                            if name not in remaining:
+                                for later in order[k + 1:]:
+                                    if jobs[later][m] is not None:
+                                        jobs[later][m].cancel()
+
+                stop = False
+                if adaptive:
+                    self.intervals = self._intervals(
+                            fold_scores, fold_supports, confidence)
+                    stop = (max_folds is not None and k + 1 >= max_folds) or \
+                        (tolerance is not None and k + 1 >= min_folds and
+                         all(self.intervals[name]['accuracy'] <= tolerance and
+                             not self.intervals[name]['support'] > tolerance
+                             for name in remaining))
+
+                yield val_scores, val_supports
+                if stop:
+                    break
+        finally:
+            if pool is not None:
+                for fold_jobs in jobs:
+                    for job in fold_jobs:
+                        if job is not None:
+                            job.cancel()
+                pool.shutdown()
+                for arr in shared:
+                    if hasattr(arr, 'close'):
+                        arr.close()
+
+        # the totals are over the folds each model ran, which are fewer than
+        # n_splits if it was eliminated or the cross validation stopped early
+        for name in names:
+            n_folds = len(fold_scores[name])
+            if n_folds > 0:
+                total_val_scores[name] = np.mean(fold_scores[name])
+                for supp in total_val_supp[name]:
+                    total_val_supp[name][supp] /= n_folds
 
         print("Finished cross validation.")
         yield total_val_scores, total_val_supp
 
+    def _race(self, remaining, fold_scores, n_folds, racing):
+        """Returns the models which the leader doesn't dominate on the test
+        accuracies of the first n_folds folds, recording the eliminated ones
+        """
+        if n_folds < max(racing.min_folds, 2) or len(remaining) < 2:
+            return remaining
+
+        leader, worse = dominated([fold_scores[name] for name in remaining],
+                                  racing.confidence)
+        for k in np.flatnonzero(worse):
+            name = remaining[k]
+            self.eliminated[name] = n_folds
+            if racing.verbose:
+                print('Eliminated model', name, 'after', n_folds,
+                      'folds with accuracy', np.mean(fold_scores[name]),
+                      'against', remaining[leader], 'with accuracy',
+                      np.mean(fold_scores[remaining[leader]]))
+
+        return [name for k, name in enumerate(remaining) if not worse[k]]
+
+    def _intervals(self, fold_scores, fold_supports, confidence):
+        """The half widths of the confidence intervals of each model's mean
+        test accuracy and of its support's feature frequencies (the widest
+        of them, or nan if it has no supports)
+        """
+        intervals = {}
+        for name in fold_scores:
+            support = np.nan
+            if len(fold_supports[name]) > 0:
+                support = float(np.max(half_width(fold_supports[name],
+                                                  confidence)))
+            intervals[name] = {
+                'accuracy': float(half_width(fold_scores[name], confidence)),
+                'support': support}
+        return intervals
+
+    def _seed(self, fold, model):
+        """The seed of a (fold, model) job, or None without a random_state
+        """
+        if self.random_state is None:
+            return None
+        return int(np.random.SeedSequence(
+                [self.random_state, fold, model]).generate_state(1)[0])
+
 
 class ModularModelEvaluator:
     """Class to evaluate multiple .models.modular.Modular models
@@ -89,67 +410,163 @@ class ModularModelEvaluator:
         self.table_pids = [set(np.unique(x[:, 0])) for x in X]
         self.pids = list(set.union(*self.table_pids))
 
-    def run(self, n_splits):
+        # the join index of the tables: each table's rows sorted (stably)
+        # by sequence ID, and the offset and count of each ID's rows in
+        # that order, where each ID has the slot of its position in pids
+        self.pid_slots = {pid: slot for slot, pid in enumerate(self.pids)}
+        self.row_order = []
+        self.row_starts = []
+        self.row_counts = []
+        for x in self.X:
+            order = np.argsort(x[:, 0], kind='stable')
+            table_pids, starts, counts = np.unique(
+                    x[order, 0], return_index=True, return_counts=True)
+            slots = [self.pid_slots[pid] for pid in table_pids]
+            self.row_order.append(order)
+            self.row_starts.append(np.zeros(len(self.pids), dtype=int))
+            self.row_starts[-1][slots] = starts
+            self.row_counts.append(np.zeros(len(self.pids), dtype=int))
+            self.row_counts[-1][slots] = counts
+
+    def run(self, n_splits, n_jobs=None, results=None, counters=()):
         """Iteratively runs the cross validation, returning all the models'
         scores after each successive fold
 
         Arguments:
             n_splits: The number of splits to use for cross validation
+            n_jobs: The number of processes to run the (fold, model) jobs
+                in (-1 for every cpu). The tables are given to each worker
+                once (they hold objects, so they can't be in shared
+                memory), and each job only sends the indices of its fold's
+                sequence IDs. If None, then they're run serially
+            results: The models.results.ResultsLog to append each (fold,
+                model) result to as it completes. If it already has results
+                (of the same number of splits), then its order of the
+                sequence IDs is used and their jobs are skipped
+            counters: The objects with counts and add_counts methods (i.e.
+                a models.store.ScoreStore) which the models count their hits
+                and misses in. With n_jobs, the workers count in their own
+                copies, so each job's counts are added to them
         """
+        # the folds split the IDs in the order of the plan, as their slots
+        order = np.arange(len(self.pids))
+        if results is not None:
+            plan = results.plan({'n_splits': n_splits, 'pids': self.pids},
+                                match=('n_splits',))
+            if sorted(map(str, plan['pids'])) != \
+                    sorted(map(str, self.pids)):
+                raise ValueError('The results log {} has different sequence '
+                                 'IDs than the tables'.format(results.path))
+            order = np.array([self.pid_slots[pid] for pid in plan['pids']],
+                             dtype=int)
+
         sk_k_fold = KFold(n_splits=n_splits)
+        folds = [(order[train_pids_idx], order[test_pids_idx])
+                 for train_pids_idx, test_pids_idx
+                 in sk_k_fold.split(order)]
+        names = list(self.models)
         total_val_scores = {name: 0 for name, _ in self.models.items()}
         total_val_supp = {name: [{j: 0 for j in range(x.shape[1] - 2)}
                                  for x in self.X]
                           for name, _ in self.models.items()}
-        for train_pids_idx, test_pids_idx in sk_k_fold.split(self.pids):
-            print('Beginning a new fold training cycle')
-
-            train_X, train_y = self.get_data_with_id(
-                    [self.pids[i] for i in train_pids_idx])
-            test_X, test_y = self.get_data_with_id(
-                    [self.pids[i] for i in test_pids_idx])
-
-            val_scores = {}
-            val_supports = {}
-            for name, model in self.models.items():
-                val_model = model().fit(train_X, train_y)
-                val_scores[name] = (accuracy_score(train_y,
-                                                   val_model.predict(train_X)),
-                                    accuracy_score(test_y,
-                                                   val_model.predict(test_X)))
-                total_val_scores[name] += val_scores[name][1] / n_splits
-
-                val_supports[name] = val_model.support
-                for i, supp in enumerate(val_model.support):
-                    if supp is not None:
-                        for f_idx in supp:
-                            total_val_supp[name][i][f_idx] += 1. / n_splits
-
-            yield val_scores, val_supports
+
+        pool = None
+        if n_jobs is not None:
+            pool = process_pool(n_jobs, _init_modular_worker,
+                                (self.models, self, counters))
+            jobs = [[pool.submit(_worker_fit_and_score_modular, name,
+                                 train_pids_idx, test_pids_idx)
+                     if results is None or results.get(f, name) is None
+                     else None
+                     for name in names]
+                    for f, (train_pids_idx, test_pids_idx)
+                    in enumerate(folds)]
+
+        try:
+            for f, (train_pids_idx, test_pids_idx) in enumerate(folds):
+                print('Beginning a new fold training cycle')
+
+                pending = [name for name in names if results is None or
+                           results.get(f, name) is None]
+                if pool is None and len(pending) > 0:
+                    train_X, train_y = self.get_data_with_id(
+                            [self.pids[i] for i in train_pids_idx])
+                    test_X, test_y = self.get_data_with_id(
+                            [self.pids[i] for i in test_pids_idx])
+
+                val_scores = {}
+                val_supports = {}
+                for m, name in enumerate(names):
+                    if name not in pending:
+                        val_scores[name], support = results.get(f, name)
+                    elif pool is not None:
+                        (val_scores[name], support), counts = \
+                            jobs[f][m].result()
+                        _add_counts(counters, counts)
+                    else:
+                        val_scores[name], support = _fit_and_score_modular(
+                                self.models[name], train_X, train_y, test_X,
+                                test_y)
+                    if name in pending and results is not None:
+                        results.record(f, name, val_scores[name], support)
+                    total_val_scores[name] += val_scores[name][1] / n_splits
+
+                    val_supports[name] = support
+                    for i, supp in enumerate(support):
+                        if supp is not None:
+                            for f_idx in supp:
+                                total_val_supp[name][i][f_idx] += \
+                                    1. / n_splits
+
+                yield val_scores, val_supports
+        finally:
+            if pool is not None:
+                for fold_jobs in jobs:
+                    for job in fold_jobs:
+                        if job is not None:
+                            job.cancel()
+                pool.shutdown()
 
         print("Finished cross validation.")
         yield total_val_scores, total_val_supp
 
     def get_data_with_id(self, pids):
-        """Returns the data in self.X matching the sequence IDs
+        """Returns the data in self.X matching the sequence IDs. Each table
+        has the rows of each ID in turn (in their original order), or a row
+        of None with just the ID if the table doesn't have it. The labels
+        have a slot per table and ID, where the first len(pids) are the
+        label of each ID's last row (in the last table which has it)
         """
+        slots = np.array([self.pid_slots.get(pid, -1) for pid in pids],
+                         dtype=int)
         X = []
-        y = []
-        for i, t_pids in enumerate(self.table_pids):
-            arr = []
-            for j, pid in enumerate(pids):
-                y.append(None)
-                if pid in t_pids:
-                    indices, = np.where(self.X[i][:, 0] == pid)
-                    arr.append(np.vstack(self.X[i][indices]).astype(object))
-                    y[j] = self.X[i][indices[-1], -1]
-                else:
-                    dat = np.full(self.X[i][0].shape, None, dtype=None)
-                    dat[0] = pid
-                    arr.append(dat)
-            X.append(np.vstack(arr).astype(object))
+        y = np.full(len(self.X) * len(pids), None, dtype=object)
+        for i, x in enumerate(self.X):
+            counts = np.where(slots >= 0, self.row_counts[i][slots], 0)
+            starts = self.row_starts[i][slots]
+            present = counts > 0
+            sizes = np.where(present, counts, 1)
+            offsets = np.cumsum(sizes) - sizes
+
+            arr = np.full((sizes.sum(),) + x.shape[1:], None, dtype=object)
+            # gather the row ranges of the IDs the table has at once
+            counts = counts[present]
+            within = np.arange(counts.sum()) - \
+                np.repeat(np.cumsum(counts) - counts, counts)
+            rows = self.row_order[i][np.repeat(starts[present], counts) +
+                                     within]
+            arr[np.repeat(offsets[present], counts) + within] = x[rows]
+            # and fill in the IDs it doesn't have in bulk
+            absent = np.flatnonzero(~present)
+            absent_pids = np.empty(len(absent), dtype=object)
+            absent_pids[:] = [pids[j] for j in absent]
+            arr[offsets[absent], 0] = absent_pids
+
+            last_rows = self.row_order[i][starts[present] + counts - 1]
+            y[np.flatnonzero(present)] = x[last_rows, -1]
+            X.append(arr)
 
         for k in range(len(X)):
             X[k][np.where(X[k] == -1)] = None
 
-        return tuple(x for x in X), np.array(y)
+        return tuple(x for x in X), np.array(y.tolist())
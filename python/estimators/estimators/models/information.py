@@ -0,0 +1,98 @@
+# information.py
+#
+# Developed by Liam McInroy
+
+
+import numpy as np
+
+
+# The values (as strings) which are treated as missing when ranking features
+MISSING_VALUES = ('None', '-1')
+
+
+def mutual_information(counts):
+    """Computes the (discrete) mutual information, in nats, between the
+    variables of the last two axes of contingency tables. Any leading axes
+    are computed over at once, i.e. tables of shape (feature, category,
+    label) give the information of each feature with the label
+
+    Arguments:
+        counts: The contingency tables
+    """
+    counts = np.asarray(counts, dtype=float)
+    totals = counts.sum(axis=(-2, -1), keepdims=True)
+    p_xy = counts / np.maximum(totals, 1)
+    p_x = p_xy.sum(axis=-1, keepdims=True)
+    p_y = p_xy.sum(axis=-2, keepdims=True)
+
+    observed = p_xy > 0
+    ratio = np.ones_like(p_xy)
+    np.divide(p_xy, p_x * p_y, out=ratio, where=observed)
+    return np.sum(p_xy * np.log(ratio), axis=(-2, -1))
+
+
+def label_relevance(stats, features=None):
+    """Computes the mutual information of each feature with the label from
+    the count tables of a statistics.SufficientStatistics. Rows where a
+    feature is missing are left out of that feature's information
+
+    Arguments:
+        stats: The statistics.SufficientStatistics of the dataset
+        features: The feature indices. If None, then all of them
+    """
+    return mutual_information(stats.feature_label_tables(features))
+
+
+class PairwiseInformation:
+    """The mutual informations between pairs of features, I(Xi; Xj), and of
+    pairs of features with the label, I(Xi, Xj; Y), of a dataset. The
+    matrices are only filled in for the pairs which are requested, a row of
+    pairs at a time
+    """
+
+    def __init__(self, stats):
+        """Initializes the empty matrices
+
+        Arguments:
+            stats: The statistics.SufficientStatistics of the dataset
+        """
+        n_features = stats.codes.shape[1]
+        self.stats = stats
+        self.relevance = label_relevance(stats)
+        self.redundancy = np.full((n_features, n_features), np.nan)
+        self.joint_relevance = np.full((n_features, n_features), np.nan)
+
+    def pairs(self, feature, others):
+        """Returns I(feature; other) and I(feature, other; Y) for each of
+        the others, computing any which are unknown in one batch
+
+        Arguments:
+            feature: The feature index
+            others: The indices of the other features
+        """
+        others = np.asarray(others, dtype=int)
+        unknown = others[np.isnan(self.redundancy[feature, others])]
+        if len(unknown) > 0:
+            tables = self.stats.pair_label_tables(feature, unknown)
+            redundancy = mutual_information(tables.sum(axis=-1))
+            joint_relevance = mutual_information(
+                    tables.reshape(len(unknown), -1, tables.shape[-1]))
+            self.redundancy[feature, unknown] = redundancy
+            self.redundancy[unknown, feature] = redundancy
+            self.joint_relevance[feature, unknown] = joint_relevance
+            self.joint_relevance[unknown, feature] = joint_relevance
+
+        return (self.redundancy[feature, others],
+                self.joint_relevance[feature, others])
+
+
+def pairwise_information(stats):
+    """Returns the PairwiseInformation of a statistics.SufficientStatistics,
+    which is created the first time and then kept with the stats
+
+    Arguments:
+        stats: The statistics.SufficientStatistics of the dataset
+    """
+    if stats.pairwise is None:
+        stats.pairwise = PairwiseInformation(stats)
+    return stats.pairwise
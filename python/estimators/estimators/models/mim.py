@@ -7,17 +7,24 @@ import numpy as np
 
 
 from sklearn.base import BaseEstimator, ClassifierMixin
-from sklearn.feature_selection import mutual_info_classif
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import accuracy_score
 
+from estimators.models.information import (
+    label_relevance,
+    MISSING_VALUES,
+    pairwise_information
+)
+from estimators.models.statistics import CannotUpdate, SufficientStatistics
+
 
 class MIM(BaseEstimator, ClassifierMixin):
     """This model takes maximally the n features with the most mutual
     information with the class and then trains a logistic regression with them
     """
 
-    def __init__(self, estimator=LogisticRegression, support=None, n=5):
+    def __init__(self, estimator=LogisticRegression, support=None, n=5,
+                 stats=None):
         """Initialize a new MIM. Then self.support will
         remain as initialized and be replaced by a subset which contains
         (at most) the n features with the highest mutual information values.
@@ -30,11 +37,18 @@ class MIM(BaseEstimator, ClassifierMixin):
             support: The features to consider intially. Only a
                 subset of this list will be chosen. If None, then all are used
             n: The n features with the highest mutual informations to return
+            stats: A statistics.SufficientStatistics of the dataset which will
+                be passed to fit, shared with the estimator if it accepts it.
+                If None, then the mutual informations are counted from X.
+                Either way, any None or -1 values are left out of them
         """
         self.support = support
         self.n = n
+        self.stats = stats
         self.estimator = estimator
         self.current_estimator = estimator()
+        self.candidates = None
+        self.fit_stats = None
 
     def fit(self, X, y=None):
         """Choose the statistically significant features and then trains
@@ -45,32 +59,28 @@ class MIM(BaseEstimator, ClassifierMixin):
             y: The labels
         """
 
-        if (self.support is not None and
-                len(self.support) > self.n):
-            mi = []
-            for k in self.support:
-                indices = np.where(X[:, k] != None)  # NOQA
-                mi.append(mutual_info_classif(X[indices, k]
-                                              .reshape(-1, 1)
-                                              .astype(int),
-                                              y[indices].astype(int))[0])
-            self.support = self.support[np.argsort(-np.array(mi))[0:self.n]
-                                        .tolist()]
-        elif self.support is None:
-            if self.n >= X.shape[1]:
-                self.support = np.arange(X.shape[1]).tolist()
+        self.candidates = None
+        self.fit_stats = None
+        if self.support is None and self.n >= X.shape[1]:
+            self.support = np.arange(X.shape[1]).tolist()
+        elif self.support is None or len(self.support) > self.n:
+            self.candidates = np.arange(X.shape[1]) \
+                if self.support is None else np.asarray(self.support)
+            if self.stats is None:
+                stats = SufficientStatistics(X, y,
+                                             missing_values=MISSING_VALUES)
+                self.fit_stats = stats
             else:
-                mi = []
-                for k in range(X.shape[1]):
-                    indices = np.where(X[:, k] != None)  # NOQA
-                    mi.append(mutual_info_classif(X[indices, k]
-                                                  .reshape(-1, 1)
-                                                  .astype(int),
-                                                  y[indices].astype(int))[0])
-                self.support = np.argsort(-np.array(mi))[0:self.n].tolist()
+                # ranked as if counted from X, whatever the shared
+                # statistics treat as missing
+                stats = self.stats.with_missing_values(MISSING_VALUES)
+            self.support = self.rank(stats, self.candidates)
 
         if self.estimator is not LogisticRegression:
-            self.current_estimator = self.estimator(self.support).fit(X, y)
+            self.current_estimator = self.estimator(self.support)
+            if hasattr(self.current_estimator, 'stats'):
+                self.current_estimator.stats = self.stats
+            self.current_estimator.fit(X, y)
         else:
             self.current_estimator = \
                 LogisticRegression().fit(X[:, self.support].astype(int),
@@ -78,6 +88,50 @@ class MIM(BaseEstimator, ClassifierMixin):
 
         return self
 
+    def update(self, add_X, add_y, remove_X, remove_y):
+        """Updates the fitted model as if it were refit on its training set
+        with the rows of remove_X removed and those of add_X added (i.e. the
+        next fold of a cross validation). The features are ranked again from
+        its own statistics, whose count tables are adjusted by just those
+        rows, and the estimator is updated. Raises statistics.CannotUpdate
+        if it can't be (the estimator can't be updated, the ranking used
+        shared statistics, or the support changed), in which case it must be
+        refit
+
+        Arguments:
+            add_X: The features of the rows to add
+            add_y: Their labels
+            remove_X: The features of the rows to remove
+            remove_y: Their labels
+        """
+        if not hasattr(self.current_estimator, 'update'):
+            raise CannotUpdate('The estimator of the MIM can not be updated')
+
+        if self.candidates is not None:
+            if self.fit_stats is None:
+                raise CannotUpdate('A MIM which ranked the features with '
+                                   'shared statistics can not be updated')
+            self.fit_stats = self.fit_stats.update(add_X, add_y, remove_X,
+                                                   remove_y)
+            if self.rank(self.fit_stats, self.candidates) != self.support:
+                raise CannotUpdate('The support of the MIM changed, so it '
+                                   'must be refit')
+
+        self.current_estimator.update(add_X, add_y, remove_X, remove_y)
+        return self
+
+    def rank(self, stats, candidates):
+        """Returns (in order) the n candidates with the highest mutual
+        information with the label
+
+        Arguments:
+            stats: The statistics.SufficientStatistics of the dataset
+            candidates: The feature indices to choose from
+        """
+        candidates = np.asarray(candidates, dtype=int)
+        mi = label_relevance(stats, candidates)
+        return candidates[np.argsort(-mi, kind='stable')[0:self.n]].tolist()
+
     def predict(self, X, y=None):
         """Performs a prediction on X
 
@@ -100,8 +154,118 @@ class MIM(BaseEstimator, ClassifierMixin):
         return accuracy_score(y, self.predict(X))
 
 
+class GreedyMIM(MIM):
+    """An abstract MIM which selects features greedily, so that a feature's
+    score can account for its redundancy with the features already
+    selected. The pairwise mutual informations come from the stats'
+    information.PairwiseInformation, so they are shared between fits
+    """
+
+    def rank(self, stats, candidates):
+        """Returns (in order of selection) the n greedily selected candidates
+
+        Arguments:
+            stats: The statistics.SufficientStatistics of the dataset
+            candidates: The feature indices to choose from
+        """
+        info = pairwise_information(stats)
+        candidates = np.asarray(candidates, dtype=int)
+        remaining = np.ones(len(candidates), dtype=bool)
+        # the first feature is the most relevant for every criterion
+        scores = info.relevance[candidates].copy()
+        totals = self._initial_totals(info, candidates)
+
+        selected = []
+        while remaining.any() and len(selected) < self.n:
+            best = np.flatnonzero(remaining)[np.argmax(scores[remaining])]
+            remaining[best] = False
+            selected.append(int(candidates[best]))
+            if not remaining.any():
+                break
+
+            redundancy, joint_relevance = info.pairs(candidates[best],
+                                                     candidates[remaining])
+            scores[remaining] = self._update(
+                    info, totals, candidates, remaining, candidates[best],
+                    redundancy, joint_relevance, len(selected))
+
+        return selected
+
+    def _initial_totals(self, info, candidates):
+        """Returns the running totals (one per candidate) of the criterion
+        before any features are selected
+
+        Arguments:
+            info: The information.PairwiseInformation of the dataset
+            candidates: The feature indices to choose from
+        """
+        raise NotImplementedError()
+
+    def _update(self, info, totals, candidates, remaining, feature,
+                redundancy, joint_relevance, n_selected):
+        """Updates the totals of the remaining candidates (in place) once a
+        feature is selected and returns their new scores
+
+        Arguments:
+            info: The information.PairwiseInformation of the dataset
+            totals: The running totals of every candidate
+            candidates: The feature indices to choose from
+            remaining: The mask of the candidates not yet selected
+            feature: The feature which was just selected
+            redundancy: I(X; feature) for the remaining candidates
+            joint_relevance: I(X, feature; Y) for the remaining candidates
+            n_selected: The number of features selected so far
+        """
+        raise NotImplementedError()
+
+
+class MRMR(GreedyMIM):
+    """Minimum redundancy maximum relevance. Selects the feature with the
+    highest I(X; Y) less its mean I(X; S) with the selected features S
+    """
+
+    def _initial_totals(self, info, candidates):
+        return np.zeros(len(candidates))
+
+    def _update(self, info, totals, candidates, remaining, feature,
+                redundancy, joint_relevance, n_selected):
+        totals[remaining] += redundancy
+        return info.relevance[candidates[remaining]] - \
+            totals[remaining] / n_selected
+
+
+class JMI(GreedyMIM):
+    """Joint mutual information. Selects the feature with the highest sum
+    of I(X, S; Y) over the selected features S
+    """
+
+    def _initial_totals(self, info, candidates):
+        return np.zeros(len(candidates))
+
+    def _update(self, info, totals, candidates, remaining, feature,
+                redundancy, joint_relevance, n_selected):
+        totals[remaining] += joint_relevance
+        return totals[remaining]
+
+
+class CMIM(GreedyMIM):
+    """Conditional mutual information maximization. Selects the feature
+    with the highest minimum of I(X; Y | S) over the selected features S
+    """
+
+    def _initial_totals(self, info, candidates):
+        return info.relevance[candidates].copy()
+
+    def _update(self, info, totals, candidates, remaining, feature,
+                redundancy, joint_relevance, n_selected):
+        # I(X; Y | S) = I(X, S; Y) - I(S; Y)
+        totals[remaining] = np.minimum(
+                totals[remaining], joint_relevance - info.relevance[feature])
+        return totals[remaining]
+
+
 def MIMGenerator(name='MIMGen', estimator=LogisticRegression, n=5,
-                 supp=None):
+                 supp=None, selector=MIM):
     def __init__(self, support=supp):
-        MIM.__init__(self, estimator=estimator, support=support, n=n)
-    return type(name, (MIM,), {'__init__': __init__})
+        selector.__init__(self, estimator=estimator, support=support, n=n)
+    return type(name, (selector,), {'__init__': __init__})
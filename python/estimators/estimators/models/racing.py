@@ -0,0 +1,157 @@
+# racing.py
+#
+# Developed by Liam McInroy
+
+
+import numpy as np
+
+from scipy.stats import t as student_t
+from sklearn.model_selection import StratifiedKFold
+
+
+def dominated(scores, confidence):
+    """Returns the index of the leader (the best mean) of paired scores,
+    and whether a one-sided paired t-test finds each candidate worse than
+    the leader with the confidence
+
+    Arguments:
+        scores: The array of each candidate's (rows) score on each fold
+            (columns), which needs at least two folds
+        confidence: The confidence needed that a candidate is worse
+    """
+    scores = np.asarray(scores, dtype=float)
+    n_folds = scores.shape[1]
+    leader = int(np.argmax(scores.mean(axis=1)))
+    diffs = scores[leader] - scores
+    mean = diffs.mean(axis=1)
+    std = diffs.std(axis=1, ddof=1)
+    threshold = student_t.ppf(confidence, n_folds - 1) * \
+        std / np.sqrt(n_folds)
+    # with no variance in the differences, any loss is significant
+    return leader, (mean > threshold) & (mean > 0)
+
+
+def half_width(samples, confidence):
+    """Returns the half width of the t confidence interval of the mean of
+    the samples (along the first axis), which is infinite with fewer than
+    two samples
+
+    Arguments:
+        samples: The array of samples
+        confidence: The confidence of the interval
+    """
+    samples = np.asarray(samples, dtype=float)
+    if samples.shape[0] < 2:
+        return np.full(samples.shape[1:], np.inf)[()]
+    return student_t.ppf((1 + confidence) / 2, samples.shape[0] - 1) * \
+        samples.std(axis=0, ddof=1) / np.sqrt(samples.shape[0])
+
+
+class RacingEvaluator:
+    """Scores a batch of candidate supports by racing them over the folds of
+    a cross validation. Every remaining candidate is scored on the next fold,
+    and once enough folds are done, the candidates which a paired t-test
+    finds worse than the leader (the best mean so far) are eliminated. So
+    only the contenders are scored on every fold, and an eliminated
+    candidate's score is its mean over the folds it ran.
+
+    The fold scores of each support are remembered for the rest of the
+    search, so a support which is raced again (i.e. the current state of an
+    annealing chain) only runs the folds it hasn't yet
+    """
+
+    def __init__(self, cv=10, min_folds=3, confidence=.95, verbose=0):
+        """Initializes a new racing evaluator
+
+        Arguments:
+            cv: The number of stratified folds
+            min_folds: The number of folds every candidate is scored on
+                before any are eliminated
+            confidence: The confidence the paired t-test needs that a
+                candidate is worse than the leader to eliminate it
+            verbose: Whether to print each elimination
+        """
+        self.cv = cv
+        self.min_folds = min_folds
+        self.confidence = confidence
+        self.verbose = verbose
+        self.fold_scores = {}
+        self.eliminations = []
+
+    @property
+    def scheme(self):
+        """A description of how the supports are scored (for a ScoreStore)
+        """
+        return 'raced stratified {}-fold accuracy ({} folds, {} ' \
+            'confidence)'.format(self.cv, self.min_folds, self.confidence)
+
+    def folds(self, X, y):
+        """Resets the remembered fold scores and returns the (train, test)
+        indices of each fold of a new search
+
+        Arguments:
+            X: The dataset features to fit on
+            y: The labels
+        """
+        self.fold_scores = {}
+        self.eliminations = []
+        return list(StratifiedKFold(self.cv).split(X, y))
+
+    def race(self, supports, score_folds):
+        """Returns the score of each support, which is its mean accuracy
+        over the folds it ran before it was eliminated (or all of them)
+
+        Arguments:
+            supports: The list of supports (lists of feature indices)
+            score_folds: The function from a list of (support, fold index)
+                pairs to their test accuracies, so that each fold of the
+                remaining candidates may be scored in parallel
+        """
+        keys = [tuple(sorted(int(s) for s in support))
+                for support in supports]
+        # an empty support can't be fit, so it never races
+        remaining = [key for key in dict.fromkeys(keys) if len(key) > 0]
+        for key in remaining:
+            self.fold_scores.setdefault(key, [])
+
+        for fold in range(self.cv):
+            pending = [key for key in remaining
+                       if len(self.fold_scores[key]) <= fold]
+            for key, score in zip(pending, score_folds(
+                    [(list(key), fold) for key in pending])):
+                self.fold_scores[key].append(score)
+
+            if fold + 1 >= self.min_folds and len(remaining) > 1:
+                remaining = self._eliminate(remaining, fold + 1)
+
+        return [float(np.mean(self.fold_scores[key])) if len(key) > 0
+                else -np.inf for key in keys]
+
+    def completed(self, support):
+        """Whether a support was scored on every fold (i.e. it was never
+        eliminated), so that its score is its full cross validated accuracy
+
+        Arguments:
+            support: The list of feature indices
+        """
+        key = tuple(sorted(int(s) for s in support))
+        return len(self.fold_scores.get(key, ())) >= self.cv
+
+    def _eliminate(self, remaining, n_folds):
+        """Returns the candidates which the leader doesn't dominate on the
+        first n_folds folds
+        """
+        scores = np.array([self.fold_scores[key][:n_folds]
+                           for key in remaining])
+        leader, worse = dominated(scores, self.confidence)
+
+        for k in np.flatnonzero(worse):
+            self.eliminations.append((remaining[k], n_folds,
+                                      float(scores[k].mean()),
+                                      float(scores[leader].mean())))
+            if self.verbose:
+                print('Eliminated support', list(remaining[k]), 'after',
+                      n_folds, 'folds with accuracy', scores[k].mean(),
+                      'against', scores[leader].mean())
+
+        return [key for k, key in enumerate(remaining) if not worse[k]]
@@ -0,0 +1,140 @@
+# results.py
+#
+# Developed by Liam McInroy
+
+
+import json
+import os
+
+import numpy as np
+
+
+def _encode(value):
+    """A JSON compatible copy of a score or support, where arrays remember
+    their dtype so that they're decoded as they were
+    """
+    if isinstance(value, np.ndarray):
+        return {'array': _encode(value.tolist()), 'dtype': value.dtype.str}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    return value
+
+
+def _decode(value):
+    """The inverse of _encode
+    """
+    if isinstance(value, dict) and 'array' in value:
+        return np.array(_decode(value['array']), dtype=value['dtype'])
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _decode(v) for k, v in value.items()}
+    return value
+
+
+class ResultsLog:
+    """An append-only log of the result of each (fold, model) job of a cross
+    validation (see models.evaluator), kept as JSON lines so that every
+    result is on disk as soon as it completes. The first line is the fold
+    plan (i.e. the shuffle of the data), so that a restarted cross
+    validation has the same folds and can skip the jobs already completed.
+    A line left partially written by a crash is dropped when the log is
+    reopened
+    """
+
+    def __init__(self, path):
+        """Opens the log at path, loading the results already in it
+
+        Arguments:
+            path: The JSON lines file of the log, which is created if it
+                doesn't exist
+        """
+        self.path = path
+        self.stored_plan = None
+        self.results = {}
+        self.file = None
+
+        if not os.path.exists(path):
+            return
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        lines = data.split(b'\n')
+        # anything after the last newline was cut off mid write
+        if len(lines[-1]) > 0:
+            with open(path, 'r+b') as f:
+                f.truncate(len(data) - len(lines[-1]))
+        for line in lines[:-1]:
+            if len(line.strip()) == 0:
+                continue
+            entry = json.loads(line.decode())
+            if 'plan' in entry:
+                self.stored_plan = _decode(entry['plan'])
+            else:
+                self.results[(entry['fold'], entry['model'])] = \
+                    (tuple(_decode(entry['scores'])),
+                     _decode(entry['support']))
+
+    def plan(self, plan, match=()):
+        """Returns the fold plan of the log. If it doesn't have one yet,
+        then it is plan, which is written to the log
+
+        Arguments:
+            plan: The dict describing the folds (of JSON compatible values)
+            match: The keys of plan which must equal those of the log's
+                plan, i.e. the number of folds and the dataset
+        """
+        if self.stored_plan is None:
+            self.stored_plan = _decode(_encode(plan))
+            self._write({'plan': plan})
+        for key in match:
+            if self.stored_plan.get(key) != _decode(_encode(plan[key])):
+                raise ValueError('The results log {} has a different {} '
+                                 'than this cross validation'
+                                 .format(self.path, key))
+        return self.stored_plan
+
+    def get(self, fold, model):
+        """Returns the (scores, support) of the model on the fold, or None
+        if it hasn't been completed
+
+        Arguments:
+            fold: The index of the fold
+            model: The name of the model
+        """
+        return self.results.get((fold, model))
+
+    def record(self, fold, model, scores, support):
+        """Appends the result of the model on the fold to the log
+
+        Arguments:
+            fold: The index of the fold
+            model: The name of the model
+            scores: The model's scores on the fold, i.e. its training and
+                test accuracies
+            support: The model's support
+        """
+        self.results[(fold, model)] = (tuple(scores), support)
+        self._write({'fold': fold, 'model': model, 'scores': scores,
+                     'support': support})
+
+    def close(self):
+        """Closes the file, which is reopened when next needed
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __len__(self):
+        return len(self.results)
+
+    def _write(self, entry):
+        if self.file is None:
+            self.file = open(self.path, 'a')
+        self.file.write(json.dumps(_encode(entry)) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
@@ -3,13 +3,116 @@
 # developed by Liam McInroy
 
 import copy
+import os
+import pickle
+import tempfile
+import time
 from math import exp
 
 import numpy as np
 
-from genetic_selection import GeneticSelectionCV
+from sklearn.model_selection import StratifiedKFold
 
+from estimators.models.information import MISSING_VALUES
 from estimators.models.mim import MIM
+from estimators.models.shared import process_pool
+from estimators.models.statistics import SufficientStatistics
+from estimators.models.store import fingerprint
+
+
+# The dataset of a worker process, which is set once by _init_worker so that
+# each task only needs to send its support
+_WORKER = {}
+
+
+# The descriptions of how the searchers score supports (for a ScoreStore)
+ACCURACY = 'training accuracy'
+BONUS = ' with a bonus for fewer features'
+
+
+def _init_worker(estimator, X, y, folds=None):
+    """Initializes a worker process of a searcher's pool. The estimator and
+    data are passed once when the worker starts (and are inherited rather
+    than pickled when the pool forks, so generated classes work too)
+    """
+    _WORKER['estimator'] = estimator
+    _WORKER['X'] = X
+    _WORKER['y'] = y
+    _WORKER['stats'] = SufficientStatistics(X, y)
+    _WORKER['folds'] = folds
+    if folds is not None:
+        _WORKER['fold_stats'] = [_WORKER['stats'].excluding(test_idx)
+                                 for _, test_idx in folds]
+
+
+def _fit_with_stats(estimator, support, X, y, stats):
+    """Fits estimator(support), giving it the sufficient statistics if it
+    accepts them
+    """
+    model = estimator(support)
+    if hasattr(model, 'stats') and stats is not None:
+        model.stats = stats
+    return model.fit(X, y)
+
+
+def _energy(estimator, X, y, n_features):
+    """The energy maximized by the annealing search, which is the accuracy
+    with a bonus for using fewer features
+    """
+    return estimator.score(X, y) + \
+        (n_features - len(estimator.support)) * .1 / n_features
+
+
+def _worker_energy(support):
+    """Fits the worker's estimator on support and returns its energy
+    """
+    X, y = _WORKER['X'], _WORKER['y']
+    model = _fit_with_stats(_WORKER['estimator'], support, X, y,
+                            _WORKER['stats'])
+    return _energy(model, X, y, X.shape[1])
+
+
+def _fold_score(estimator, support, X, y, fold, stats):
+    """The test accuracy of estimator(support) on a (train, test) fold, where
+    the fit shares the statistics of the training set
+    """
+    train_idx, test_idx = fold
+    model = _fit_with_stats(estimator, support, X[train_idx], y[train_idx],
+                            stats)
+    return model.score(X[test_idx], y[test_idx])
+
+
+def _worker_accuracy(support):
+    """Fits the worker's estimator on support and returns its accuracy
+    """
+    X, y = _WORKER['X'], _WORKER['y']
+    return _fit_with_stats(_WORKER['estimator'], support, X, y,
+                           _WORKER['stats']).score(X, y)
+
+
+def _cv_score(estimator, support, X, y, folds, fold_stats):
+    """The mean test accuracy of estimator(support) over the folds
+    """
+    if len(support) == 0:
+        return -np.inf
+    return float(np.mean([_fold_score(estimator, support, X, y, fold, stats)
+                          for fold, stats in zip(folds, fold_stats)]))
+
+
+def _worker_cv_score(support):
+    """Returns the worker estimator's cross validated accuracy on support
+    """
+    return _cv_score(_WORKER['estimator'], support, _WORKER['X'],
+                     _WORKER['y'], _WORKER['folds'], _WORKER['fold_stats'])
+
+
+def _worker_fold_score(task):
+    """Returns the worker estimator's accuracy on a (support, fold index)
+    """
+    support, fold = task
+    return _fold_score(_WORKER['estimator'], support, _WORKER['X'],
+                       _WORKER['y'], _WORKER['folds'][fold],
+                       _WORKER['fold_stats'][fold])
 
 
 class BaseFeatureSearcher:
@@ -37,24 +140,313 @@ class BaseFeatureSearcher:
         """
         raise NotImplementedError()
 
+    def _start_search(self, X, y):
+        """Prepares what the candidates of a search share: the sufficient
+        statistics and, if the searcher has a score store, the fingerprint
+        of the dataset and the identity of the estimator
+
+        Arguments:
+            X: The dataset features to fit on
+            y: The labels
+        """
+        self.stats = SufficientStatistics(X, y)
+        store = getattr(self, 'store', None)
+        if store is not None:
+            self.dataset = store.fingerprint(X, y)
+            self.identity = store.identity(self.estimator)
+        racing = getattr(self, 'racing', None)
+        if racing is not None:
+            self.folds = racing.folds(X, y)
+            self.fold_stats = [self.stats.excluding(test_idx)
+                               for _, test_idx in self.folds]
+        surrogate = getattr(self, 'surrogate', None)
+        if surrogate is not None:
+            surrogate.reset(self.stats)
+
+    def _resume(self, X, y):
+        """Starts the budget of a search. If the searcher has a checkpoint
+        of a search on the same data, then its evaluations, elapsed time,
+        racing and surrogate are restored, and the searcher's own state is
+        returned to continue from. Otherwise, returns None
+
+        Arguments:
+            X: The dataset features to fit on
+            y: The labels
+        """
+        self.n_evals = 0
+        self.stopped = False
+        self.started = time.time()
+        self.checkpointed = self.started
+
+        if getattr(self, 'checkpoint', None) is None:
+            return None
+        self.fingerprint = fingerprint(X, y)
+        path = self._checkpoint_path()
+        if not os.path.exists(path):
+            return None
+
+        with open(path, 'rb') as f:
+            saved = pickle.load(f)
+        if saved['dataset'] != self.fingerprint:
+            return None
+
+        self.n_evals = saved['n_evals']
+        self.started -= saved['elapsed']
+        if saved['racing'] is not None:
+            self.racing.fold_scores, self.racing.eliminations = \
+                saved['racing']
+        if saved['surrogate'] is not None:
+            vars(self.surrogate).update(saved['surrogate'])
+        return saved['state']
+
+    def _exhausted(self):
+        """Whether the search has used up its evaluation or time budget
+        """
+        max_evals = getattr(self, 'max_evals', None)
+        time_budget = getattr(self, 'time_budget', None)
+        self.stopped = (max_evals is not None and
+                        self.n_evals >= max_evals) or \
+            (time_budget is not None and self.elapsed >= time_budget)
+        return self.stopped
+
+    @property
+    def elapsed(self):
+        """The seconds the search has run for (including before resuming)
+        """
+        return time.time() - self.started
+
+    def _checkpoint_path(self):
+        """The file of the search's checkpoint, which is the searcher's
+        checkpoint with the fingerprint of the data added to its name, so
+        that the searches on different data (i.e. the folds of a cross
+        validation, which may run at once) each have their own
+        """
+        root, ext = os.path.splitext(self.checkpoint)
+        return '{}.{}{}'.format(root, self.fingerprint, ext)
+
+    def _checkpoint(self, state, force=False):
+        """Saves the state of the search to the searcher's checkpoint, if
+        it has one and the checkpoint interval has passed since the last
+
+        Arguments:
+            state: The searcher's own state to continue from, which is
+                given back by _resume
+            force: Whether to save regardless of the interval
+        """
+        if getattr(self, 'checkpoint', None) is None or \
+                (not force and time.time() - self.checkpointed <
+                 self.checkpoint_interval):
+            return
+        path = self._checkpoint_path()
+
+        racing = getattr(self, 'racing', None)
+        surrogate = getattr(self, 'surrogate', None)
+        saved = {'dataset': self.fingerprint,
+                 'n_evals': self.n_evals,
+                 'elapsed': self.elapsed,
+                 'racing': None if racing is None else
+                 (racing.fold_scores, racing.eliminations),
+                 'surrogate': None if surrogate is None else
+                 {name: value for name, value in vars(surrogate).items()
+                  if name != 'stats'},
+                 'state': state}
+        # written aside (to a file of its own) and then moved, so a kill
+        # can't corrupt it
+        fd, temp = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(
+                path) + '.', dir=os.path.dirname(path) or '.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(saved, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp, path)
+        except BaseException:
+            os.remove(temp)
+            raise
+        self.checkpointed = time.time()
+
+    def _finish(self, state):
+        """Ends a search. If it stopped on its budget, then its checkpoint
+        is saved so that it can be continued (i.e. with a larger budget),
+        and otherwise the checkpoint is removed
+
+        Arguments:
+            state: The searcher's own state to continue from
+        """
+        if getattr(self, 'checkpoint', None) is None:
+            return
+        if self.stopped:
+            self._checkpoint(state, force=True)
+            return
+        try:
+            os.remove(self._checkpoint_path())
+        except FileNotFoundError:
+            # it was never saved
+            pass
+
+    def _scheme(self, default):
+        """The description of how the searcher scores supports, which is
+        default unless they are raced
+        """
+        racing = getattr(self, 'racing', None)
+        return default if racing is None else racing.scheme
+
+    def _race(self, supports, X, y, pool=None, estimator=None):
+        """Scores supports with the searcher's racing evaluator, so that only
+        the contenders are scored on every fold
+
+        Arguments:
+            supports: The list of supports (lists of feature indices)
+            X: The dataset features to fit on
+            y: The labels
+            pool: The process pool to score each fold's candidates in,
+                whose workers were given the folds. If None, then serially
+            estimator: The callable fitting a support. If None, then it is
+                the searcher's estimator
+        """
+        estimator = self.estimator if estimator is None else estimator
+
+        def score_folds(tasks):
+            if pool is not None:
+                return list(pool.map(_worker_fold_score, tasks))
+            return [_fold_score(estimator, support, X, y, self.folds[fold],
+                                self.fold_stats[fold])
+                    for support, fold in tasks]
+
+        return self.racing.race(supports, score_folds)
+
+    def _scores(self, supports, n_features, scheme, evaluate, identity=None):
+        """Returns the score of each support. If the searcher has a score
+        store, then only the supports it doesn't know are evaluated, and
+        their scores are stored. The unknown supports are given to evaluate
+        together, so that they may be evaluated in parallel.
+
+        If the supports are raced, then they are never looked up, since each
+        must race the others to be eliminated. Only the scores of those
+        which ran every fold are stored, since the score of an eliminated
+        support is over fewer folds
+
+        Arguments:
+            supports: The list of supports (lists of feature indices)
+            n_features: The total number of features
+            scheme: A description of how the supports are scored
+            evaluate: The function from a list of supports to their scores
+            identity: The identity of the estimator which is scored. If None,
+                then it is that of the searcher's estimator
+        """
+        store = getattr(self, 'store', None)
+        if store is None:
+            self.n_evals += len(supports)
+            return list(evaluate(supports))
+
+        racing = getattr(self, 'racing', None)
+        identity = self.identity if identity is None else identity
+        keys = [store.key(self.dataset, identity, support, n_features, scheme)
+                for support in supports]
+        scores = [None] * len(keys) if racing is not None else \
+            [store.get(key) for key in keys]
+
+        unknown = {}
+        for key, support, score in zip(keys, supports, scores):
+            if score is None and key not in unknown:
+                unknown[key] = support
+        self.n_evals += len(unknown)
+        evaluated = dict(zip(unknown, evaluate(list(unknown.values()))))
+        for key, score in evaluated.items():
+            if racing is None or racing.completed(unknown[key]):
+                store.put(key, score)
+
+        return [evaluated[key] if score is None else score
+                for key, score in zip(keys, scores)]
+
+    def _observe(self, supports, scores):
+        """Gives the surrogate the scores of evaluated supports. If they were
+        raced, then only those which ran every fold are given, since the
+        score of an eliminated support is over fewer folds
+
+        Arguments:
+            supports: The list of supports (lists of feature indices)
+            scores: Their scores
+        """
+        racing = getattr(self, 'racing', None)
+        if racing is not None:
+            completed = [racing.completed(support) for support in supports]
+            supports = [s for s, c in zip(supports, completed) if c]
+            scores = [s for s, c in zip(scores, completed) if c]
+        self.surrogate.observe(supports, scores)
+
+    def _fit_candidate(self, support, X, y):
+        """Fits the estimator on a candidate support. If the estimator
+        accepts sufficient statistics, then it is given the searcher's so
+        its count tables are shared across candidates
+
+        Arguments:
+            support: The list of feature indices to fit with
+            X: The dataset features to fit on
+            y: The labels
+        """
+        return _fit_with_stats(self.estimator, support, X, y,
+                               getattr(self, 'stats', None))
+
 
 class SimulatedAnnealingFeatureSearch(BaseFeatureSearcher):
     """A simulated annealing search. Note that the neighbors could be
     more than just the addition/exclusion of a certain feature
 
     Also need to take another look at the acceptance function
+
+    With multiple chains, it is instead a parallel tempering search. Each
+    chain samples at a fixed temperature, and neighboring temperatures
+    periodically exchange their states. The chains' candidates for each step
+    are fit in parallel
     """
 
-    def __init__(self, estimator=None, iterations=None):
+    def __init__(self, estimator=None, iterations=None, n_chains=1,
+                 n_jobs=None, swap_interval=5, random_state=None,
+                 store=None, racing=None, surrogate=None, time_budget=None,
+                 max_evals=None, checkpoint=None, checkpoint_interval=60.):
         """Initialize a new annealing search
 
         Arguments:
             estimator: The class of a particular model to fit for.
                 Should have a support member and work in sklearn
             iterations: The number of attempts for a given search
+            n_chains: The number of parallel tempering chains. If 1, then
+                it is a single annealing chain
+            n_jobs: The number of processes to fit the chains' candidates
+                in (-1 for every cpu). If None, then they're fit serially
+            swap_interval: The number of steps between attempts to exchange
+                the states of neighboring chains
+            random_state: The seed of the search, for reproducibility. If
+                None, then numpy's global random state is used
+            store: A models.store.ScoreStore to look up the energies of
+                supports in before fitting them
+            racing: A models.racing.RacingEvaluator to score candidates
+                with (against the current states), instead of their
+                training accuracy
+            surrogate: A models.surrogate.Surrogate to pre-screen several
+                proposed neighbors with, so that each step only fits the
+                most promising one
+            time_budget: The seconds to search for before stopping with the
+                best found so far. If None, then it is unlimited
+            max_evals: The number of supports to fit before stopping with
+                the best found so far. If None, then it is unlimited
+            checkpoint: The file to periodically save the search's state
+                to, which it resumes from if restarted on the same data.
+                The data's fingerprint is added to the file's name
+            checkpoint_interval: The seconds between checkpoints
         """
         self.estimator = estimator
         self.iterations = iterations
+        self.n_chains = n_chains
+        self.n_jobs = n_jobs
+        self.swap_interval = swap_interval
+        self.random_state = random_state
+        self.store = store
+        self.racing = racing
+        self.surrogate = surrogate
+        self.time_budget = time_budget
+        self.max_evals = max_evals
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
 
     def search(self, X, y):
         """Method for discovering the next best feature subset
@@ -63,56 +455,276 @@ class SimulatedAnnealingFeatureSearch(BaseFeatureSearcher):
             X: The dataset features to fit on
             y: The labels
         """
+        if self.n_chains > 1:
+            return self._search_tempering(X, y)
+
+        rng = np.random if self.random_state is None else \
+            np.random.RandomState(self.random_state)
         n_features = len(X[0])
 
+        self._start_search(X, y)
+        scheme = self._scheme(ACCURACY) + BONUS
+
+        def energy(supports):
+            return self._evaluate(supports, X, y)
+
         full_features = set([x for x in range(n_features)])
-        state_f = set(np.random.choice(n_features,
-                                       np.random.randint(n_features),
-                                       replace=False))
+        resumed = self._resume(X, y)
+        if resumed is not None:
+            first, state_f, state_score, best_f, best_score, rng_state = \
+                resumed
+            rng.set_state(rng_state)
+        else:
+            # as Python ints, so that the supports compare, hash and save
+            # the same way as the other searchers'
+            state_f = set(rng.choice(n_features, rng.randint(n_features),
+                                     replace=False).tolist())
 
-        state = self.estimator(list(state_f)).fit(X, y)
-        state_score = self._energy(state, X, y, n_features)
+            state_score, = self._scores([list(state_f)], n_features, scheme,
+                                        energy)
+            first = 1
+            best_f, best_score = list(state_f), state_score
 
-        for k in range(1, self.iterations):
+        progress = (first, state_f, state_score, best_f, best_score,
+                    rng.get_state())
+        for k in range(first, self.iterations):
+            if self._exhausted():
+                break
             T = k * 1. / self.iterations
 
             # choose new neighbor
-            candidate_f = copy.deepcopy(state_f)
+            proposals = []
+            for _ in range(1 if self.surrogate is None else
+                           self.surrogate.proposals):
+                candidate_f = copy.deepcopy(state_f)
 
-            candidates = list(full_features - state_f)
-            addition = np.random.randint(len(candidates) + 1)
-            if addition < len(candidates):
-                candidate_f.add(candidates[addition])
+                # sorted, so a resumed search proposes the same neighbors
+                candidates = sorted(full_features - state_f)
+                addition = rng.randint(len(candidates) + 1)
+                if addition < len(candidates):
+                    candidate_f.add(candidates[addition])
 
-            removal = np.random.randint(len(state_f) + 1)
-            if removal < len(state_f):
-                candidate_f.remove(state.support[removal])
+                removal = rng.randint(len(state_f) + 1)
+                if removal < len(state_f):
+                    candidate_f.remove(sorted(state_f)[removal])
+                proposals.append(candidate_f)
+
+            candidate_f = proposals[0]
+            if self.surrogate is not None:
+                candidate_f = proposals[self.surrogate.screen(
+                        [list(c) for c in proposals], 1)[0]]
 
             # test new neighbor
-            candidate = self.estimator(list(candidate_f)).fit(X, y)
-            candidate_score = self._energy(candidate, X, y, n_features)
+            if self.racing is not None:
+                # the state races the candidate, so either may be eliminated
+                # (and a state eliminated before runs more of its folds)
+                state_score, candidate_score = self._scores(
+                        [list(state_f), list(candidate_f)], n_features,
+                        scheme, energy)
+            else:
+                candidate_score, = self._scores([list(candidate_f)],
+                                                n_features, scheme, energy)
+            if self.surrogate is not None:
+                self._observe([list(candidate_f)], [candidate_score])
 
             if (candidate_score > state_score or
-                    np.random.rand(1) <
+                    rng.rand(1) <
                     exp((candidate_score - state_score) / T)):
-                state = candidate
                 state_f = candidate_f
                 state_score = candidate_score
+            if state_score > best_score:
+                best_f, best_score = list(state_f), state_score
+
+            progress = (k + 1, state_f, state_score, best_f, best_score,
+                        rng.get_state())
+            self._checkpoint(progress)
+
+        self._finish(progress)
+        if self.stopped:
+            return self._fit_candidate(best_f, X, y)
+        return self._fit_candidate(list(state_f), X, y)
 
-        return state
+    def _search_tempering(self, X, y):
+        """Runs the parallel tempering search, returning the best estimator
+        found by any chain
 
-    def _energy(self, estimator, X, y, n_features):
-        return estimator.score(X, y) + \
-               (n_features - len(estimator.support)) * .1 / n_features
+        Arguments:
+            X: The dataset features to fit on
+            y: The labels
+        """
+        n_features = len(X[0])
+        self._start_search(X, y)
+        scheme = self._scheme(ACCURACY) + BONUS
+
+        seeds = np.random.SeedSequence(self.random_state).spawn(
+                self.n_chains + 1)
+        rngs = [np.random.default_rng(seed) for seed in seeds[:-1]]
+        swap_rng = np.random.default_rng(seeds[-1])
+        # the hottest chain is as hot as the end of the annealing schedule
+        temperatures = np.geomspace(1. / self.iterations, 1., self.n_chains)
+
+        resumed = self._resume(X, y)
+        if resumed is None:
+            states = [set(rng.choice(n_features, rng.integers(n_features),
+                                     replace=False).tolist())
+                      for rng in rngs]
+
+        pool = None
+        if self.n_jobs is not None:
+            pool = process_pool(self.n_jobs, _init_worker,
+                                (self.estimator, X, y,
+                                 getattr(self, 'folds', None)))
+
+        def evaluate(supports):
+            return self._evaluate(supports, X, y, pool)
+
+        try:
+            if resumed is not None:
+                first, states, energies, best_f, best_score, rngs, \
+                    swap_rng = resumed
+            else:
+                energies = self._scores([sorted(s) for s in states],
+                                        n_features, scheme, evaluate)
+                best = int(np.argmax(energies))
+                best_f, best_score = sorted(states[best]), energies[best]
+                first = 1
+
+            progress = (first, states, energies, best_f, best_score, rngs,
+                        swap_rng)
+            for k in range(first, self.iterations):
+                if self._exhausted():
+                    break
+                candidates = [self._neighbor(state, n_features, rng)
+                              for state, rng in zip(states, rngs)]
+                if self.surrogate is not None:
+                    candidates = [self._screen(state, candidate, n_features,
+                                               rng)
+                                  for state, candidate, rng in zip(
+                                      states, candidates, rngs)]
+                if self.racing is not None:
+                    # the chains' states race their candidates
+                    raced = self._scores([sorted(s) for s in states] +
+                                         [sorted(c) for c in candidates],
+                                         n_features, scheme, evaluate)
+                    energies = raced[:self.n_chains]
+                    cand_energies = raced[self.n_chains:]
+                else:
+                    cand_energies = self._scores(
+                            [sorted(c) for c in candidates], n_features,
+                            scheme, evaluate)
+                if self.surrogate is not None:
+                    self._observe([sorted(c) for c in candidates],
+                                  cand_energies)
+
+                for c in range(self.n_chains):
+                    if (cand_energies[c] > energies[c] or
+                            rngs[c].random() <
+                            exp((cand_energies[c] - energies[c]) /
+                                temperatures[c])):
+                        states[c] = candidates[c]
+                        energies[c] = cand_energies[c]
+                    if energies[c] > best_score:
+                        best_f, best_score = sorted(states[c]), energies[c]
+
+                if k % self.swap_interval == 0:
+                    # alternate between the even and odd pairs of chains
+                    for c in range((k // self.swap_interval) % 2,
+                                   self.n_chains - 1, 2):
+                        delta = (energies[c + 1] - energies[c]) * \
+                            (1. / temperatures[c] - 1. / temperatures[c + 1])
+                        if delta >= 0 or swap_rng.random() < exp(delta):
+                            states[c], states[c + 1] = \
+                                states[c + 1], states[c]
+                            energies[c], energies[c + 1] = \
+                                energies[c + 1], energies[c]
+
+                progress = (k + 1, states, energies, best_f, best_score,
+                            rngs, swap_rng)
+                self._checkpoint(progress)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self._finish(progress)
+        return self._fit_candidate(best_f, X, y)
+
+    def _evaluate(self, supports, X, y, pool=None):
+        """Returns the energies of supports, which are raced if the searcher
+        has a racing evaluator
+
+        Arguments:
+            supports: The list of supports (lists of feature indices)
+            X: The dataset features to fit on
+            y: The labels
+            pool: The process pool to fit in. If None, then serially
+        """
+        n_features = X.shape[1]
+        if self.racing is not None:
+            return [score + (n_features - len(support)) * .1 / n_features
+                    for support, score in zip(
+                        supports, self._race(supports, X, y, pool))]
+        if pool is not None:
+            return list(pool.map(_worker_energy, supports))
+        return [_energy(self._fit_candidate(support, X, y), X, y, n_features)
+                for support in supports]
+
+    def _screen(self, state_f, candidate_f, n_features, rng):
+        """Proposes more neighbors of a chain's state, and returns the one
+        (of those and candidate_f) which the surrogate finds most promising
+
+        Arguments:
+            state_f: The set of features of the state
+            candidate_f: The chain's first proposed neighbor
+            n_features: The total number of features
+            rng: The chain's numpy.random.Generator
+        """
+        proposals = [candidate_f] + \
+            [self._neighbor(state_f, n_features, rng)
+             for _ in range(self.surrogate.proposals - 1)]
+        return proposals[self.surrogate.screen(
+                [sorted(c) for c in proposals], 1)[0]]
+
+    def _neighbor(self, state_f, n_features, rng):
+        """Proposes a neighbor of a chain's state by possibly adding one
+        feature and possibly removing another
+
+        Arguments:
+            state_f: The set of features of the state
+            n_features: The total number of features
+            rng: The chain's numpy.random.Generator
+        """
+        candidate_f = set(state_f)
+
+        candidates = sorted(set(range(n_features)) - state_f)
+        addition = rng.integers(len(candidates) + 1)
+        if addition < len(candidates):
+            candidate_f.add(candidates[addition])
+
+        current = sorted(state_f)
+        removal = rng.integers(len(current) + 1)
+        if removal < len(current):
+            candidate_f.remove(current[removal])
+
+        return candidate_f
 
 
 class GeneticFeatureSearch(BaseFeatureSearcher):
-    """This class uses a public source to perform a genetic search over the
-    feature space.
+    """A genetic search over the feature space. Each individual's genome is
+    its support packed as a bitset (uint64 words), so the population is a
+    single array which crossover, mutation and tournament selection operate
+    on at once. The fitness of an individual is the cross validated accuracy
+    of the estimator on its support. It is memoized by genome, so repeated
+    individuals are never refit, and the new genomes of a generation are
+    evaluated in parallel
     """
 
     def __init__(self, estimator=None, population=None,
-                 generations=None, verbose=0):
+                 generations=None, verbose=0, cv=10, n_jobs=None,
+                 crossover_proba=.5, crossover_independent_proba=.1,
+                 mutation_proba=.2, mutation_independent_proba=.05,
+                 tournament_size=3, random_state=None, store=None,
+                 racing=None, surrogate=None, time_budget=None,
+                 max_evals=None, checkpoint=None, checkpoint_interval=60.):
         """The initializer.
 
         Arguments:
@@ -120,11 +732,56 @@ class GeneticFeatureSearch(BaseFeatureSearcher):
                 Should have a support member and work in sklearn
             population: The number of models to have per generation
             generations: The number of generations to search for
+            verbose: Whether to print the best fitness of each generation
+            cv: The number of stratified folds to score each support with
+            n_jobs: The number of processes to evaluate the fitness in (-1
+                for every cpu). If None, then it is evaluated serially
+            crossover_proba: The probability a pair of individuals is crossed
+            crossover_independent_proba: The probability each feature is
+                exchanged when a pair is crossed
+            mutation_proba: The probability an individual is mutated
+            mutation_independent_proba: The probability each feature is
+                flipped when an individual is mutated
+            tournament_size: The number of individuals in each selection
+                tournament
+            random_state: The seed of the search, for reproducibility
+            store: A models.store.ScoreStore to look up the fitness of
+                genomes in before fitting them
+            racing: A models.racing.RacingEvaluator to score the new genomes
+                of each generation with (against the best so far), instead
+                of scoring every one on all cv folds
+            surrogate: A models.surrogate.Surrogate to pre-screen more
+                offspring with, so that only the most promising population
+                of them are fit
+            time_budget: The seconds to search for before stopping with the
+                best found so far. If None, then it is unlimited
+            max_evals: The number of supports to fit before stopping with
+                the best found so far. If None, then it is unlimited
+            checkpoint: The file to periodically save the search's state
+                to, which it resumes from if restarted on the same data.
+                The data's fingerprint is added to the file's name
+            checkpoint_interval: The seconds between checkpoints
         """
         self.estimator = estimator
         self.population = population
         self.generations = generations
         self.verbose = verbose
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.crossover_proba = crossover_proba
+        self.crossover_independent_proba = crossover_independent_proba
+        self.mutation_proba = mutation_proba
+        self.mutation_independent_proba = mutation_independent_proba
+        self.tournament_size = tournament_size
+        self.random_state = random_state
+        self.store = store
+        self.racing = racing
+        self.surrogate = surrogate
+        self.time_budget = time_budget
+        self.max_evals = max_evals
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.fitness_memo = {}
 
     def search(self, X, y):
         """Discovering the next best feature subset via genetic algorithms
@@ -133,13 +790,175 @@ class GeneticFeatureSearch(BaseFeatureSearcher):
             X: The dataset features to fit on
             y: The labels
         """
-        model = GeneticSelectionCV(self.estimator(), cv=10, scoring='accuracy',
-                                   n_population=self.population,
-                                   n_generations=self.generations,
-                                   verbose=self.verbose).fit(X, y)
-        support = [i for i, val in enumerate(model.support_) if val]
+        n_features = X.shape[1]
+        rng = np.random.default_rng(self.random_state)
+        self._start_search(X, y)
+        self.fitness_memo = {}
+        scheme = self._scheme('stratified {}-fold accuracy'.format(self.cv))
+
+        if self.racing is not None:
+            folds, fold_stats = self.folds, self.fold_stats
+        else:
+            folds = list(StratifiedKFold(self.cv).split(X, y))
+            fold_stats = [self.stats.excluding(test_idx)
+                          for _, test_idx in folds]
+        # the support of the best genome so far, which the new genomes race
+        leader = []
+
+        pool = None
+        if self.n_jobs is not None:
+            pool = process_pool(self.n_jobs, _init_worker,
+                                (self.estimator, X, y, folds))
+
+        def evaluate(supports):
+            if self.racing is not None:
+                return self._race(leader + supports, X, y,
+                                  pool)[len(leader):]
+            if pool is not None:
+                return list(pool.map(_worker_cv_score, supports))
+            return [_cv_score(self.estimator, support, X, y, folds,
+                              fold_stats)
+                    for support in supports]
+
+        def fitness(genomes):
+            keys = [genome.tobytes() for genome in genomes]
+            new = {}
+            for key, genome in zip(keys, genomes):
+                if key not in self.fitness_memo and key not in new:
+                    new[key] = self._support(genome, n_features)
+            supports = list(new.values())
+            scores = self._scores(supports, n_features, scheme, evaluate)
+            self.fitness_memo.update(zip(new, scores))
+            if self.surrogate is not None:
+                self._observe(supports, scores)
+            return np.array([self.fitness_memo[key] for key in keys])
+
+        resumed = self._resume(X, y)
+        try:
+            if resumed is not None:
+                first, genomes, scores, best_genome, best_score, rng, \
+                    self.fitness_memo = resumed
+            else:
+                genomes = self._repair(self._pack(
+                        rng.random((self.population, n_features)) < .5),
+                        n_features, rng)
+                scores = fitness(genomes)
+                best = int(np.argmax(scores))
+                best_genome, best_score = genomes[best].copy(), scores[best]
+                first = 0
+            leader[:] = [self._support(best_genome, n_features)]
+
+            progress = (first, genomes, scores, best_genome, best_score, rng,
+                        self.fitness_memo)
+            for generation in range(first, self.generations):
+                if self._exhausted():
+                    break
+                n_offspring = self.population if self.surrogate is None \
+                    else self.population * self.surrogate.proposals
+                genomes = self._select(genomes, scores, rng, n_offspring)
+                genomes = self._crossover(genomes, n_features, rng)
+                genomes = self._mutate(genomes, n_features, rng)
+                if self.surrogate is not None:
+                    genomes = genomes[np.sort(self.surrogate.screen(
+                            [self._support(genome, n_features)
+                             for genome in genomes], self.population))]
+                # the best individual always survives
+                genomes[0] = best_genome
+                scores = fitness(genomes)
+
+                best = int(np.argmax(scores))
+                if scores[best] > best_score:
+                    best_genome, best_score = genomes[best].copy(), \
+                        scores[best]
+                    leader[:] = [self._support(best_genome, n_features)]
+                if self.verbose:
+                    print('Generation', generation, 'best fitness:',
+                          best_score, 'evaluated:', len(self.fitness_memo))
+                    if self.store is not None:
+                        print('Score store hit rate:', self.store.hit_rate)
+
+                progress = (generation + 1, genomes, scores, best_genome,
+                            best_score, rng, self.fitness_memo)
+                self._checkpoint(progress)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self._finish(progress)
+        return self._fit_candidate(self._support(best_genome, n_features),
+                                   X, y)
+
+    def _pack(self, bits):
+        """Packs boolean rows of features into rows of uint64 words
+        """
+        n_words = -(-bits.shape[1] // 64)
+        padded = np.zeros((bits.shape[0], n_words * 64), dtype=bool)
+        padded[:, :bits.shape[1]] = bits
+        return np.packbits(padded, axis=1, bitorder='little').view('<u8')
+
+    def _unpack(self, genomes, n_features):
+        """Unpacks rows of uint64 words into boolean rows of features
+        """
+        return np.unpackbits(np.ascontiguousarray(genomes).view(np.uint8),
+                             axis=1, bitorder='little')[:, :n_features] \
+            .astype(bool)
+
+    def _support(self, genome, n_features):
+        """Returns the feature indices of a genome
+        """
+        return np.flatnonzero(self._unpack(genome[None], n_features)[0]) \
+            .tolist()
+
+    def _select(self, genomes, scores, rng, n_selected):
+        """Selects n_selected individuals by tournaments between random
+        individuals
+        """
+        entrants = rng.integers(len(genomes),
+                                size=(n_selected, self.tournament_size))
+        winners = entrants[np.arange(n_selected),
+                           np.argmax(scores[entrants], axis=1)]
+        return genomes[winners]
+
+    def _crossover(self, genomes, n_features, rng):
+        """Uniformly crosses consecutive pairs of individuals, exchanging
+        the bits of a random mask
+        """
+        n_pairs = len(genomes) // 2
+        crossed = rng.random(n_pairs) < self.crossover_proba
+        masks = self._pack(rng.random((n_pairs, n_features)) <
+                           self.crossover_independent_proba)
+        masks[~crossed] = 0
+
+        genomes = genomes.copy()
+        first = genomes[0:2 * n_pairs:2]
+        second = genomes[1:2 * n_pairs:2]
+        exchanged = (first ^ second) & masks
+        genomes[0:2 * n_pairs:2] = first ^ exchanged
+        genomes[1:2 * n_pairs:2] = second ^ exchanged
+        return self._repair(genomes, n_features, rng)
+
+    def _mutate(self, genomes, n_features, rng):
+        """Flips the bits of a random mask in some of the individuals
+        """
+        mutated = rng.random(len(genomes)) < self.mutation_proba
+        flips = self._pack(rng.random((len(genomes), n_features)) <
+                           self.mutation_independent_proba)
+        flips[~mutated] = 0
+        return self._repair(genomes ^ flips, n_features, rng)
 
-        return self.estimator(support).fit(X, y)
+    def _repair(self, genomes, n_features, rng):
+        """Gives each empty individual a random feature, since an empty
+        support can't be fit
+        """
+        empty = np.flatnonzero(~np.any(genomes, axis=1))
+        if len(empty) == 0:
+            return genomes
+        bits = np.zeros((len(empty), n_features), dtype=bool)
+        bits[np.arange(len(empty)),
+             rng.integers(n_features, size=len(empty))] = True
+        genomes = genomes.copy()
+        genomes[empty] = self._pack(bits)
+        return genomes
 
 
 class MIMnFeatureSearch(BaseFeatureSearcher):
@@ -147,7 +966,9 @@ class MIMnFeatureSearch(BaseFeatureSearcher):
     search over the n parameter
     """
 
-    def __init__(self, estimator=None, min_n=None, max_n=None):
+    def __init__(self, estimator=None, min_n=None, max_n=None, selector=MIM,
+                 store=None, racing=None, time_budget=None, max_evals=None,
+                 checkpoint=None, checkpoint_interval=60.):
         """The initializer
 
         Arguments:
@@ -155,10 +976,31 @@ class MIMnFeatureSearch(BaseFeatureSearcher):
                 with a MIM
             min_n: The minimum n to test
             max_n: The maximum n to test
+            selector: The MIM class to wrap the estimator with, i.e. MIM or
+                one of the greedy selectors MRMR, JMI or CMIM
+            store: A models.store.ScoreStore to look up the scores of each n
+                in before fitting them
+            racing: A models.racing.RacingEvaluator to score every n with at
+                once, instead of by their training accuracy
+            time_budget: The seconds to search for before stopping with the
+                best found so far. If None, then it is unlimited
+            max_evals: The number of supports to fit before stopping with
+                the best found so far. If None, then it is unlimited
+            checkpoint: The file to periodically save the search's state
+                to, which it resumes from if restarted on the same data.
+                The data's fingerprint is added to the file's name
+            checkpoint_interval: The seconds between checkpoints
         """
         self.estimator = estimator
         self.min_n = min_n
         self.max_n = max_n
+        self.selector = selector
+        self.store = store
+        self.racing = racing
+        self.time_budget = time_budget
+        self.max_evals = max_evals
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
 
     def search(self, X, y):
         """Find the best value of n for a MIM object over the estimator
@@ -167,15 +1009,235 @@ class MIMnFeatureSearch(BaseFeatureSearcher):
             X: The dataset features to fit on
             y: The labels
         """
-        best = MIM(estimator=self.estimator, n=self.min_n).fit(X, y)
-        best_score = best.score(X, y)
+        # the supports are prefixes of the same ranking, so it is only
+        # computed once (from the shared statistics, recoded as MIM counts)
+        self._start_search(X, y)
+        ranking = self.selector(n=self.max_n).rank(
+                self.stats.with_missing_values(MISSING_VALUES),
+                np.arange(X.shape[1]))
+
+        models = {}
+
+        def candidate(support):
+            return self.selector(estimator=self.estimator, support=support,
+                                 n=len(support), stats=self.stats)
+
+        def evaluate(supports):
+            if self.racing is not None:
+                return self._race(supports, X, y, estimator=candidate)
+            scores = []
+            for support in supports:
+                models[len(support)] = candidate(support).fit(X, y)
+                scores.append(models[len(support)].score(X, y))
+            return scores
+
+        identity = None
+        if self.store is not None:
+            # n is the length of the support
+            identity = self.store.identity(
+                    self.selector(estimator=self.estimator, n=None))
+        supports = [ranking[0:n] for n in range(self.min_n, self.max_n + 1)]
+        scheme = self._scheme(ACCURACY)
+        scores = self._resume(X, y)
+        if scores is None and self.racing is not None:
+            # the candidates race together, so they're scored at once
+            scores = self._scores(supports, X.shape[1], scheme, evaluate,
+                                  identity)
+        scores = [] if scores is None else scores
+        for support in supports[len(scores):]:
+            if len(scores) > 0 and self._exhausted():
+                break
+            scores += self._scores([support], X.shape[1], scheme, evaluate,
+                                   identity)
+            self._checkpoint(scores)
+        self._finish(scores)
+
+        # the first of the best scores, so ties go to the smallest n
+        best = self.min_n + int(np.argmax(scores))
+        if best not in models:
+            models[best] = candidate(ranking[0:best]).fit(X, y)
+        return models[best]
+
+
+class FloatingFeatureSearch(BaseFeatureSearcher):
+    """A sequential floating search (SFFS forward, or SBFS backward). Each
+    step takes the best of all of the single feature additions (or removals)
+    of the current support, and then takes the best opposite steps for as
+    long as they beat the best support of their size found so far. The
+    candidates of a step are scored in parallel, and share the searcher's
+    sufficient statistics, so the count tables are only counted once for
+    the whole search
+    """
+
+    def __init__(self, estimator=None, direction='forward',
+                 max_features=None, patience=None, max_evals=None,
+                 n_jobs=None, store=None, racing=None, time_budget=None,
+                 checkpoint=None, checkpoint_interval=60.):
+        """The initializer
+
+        Arguments:
+            estimator: The class of a particular model to fit for.
+                Should have a support member and work in sklearn
+            direction: 'forward' to start from no features and add them, or
+                'backward' to start from every feature and remove them
+            max_features: The largest support to return. The forward search
+                stops once it is reached. If None, then every feature
+            patience: The number of steps without a better support before
+                stopping. If None, then it is unlimited
+            max_evals: The number of supports to fit before stopping with
+                the best found so far, which is checked between steps. If
+                None, then it is unlimited
+            n_jobs: The number of processes to score the candidates of each
+                step in (-1 for every cpu). If None, then they're serial
+            store: A models.store.ScoreStore to look up the scores of
+                supports in before fitting them
+            racing: A models.racing.RacingEvaluator to score each step's
+                candidates with, instead of by their training accuracy
+            time_budget: The seconds to search for before stopping with the
+                best found so far, which is checked between steps. If None,
+                then it is unlimited
+            checkpoint: The file to save the search's state to after each
+                step (at most every checkpoint_interval seconds), which it
+                resumes from if restarted on the same data. The data's
+                fingerprint is added to the file's name
+            checkpoint_interval: The seconds between checkpoints
+        """
+        self.estimator = estimator
+        self.direction = direction
+        self.max_features = max_features
+        self.patience = patience
+        self.max_evals = max_evals
+        self.n_jobs = n_jobs
+        self.store = store
+        self.racing = racing
+        self.time_budget = time_budget
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+
+    def search(self, X, y):
+        """Floats through the supports, returning the estimator fit on the
+        best one found
+
+        Arguments:
+            X: The dataset features to fit on
+            y: The labels
+        """
+        if self.direction not in ('forward', 'backward'):
+            raise ValueError('Unknown direction ' + str(self.direction))
+
+        n_features = X.shape[1]
+        forward = self.direction == 'forward'
+        max_features = n_features if self.max_features is None else \
+            min(max(self.max_features, 1), n_features)
+        self._start_search(X, y)
+        scheme = self._scheme(ACCURACY)
+        resumed = self._resume(X, y)
+
+        pool = None
+        if self.n_jobs is not None:
+            pool = process_pool(self.n_jobs, _init_worker,
+                                (self.estimator, X, y,
+                                 getattr(self, 'folds', None)))
+
+        def score(supports):
+            return self._scores(supports, n_features, scheme,
+                                lambda s: self._evaluate(s, X, y, pool))
+
+        # the best score and support of each size
+        best_by_size = {}
+        best = None
+
+        def record(support, support_score):
+            size = len(support)
+            if size not in best_by_size or \
+                    support_score > best_by_size[size][0]:
+                best_by_size[size] = (support_score, support)
+            nonlocal best
+            if size <= max_features and \
+                    (best is None or support_score > best[0]):
+                best = (support_score, support)
+                return True
+            return False
+
+        try:
+            if resumed is not None:
+                current, best_by_size, best, stale = resumed
+            else:
+                current = [] if forward else list(range(n_features))
+                if not forward:
+                    record(current, score([current])[0])
+                stale = 0
 
-        for n in range(self.min_n + 1, self.max_n + 1):
-            candidate = MIM(estimator=self.estimator, n=n).fit(X, y)
-            cand_score = candidate.score(X, y)
+            # there's always a best support of at most max_features
+            while best is None or not self._exhausted():
+                if (forward and len(current) >= max_features) or \
+                        (not forward and len(current) <= 1):
+                    break
+                candidates = self._neighbors(current, n_features, forward)
+                scores = score(candidates)
+                k = int(np.argmax(scores))
+                moved = set(current).symmetric_difference(candidates[k])
+                current = candidates[k]
+                improved = record(current, scores[k])
 
-            if cand_score > best_score:
-                best = candidate
-                best_score = cand_score
+                # float back while it beats the best support of that size
+                while not self._exhausted() and \
+                        (len(current) > 1 if forward else
+                         len(current) < n_features):
+                    candidates = [c for c in self._neighbors(
+                                      current, n_features, not forward)
+                                  if moved.isdisjoint(
+                                      set(current).symmetric_difference(c))]
+                    if len(candidates) == 0:
+                        break
+                    scores = score(candidates)
+                    k = int(np.argmax(scores))
+                    size = len(candidates[k])
+                    if size in best_by_size and \
+                            scores[k] <= best_by_size[size][0]:
+                        break
+                    current = candidates[k]
+                    improved = record(current, scores[k]) or improved
 
-        return best
+                if len(current) <= max_features:
+                    stale = 0 if improved else stale + 1
+                self._checkpoint((current, best_by_size, best, stale))
+                if self.patience is not None and stale >= self.patience:
+                    break
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self._finish((current, best_by_size, best, stale))
+
+        return self._fit_candidate(best[1], X, y)
+
+    def _neighbors(self, support, n_features, forward):
+        """Returns the supports adding (or removing) one feature of support
+
+        Arguments:
+            support: The sorted list of feature indices
+            n_features: The total number of features
+            forward: Whether to add features rather than remove them
+        """
+        if forward:
+            return [sorted(support + [f]) for f in range(n_features)
+                    if f not in support]
+        return [[s for s in support if s != f] for f in support]
+
+    def _evaluate(self, supports, X, y, pool=None):
+        """Returns the scores of supports, which are raced if the searcher
+        has a racing evaluator
+
+        Arguments:
+            supports: The list of supports (lists of feature indices)
+            X: The dataset features to fit on
+            y: The labels
+            pool: The process pool to fit in. If None, then serially
+        """
+        if self.racing is not None:
+            return self._race(supports, X, y, pool)
+        if pool is not None:
+            return list(pool.map(_worker_accuracy, supports))
+        return [self._fit_candidate(support, X, y).score(X, y)
+                for support in supports]
@@ -0,0 +1,121 @@
+# shared.py
+#
+# Developed by Liam McInroy
+
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+
+class SharedArray:
+    """A numpy array which is copied into shared memory once, so that the
+    worker processes of a pool attach to it read-only instead of each
+    receiving (or pickling) their own copy. Only the name of the memory,
+    the shape and the dtype are pickled
+    """
+
+    def __init__(self, arr):
+        """Copies arr into a new block of shared memory
+
+        Arguments:
+            arr: The array to share, which may not have an object dtype
+        """
+        arr = np.ascontiguousarray(arr)
+        if arr.dtype.hasobject:
+            raise ValueError('Arrays of objects can not be shared')
+
+        self.shape = arr.shape
+        self.dtype = arr.dtype.str
+        self.memory = SharedMemory(create=True, size=max(arr.nbytes, 1))
+        self.name = self.memory.name
+        self.owner = True
+        np.ndarray(self.shape, self.dtype, buffer=self.memory.buf)[...] = arr
+
+    def attach(self):
+        """Returns the read-only array in the shared memory
+        """
+        if self.memory is None:
+            self.memory = SharedMemory(name=self.name)
+            # only the creator's tracker should unlink the memory
+            resource_tracker.unregister(self.memory._name, 'shared_memory')
+        arr = np.ndarray(self.shape, self.dtype, buffer=self.memory.buf)
+        arr.flags.writeable = False
+        return arr
+
+    def close(self):
+        """Detaches from the shared memory, and frees it if this is the
+        process which created it
+        """
+        if self.memory is None:
+            return
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+        self.memory = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['memory'] = None
+        state['owner'] = False
+        return state
+
+
+def share(arr):
+    """Returns a SharedArray of arr, or arr itself if it holds objects
+    (which must then be copied to each worker)
+
+    Arguments:
+        arr: The array to share
+    """
+    if np.asarray(arr).dtype.hasobject:
+        return arr
+    return SharedArray(arr)
+
+
+def attach(arr):
+    """Returns the array of a SharedArray, or arr itself if it isn't one
+
+    Arguments:
+        arr: The SharedArray (or array) from share
+    """
+    if isinstance(arr, SharedArray):
+        return arr.attach()
+    return arr
+
+
+def n_workers(n_jobs):
+    """The number of processes for n_jobs, where negative values count back
+    from the number of cpus (i.e. -1 is all of them)
+
+    Arguments:
+        n_jobs: The number of processes, or None for 1
+    """
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(os.cpu_count() + 1 + n_jobs, 1)
+    return n_jobs
+
+
+def process_pool(n_jobs, initializer, initargs=()):
+    """Returns a pool of n_workers(n_jobs) processes, which are always forked
+    so that they inherit the initializer's arguments instead of having them
+    pickled. The models given to the workers are often generated classes
+    (i.e. from mim.MIMGenerator), which can't be pickled, so the pools
+    can't use the spawn (or forkserver) start method. So parallelism (any
+    n_jobs) is only supported on POSIX systems: fork doesn't exist on
+    Windows, and isn't safe on macOS
+
+    Arguments:
+        n_jobs: The number of processes (-1 for every cpu)
+        initializer: The function each worker calls when it starts
+        initargs: The arguments of the initializer
+    """
+    return ProcessPoolExecutor(n_workers(n_jobs),
+                               mp_context=multiprocessing.get_context('fork'),
+                               initializer=initializer, initargs=initargs)
@@ -0,0 +1,474 @@
+# statistics.py
+#
+# Developed by Liam McInroy
+
+
+import copy
+
+import numpy as np
+
+from estimators.models.encoding import CategoricalEncoder
+
+
+class CannotUpdate(Exception):
+    """Raised by the update method of a fitted model which can't be updated
+    with the rows which changed, in which case it must be refit
+    """
+    pass
+
+
+class SufficientStatistics:
+    """The count tables of a categorical dataset, so that the many models
+    which are fit on the same data (i.e. during a feature search) can share
+    them instead of each scanning the samples. The joint counts of a tuple
+    of features with the label are computed when first requested and then
+    memoized.
+
+    Only the active rows are counted. Rows can be removed and added back
+    (i.e. for the folds of a cross validation), which updates the memoized
+    tables by counting just those rows
+    """
+
+    def __init__(self, X, y, missing_values=()):
+        """Encodes the dataset once
+
+        Arguments:
+            X: The dataset features
+            y: The labels
+            missing_values: The values (as strings) to treat as missing. Rows
+                missing a feature are left out of that feature's counts
+        """
+        self.encoder = CategoricalEncoder(missing_values=missing_values).fit(X)
+        self.codes = self.encoder.transform(X)
+        self.cardinalities = self.encoder.cardinalities
+
+        y = np.asarray(y).astype(str).ravel()
+        self.classes = np.unique(y)
+        self.labels = np.searchsorted(self.classes, y)
+
+        self.active = np.ones(len(self.labels), dtype=bool)
+        self.base = None
+        self.joint_cache = {}
+        self.tables = None
+        # the information.PairwiseInformation, filled in when first needed
+        self.pairwise = None
+        # the statistics with more missing values, by with_missing_values
+        self.variants = {}
+
+    @property
+    def n_samples(self):
+        """The number of active samples
+        """
+        return int(np.count_nonzero(self.active))
+
+    @property
+    def active_codes(self):
+        """The encoded features of the active rows
+        """
+        return self.codes[self.active]
+
+    @property
+    def active_labels(self):
+        """The encoded labels of the active rows
+        """
+        return self.labels[self.active]
+
+    def joint_counts(self, features):
+        """Returns the contingency table of the given features with the
+        label, which has an axis for each feature (in order) and then the
+        label. Rows where any of the features are missing are not counted
+
+        Arguments:
+            features: The tuple of feature indices
+        """
+        features = tuple(int(f) for f in features)
+        if features not in self.joint_cache:
+            if self.base is not None:
+                # derived from the full data's table less the excluded rows
+                excluded, = np.where(self.base.active & ~self.active)
+                self.joint_cache[features] = \
+                    self.base.joint_counts(features) - \
+                    self._count_joint(features, excluded)
+            else:
+                self.joint_cache[features] = self._count_joint(
+                        features, np.flatnonzero(self.active))
+        return self.joint_cache[features]
+
+    def feature_label_tables(self, features=None):
+        """Returns the contingency table of each feature with the label,
+        counted for all of the features at once. The tables are padded to the
+        largest cardinality, so the result has axes (feature, category,
+        label). Rows where a feature is missing are not counted in its table
+
+        Arguments:
+            features: The feature indices. If None, then all of them
+        """
+        if self.tables is None:
+            if self.base is not None:
+                excluded, = np.where(self.base.active & ~self.active)
+                self.tables = self.base.feature_label_tables() - \
+                    self._count_tables(excluded)
+            else:
+                self.tables = self._count_tables(np.flatnonzero(self.active))
+
+        if features is None:
+            return self.tables
+        return self.tables[np.asarray(features, dtype=int)]
+
+    def pair_label_tables(self, feature, others):
+        """Returns the contingency table of a feature, each of the other
+        features and the label, counted for all of the others at once. The
+        tables are padded to the largest cardinality of the others, so the
+        result has axes (other, feature category, other category, label).
+        Rows where either feature is missing are not counted in a table
+
+        Arguments:
+            feature: The feature index
+            others: The indices of the other features
+        """
+        others = np.asarray(others, dtype=int)
+        n_classes = len(self.classes)
+        n_feature = max(int(self.cardinalities[feature]), 1)
+        width = max(int(self.cardinalities[others].max(initial=0)), 1)
+
+        codes = self.active_codes
+        labels = self.active_labels
+        other_codes = codes[:, others]
+        rows, cols = np.nonzero((other_codes >= 0) &
+                                (codes[:, [feature]] >= 0))
+        index = ((cols * n_feature + codes[rows, feature]) * width +
+                 other_codes[rows, cols]) * n_classes + labels[rows]
+        return np.bincount(index, minlength=len(others) * n_feature * width *
+                           n_classes).reshape(len(others), n_feature, width,
+                                              n_classes)
+
+    def feature_counts(self, feature):
+        """Returns the contingency table of a single feature with the label
+
+        Arguments:
+            feature: The feature index
+        """
+        return self.joint_counts((feature,))
+
+    def label_counts(self):
+        """Returns the counts of each label
+        """
+        return self.joint_counts(())
+
+    def observed(self, feature):
+        """Returns the mask of the feature's categories which occur in the
+        active rows
+
+        Arguments:
+            feature: The feature index
+        """
+        table = self.feature_label_tables([feature])[0]
+        return table[:self.cardinalities[feature]].sum(axis=-1) > 0
+
+    def observed_cardinalities(self):
+        """Returns the number of categories of each feature which occur in
+        the active rows
+        """
+        return np.count_nonzero(self.feature_label_tables().sum(axis=-1) > 0,
+                                axis=1)
+
+    def conditional(self, features):
+        """Returns the maximum likelihood conditional probability table of
+        the label given the features. Parent configurations which were never
+        observed are given a uniform distribution
+
+        Arguments:
+            features: The tuple of feature (parent) indices
+        """
+        counts = self.joint_counts(features).astype(float)
+        totals = counts.sum(axis=-1, keepdims=True)
+        return np.where(totals > 0, counts / np.maximum(totals, 1),
+                        1. / len(self.classes))
+
+    def marginal(self, feature):
+        """Returns the maximum likelihood distribution of a feature
+
+        Arguments:
+            feature: The feature index
+        """
+        counts = self.feature_counts(feature).sum(axis=-1).astype(float)
+        return counts / max(counts.sum(), 1)
+
+    def remove(self, indices):
+        """Stops counting the given rows, updating the memoized tables by
+        subtracting just their counts
+
+        Arguments:
+            indices: The row indices to remove
+        """
+        indices = np.asarray(indices, dtype=int)
+        indices = np.unique(indices[self.active[indices]])
+        self._update(indices, -1)
+        self.active[indices] = False
+
+    def add(self, indices):
+        """Counts the given (removed) rows again, updating the memoized
+        tables by adding just their counts
+
+        Arguments:
+            indices: The row indices to add back
+        """
+        indices = np.asarray(indices, dtype=int)
+        indices = np.unique(indices[~self.active[indices]])
+        self._update(indices, 1)
+        self.active[indices] = True
+
+    def matches(self, X, y, features=None):
+        """Returns whether the given rows are the active rows (in order),
+        comparing their labels and the codes of the given features, i.e. to
+        check that a model is fit on the data these statistics counted
+
+        Arguments:
+            X: The rows' features
+            y: Their labels
+            features: The feature indices to compare. If None, then all of
+                them
+        """
+        if len(X) != self.n_samples:
+            return False
+        features = self.encoder.columns if features is None else \
+            [int(f) for f in features]
+
+        y = np.asarray(y).astype(str).ravel()
+        labels = np.searchsorted(self.classes, y)
+        labels[labels == len(self.classes)] = 0
+        if not np.array_equal(self.classes[labels], y) or \
+                not np.array_equal(labels, self.active_labels):
+            return False
+
+        positions = [self.encoder.columns.index(f) for f in features]
+        encoder = CategoricalEncoder(
+                columns=list(range(len(features))),
+                missing_values=self.encoder.missing_values,
+                vocabularies={k: self.encoder.vocabularies[f]
+                              for k, f in enumerate(features)})
+        return np.array_equal(encoder.transform(np.asarray(X)[:, features]),
+                              self.active_codes[:, positions])
+
+    def match(self, X, y):
+        """Returns the index of an active row equal to each of the given rows
+        (where each active row is matched at most once), i.e. to remove the
+        rows of a training set by their values
+
+        Arguments:
+            X: The rows' features
+            y: Their labels
+        """
+        codes = self.encoder.transform(X)
+        y = np.asarray(y).astype(str).ravel()
+        labels = np.searchsorted(self.classes, y)
+        labels[labels == len(self.classes)] = 0
+
+        if np.any(self.classes[labels] != y):
+            raise ValueError('A row to match is not one of the active rows')
+
+        # group the active rows and the given rows by their values, so that
+        # the k-th given row of a group is matched to its k-th active row
+        active = np.flatnonzero(self.active)
+        rows = np.hstack((np.vstack((self.codes[active], codes)) + 1,
+                          np.append(self.labels[active], labels)[:, None]))
+        shape = tuple(self.cardinalities + 1) + (len(self.classes),)
+        if np.prod(shape, dtype=float) < 2 ** 62:
+            groups = np.ravel_multi_index(tuple(rows.T), shape)
+        else:
+            rows = np.ascontiguousarray(rows, dtype=np.int64)
+            rows = rows.view(np.dtype((np.void,
+                                       rows.itemsize * rows.shape[1])))
+            groups = np.unique(rows.ravel(), return_inverse=True)[1].ravel()
+        active_groups, groups = groups[:len(active)], groups[len(active):]
+
+        order = np.argsort(active_groups, kind='stable')
+        starts = np.searchsorted(active_groups[order], groups)
+        positions = starts + self._occurrence(groups)
+        found = positions < len(active)
+        found[found] = active_groups[order[positions[found]]] == \
+            groups[found]
+        if not np.all(found):
+            raise ValueError('A row to match is not one of the active rows')
+        return active[order[positions]]
+
+    @staticmethod
+    def _occurrence(groups):
+        """The number of earlier elements of groups in the same group as
+        each element
+        """
+        order = np.argsort(groups, kind='stable')
+        ordered = groups[order]
+        occurrence = np.empty(len(groups), dtype=int)
+        occurrence[order] = np.arange(len(groups)) - \
+            np.searchsorted(ordered, ordered)
+        return occurrence
+
+    def update(self, add_X, add_y, remove_X, remove_y):
+        """Returns the statistics of the active rows with the rows of
+        remove_X removed and those of add_X added (i.e. the training set of
+        the next fold of a cross validation), as if they were counted from
+        scratch. These statistics are updated in place by counting just the
+        rows which changed, unless the vocabulary of a feature or the labels
+        would change, in which case new statistics are counted from the
+        remaining rows
+
+        Arguments:
+            add_X: The features of the rows to add
+            add_y: Their labels
+            remove_X: The features of the (active) rows to remove
+            remove_y: Their labels
+        """
+        if self.base is not None:
+            raise ValueError('Statistics from excluding can not be updated')
+
+        add_X = np.asarray(add_X).astype(str).reshape(-1,
+                                                      self.codes.shape[1])
+        add_y = np.asarray(add_y).astype(str).ravel()
+        add_codes = self.encoder.transform(add_X)
+        missing = np.isin(add_X[:, self.encoder.columns],
+                          self.encoder.missing_values)
+        known = np.all((add_codes >= 0) | missing) and \
+            np.all(np.isin(add_y, self.classes))
+
+        self.remove(self.match(remove_X, remove_y))
+        if known:
+            added = np.arange(len(self.labels), len(self.labels) + len(add_y))
+            self.codes = np.vstack((self.codes, add_codes))
+            self.labels = np.append(self.labels,
+                                    np.searchsorted(self.classes, add_y))
+            self.active = np.append(self.active,
+                                    np.ones(len(add_y), dtype=bool))
+            self._update(added, 1)
+            # every category and label must still occur
+            if np.all(self.observed_cardinalities() == self.cardinalities) \
+                    and np.all(self.label_counts() > 0):
+                return self
+
+            add_X = np.empty((0, self.codes.shape[1]), dtype=str)
+            add_y = np.empty(0, dtype=str)
+
+        X = np.vstack((self._decode(np.flatnonzero(self.active)), add_X))
+        y = np.append(self.classes[self.active_labels], add_y)
+        return SufficientStatistics(X, y,
+                                    missing_values=self.encoder.missing_values)
+
+    def with_missing_values(self, missing_values):
+        """Returns these statistics with the given values (as strings) also
+        treated as missing, i.e. for a model which leaves them out of its
+        counts. The rows are recoded rather than encoded again, and the new
+        statistics are memoized so that every such model shares them
+
+        Arguments:
+            missing_values: The values to treat as missing, which must
+                include those of these statistics
+        """
+        missing_values = tuple(missing_values)
+        if set(missing_values) == set(self.encoder.missing_values):
+            return self
+        if not set(self.encoder.missing_values) <= set(missing_values):
+            raise ValueError('Values which are missing can not be counted '
+                             'again')
+        key = tuple(sorted(missing_values))
+        if key in self.variants:
+            return self.variants[key]
+
+        if self.base is not None:
+            stats = self.base.with_missing_values(missing_values).excluding(
+                    np.flatnonzero(self.base.active & ~self.active))
+        else:
+            stats = copy.copy(self)
+            vocabularies = {}
+            stats.codes = self.codes.copy()
+            for k, j in enumerate(self.encoder.columns):
+                vocab = self.encoder.vocabularies[j]
+                kept = ~np.isin(vocab, missing_values)
+                vocabularies[j] = vocab[kept]
+                recode = np.append(np.cumsum(kept) - 1, -1)
+                recode[np.append(~kept, False)] = -1
+                stats.codes[:, k] = recode[self.codes[:, k]]
+            stats.encoder = CategoricalEncoder(
+                    columns=self.encoder.columns,
+                    missing_values=missing_values,
+                    vocabularies=vocabularies)
+            stats.cardinalities = stats.encoder.cardinalities
+            stats.active = self.active.copy()
+            stats.joint_cache = {}
+            stats.tables = None
+            stats.pairwise = None
+            stats.variants = {}
+
+        self.variants[key] = stats
+        return stats
+
+    def excluding(self, indices):
+        """Returns the statistics of the dataset without the given rows (i.e.
+        the training set of a fold). Its tables are derived from these
+        statistics' tables less the counts of the excluded rows, so the
+        full tables are only counted once across every fold. To fit on it,
+        X must be the remaining rows of the dataset (in order)
+
+        Arguments:
+            indices: The row indices to exclude
+        """
+        stats = copy.copy(self)
+        stats.base = self
+        stats.active = self.active.copy()
+        stats.active[np.asarray(indices, dtype=int)] = False
+        stats.joint_cache = {}
+        stats.tables = None
+        stats.pairwise = None
+        stats.variants = {}
+        return stats
+
+    def _update(self, indices, sign):
+        """Adds (or subtracts) the counts of rows to every memoized table
+        """
+        for features in self.joint_cache:
+            self.joint_cache[features] = self.joint_cache[features] + \
+                sign * self._count_joint(features, indices)
+        if self.tables is not None:
+            self.tables = self.tables + sign * self._count_tables(indices)
+        # pairs are only counted when requested, so they're just recomputed
+        self.pairwise = None
+        self.variants = {}
+
+    def _decode(self, rows):
+        """The features of rows as strings, where missing values are the
+        first of the missing values
+        """
+        X = np.empty((len(rows), self.codes.shape[1]), dtype=object)
+        missing = self.encoder.missing_values[0] \
+            if len(self.encoder.missing_values) > 0 else None
+        for k, j in enumerate(self.encoder.columns):
+            vocab = np.append(self.encoder.vocabularies[j].astype(object),
+                              missing)
+            X[:, j] = vocab[self.codes[rows, k]]
+        return X.astype(str)
+
+    def _count_joint(self, features, rows):
+        """Counts the joint table of the features with the label over rows
+        """
+        codes = self.codes[rows][:, list(features)]
+        labels = self.labels[rows]
+        observed = np.all(codes >= 0, axis=1)
+        shape = tuple(self.cardinalities[list(features)]) + \
+            (len(self.classes),)
+        index = np.ravel_multi_index(
+                tuple(codes[observed].T) + (labels[observed],), shape)
+        return np.bincount(index, minlength=int(np.prod(shape))) \
+            .reshape(shape)
+
+    def _count_tables(self, rows):
+        """Counts the table of every feature with the label over rows
+        """
+        n_features = self.codes.shape[1]
+        n_classes = len(self.classes)
+        width = max(int(self.cardinalities.max(initial=0)), 1)
+
+        codes = self.codes[rows]
+        labels = self.labels[rows]
+        rows, cols = np.nonzero(codes >= 0)
+        index = (cols * width + codes[rows, cols]) * n_classes + labels[rows]
+        return np.bincount(index, minlength=n_features * width * n_classes) \
+            .reshape(n_features, width, n_classes)
@@ -0,0 +1,227 @@
+# store.py
+#
+# Developed by Liam McInroy
+
+
+import hashlib
+import inspect
+import sqlite3
+
+import numpy as np
+
+from sklearn.base import BaseEstimator
+
+from estimators.models.cache import LRUCache
+
+
+# The attributes of an estimator which are not part of its identity, since
+# they're set per candidate (or only shared to speed up the fit)
+IGNORED_ATTRIBUTES = ('support', 'stats')
+
+
+def fingerprint(X, y):
+    """Returns the fingerprint (a sha1 hex digest) of a dataset
+
+    Arguments:
+        X: The dataset features
+        y: The labels
+    """
+    digest = hashlib.sha1()
+    for arr in (np.asarray(X), np.asarray(y)):
+        digest.update(str((arr.dtype.str, arr.shape)).encode())
+        if arr.dtype == object:
+            arr = arr.astype(str)
+        digest.update(np.ascontiguousarray(arr).tobytes())
+    return digest.hexdigest()
+
+
+class ScoreStore:
+    """A store of the scores of feature subsets, shared by the searchers in
+    models.search so that a subset is only ever evaluated once per dataset,
+    estimator and scoring scheme. A score is keyed by a fingerprint of the
+    dataset, the identity (class and parameters) of the estimator, the
+    support as a bitset and a description of how it was scored (i.e. the
+    cross validation). The most recent scores are kept in an LRU cache in
+    front of an optional SQLite database, which lets the scores be reused
+    across runs on the same dataset
+    """
+
+    def __init__(self, capacity=4096, path=None, timeout=60.):
+        """Initializes a new store
+
+        Arguments:
+            capacity: The number of scores kept in memory
+            path: The SQLite database file to save scores to. If None, then
+                they are only kept in memory
+            timeout: The seconds to wait for another process (i.e. a worker
+                of a pool sharing the database) to finish writing
+        """
+        self.capacity = capacity
+        self.path = path
+        self.timeout = timeout
+        self.scores = LRUCache(capacity)
+        self.connection = None
+        self.hits = 0
+        self.misses = 0
+
+    def fingerprint(self, X, y):
+        """Returns the fingerprint of a dataset
+
+        Arguments:
+            X: The dataset features
+            y: The labels
+        """
+        return fingerprint(X, y)
+
+    def identity(self, estimator):
+        """Returns the identity of an estimator, which is its class and the
+        parameters it was constructed with. The estimator may also be the
+        class (or generator) of estimators, in which case it is the identity
+        of estimator(None). Nested estimators (and the classes made by the
+        generators) are described by their own identities
+
+        Arguments:
+            estimator: The estimator, or the callable constructing it
+        """
+        if callable(estimator) and (inspect.isclass(estimator) or
+                                    inspect.isfunction(estimator)):
+            estimator = estimator(None)
+        params = {name: value for name, value in vars(estimator).items()
+                  if name not in IGNORED_ATTRIBUTES}
+        return self._name(type(estimator)) + self._describe(params)
+
+    def _name(self, value):
+        """The full name of a class or function
+        """
+        return '{}.{}'.format(value.__module__, value.__qualname__)
+
+    def _generated(self, value):
+        """Whether value is a class made by a generator (i.e.
+        bayesian.BayesNetGenerator), whose constructor is a closure over the
+        generator's arguments
+        """
+        init = vars(value).get('__init__') if inspect.isclass(value) \
+            else None
+        return '<locals>' in getattr(init, '__qualname__', '')
+
+    def key(self, dataset, estimator, support, n_features, scheme):
+        """Creates the key of a score
+
+        Arguments:
+            dataset: The fingerprint of the dataset, from self.fingerprint
+            estimator: The identity of the estimator, from self.identity
+            support: The feature indices which were scored
+            n_features: The total number of features
+            scheme: A description of how the support was scored
+        """
+        bits = np.zeros(n_features, dtype=bool)
+        bits[np.asarray(support, dtype=int)] = True
+        return (dataset, estimator,
+                np.packbits(bits, bitorder='little').tobytes().hex(),
+                str(scheme))
+
+    def get(self, key):
+        """Returns the score stored for key, or None if it is unknown
+
+        Arguments:
+            key: The key from self.key
+        """
+        score = self.scores.get(key)
+        if score is None and self.path is not None:
+            row = self._connect().execute(
+                    'SELECT score FROM scores WHERE dataset = ? AND '
+                    'estimator = ? AND support = ? AND scheme = ?',
+                    key).fetchone()
+            if row is not None:
+                score = row[0]
+                self.scores.put(key, score)
+
+        if score is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return score
+
+    def put(self, key, score):
+        """Stores the score of key
+
+        Arguments:
+            key: The key from self.key
+            score: The score of the support
+        """
+        score = float(score)
+        self.scores.put(key, score)
+        if self.path is not None:
+            connection = self._connect()
+            connection.execute('INSERT OR REPLACE INTO scores VALUES '
+                               '(?, ?, ?, ?, ?)', key + (score,))
+            connection.commit()
+
+    def close(self):
+        """Closes the database, which is reopened when next needed
+        """
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    @property
+    def hit_rate(self):
+        """The fraction of lookups which were hits
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.
+
+    def counts(self):
+        """Returns the hits and misses so far, i.e. of the copy of the store
+        in a worker process, to be added to the original's by add_counts
+        """
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def add_counts(self, counts):
+        """Adds hits and misses counted elsewhere (from counts)
+
+        Arguments:
+            counts: The dict from counts
+        """
+        self.hits += counts['hits']
+        self.misses += counts['misses']
+
+    def __getstate__(self):
+        # the database connection can't be shared with another process
+        state = self.__dict__.copy()
+        state['connection'] = None
+        return state
+
+    def _connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path,
+                                              timeout=self.timeout)
+            # so that the workers sharing the database don't block readers
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute(
+                    'CREATE TABLE IF NOT EXISTS scores (dataset TEXT, '
+                    'estimator TEXT, support TEXT, scheme TEXT, score REAL, '
+                    'PRIMARY KEY (dataset, estimator, support, scheme))')
+        return self.connection
+
+    def _describe(self, value):
+        """A description of value which is the same between runs (unlike
+        the default repr of classes and functions)
+        """
+        if self._generated(value) or isinstance(value, BaseEstimator):
+            # so that the settings of nested estimators are part of it
+            return self.identity(value)
+        if inspect.isclass(value) or inspect.isfunction(value):
+            return self._name(value)
+        if isinstance(value, dict):
+            return '{' + ', '.join('{}: {}'.format(k, self._describe(v))
+                                   for k, v in sorted(value.items())) + '}'
+        if isinstance(value, np.ndarray):
+            value = value.tolist()
+        if isinstance(value, (list, tuple)):
+            return '[' + ', '.join(self._describe(v) for v in value) + ']'
+        if value is None or isinstance(value, (bool, int, float, str,
+                                               np.generic)):
+            return repr(value)
+        # anything else (i.e. a cache) is only described by its type
+        return type(value).__name__
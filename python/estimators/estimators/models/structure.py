@@ -0,0 +1,285 @@
+# structure.py
+#
+# Developed by Liam McInroy
+
+
+import hashlib
+import os
+import pickle
+import time
+
+import numpy as np
+
+from estimators.models.cache import LRUCache
+
+
+class LabelParentSearch:
+    """An exact search for the parents of the label in a network where the
+    features may only be parents of the label (i.e. the constraint graph
+    used by models.bayesian.BayesNet). Since the features then have no
+    parents, the structure is only the label's parent set, which is chosen
+    to maximize the decomposable BIC score of the label's node. The score is
+    computed from the count tables of a statistics.SufficientStatistics,
+    and subsets are explored depth first with branch and bound pruning
+    """
+
+    def __init__(self, max_parents=None, max_evals=None, time_budget=None):
+        """Initializes a new search
+
+        Arguments:
+            max_parents: The largest parent set to consider. If None, then
+                it is log2(2n / log2(n)) as in pomegranate
+            max_evals: The number of parent sets to score before stopping
+                with the best found so far. If None, then it is unlimited
+            time_budget: The seconds to search for before stopping with the
+                best found so far. If None, then it is unlimited
+        """
+        self.max_parents = max_parents
+        self.max_evals = max_evals
+        self.time_budget = time_budget
+        self.n_evals = 0
+        self.n_pruned = 0
+        self.elapsed = 0.
+        self.completed = False
+
+    def search(self, stats, features, initial=None):
+        """Finds the best parent set of the label among the features
+
+        Arguments:
+            stats: The statistics.SufficientStatistics of the dataset
+            features: The candidate feature indices
+            initial: A parent set to score first, whose score is then used
+                as the initial bound (i.e. a previously learned structure)
+        """
+        features = [int(f) for f in features]
+        start = time.time()
+        self.n_evals = 0
+        self.n_pruned = 0
+        self.completed = False
+
+        max_parents = self.max_parents
+        if max_parents is None:
+            n = max(stats.n_samples, 2)
+            max_parents = max(int(np.log2(2 * n / max(np.log2(n), 1))), 0)
+        max_parents = min(max_parents, len(features))
+
+        n_classes = len(stats.classes)
+        log_n = np.log(max(stats.n_samples, 1))
+        observed = stats.observed_cardinalities()
+        cardinalities = {f: max(int(observed[f]), 1) for f in features}
+        # the log likelihood can only grow with more parents, so it is at
+        # most that of all of the candidates as parents
+        ll_bound = self._log_likelihood_all(stats, features)
+
+        def penalty(parents):
+            return log_n / 2. * (n_classes - 1) * \
+                np.prod([cardinalities[f] for f in parents])
+
+        def score(parents):
+            self.n_evals += 1
+            counts = stats.joint_counts(parents).reshape(-1, n_classes)
+            return self._log_likelihood(counts) - penalty(parents)
+
+        def exhausted():
+            return (self.max_evals is not None and
+                    self.n_evals >= self.max_evals) or \
+                (self.time_budget is not None and
+                 time.time() - start >= self.time_budget)
+
+        best = ()
+        best_score = score(best)
+        if initial is not None and tuple(initial) != ():
+            initial = tuple(int(f) for f in initial)
+            initial_score = score(initial)
+            if initial_score > best_score:
+                best, best_score = initial, initial_score
+
+        stack = [((), 0)]
+        while len(stack) > 0:
+            if exhausted():
+                break
+            parents, next_idx = stack.pop()
+            # the bound may have tightened since parents was pushed
+            if parents != () and ll_bound - penalty(parents) <= best_score:
+                self.n_pruned += 1
+                continue
+            # push in reverse so the subsets are visited in order
+            children = range(len(features) - 1, next_idx - 1, -1) \
+                if len(parents) < max_parents else []
+            for idx in children:
+                child = parents + (features[idx],)
+                # every superset of child has at least child's penalty
+                if ll_bound - penalty(child) <= best_score:
+                    self.n_pruned += 1
+                    continue
+                stack.append((child, idx + 1))
+
+            if parents != ():
+                parents_score = score(parents)
+                if parents_score > best_score:
+                    best, best_score = parents, parents_score
+        else:
+            self.completed = True
+
+        self.elapsed = time.time() - start
+        return best
+
+    def _log_likelihood(self, counts):
+        """The log likelihood of the label given its parents from the
+        counts of each parent configuration (rows) and label (columns)
+        """
+        totals = np.broadcast_to(counts.sum(axis=1, keepdims=True),
+                                 counts.shape)
+        observed = counts > 0
+        return float(np.sum(counts[observed] *
+                            np.log(counts[observed] / totals[observed])))
+
+    def _log_likelihood_all(self, stats, features):
+        """The log likelihood of the label with every feature as a parent,
+        counting only the configurations which occur
+        """
+        if len(features) == 0:
+            return self._log_likelihood(stats.label_counts().reshape(1, -1))
+        codes = stats.active_codes[:, features]
+        if np.any(codes < 0):
+            # rows missing a parent are not counted, so the smaller parent
+            # sets count more rows and only the trivial bound holds
+            return 0.
+        _, configs = np.unique(codes, axis=0, return_inverse=True)
+        n_classes = len(stats.classes)
+        counts = np.bincount(configs.ravel() * n_classes +
+                             stats.active_labels)
+        counts = np.pad(counts, (0, -len(counts) % n_classes))
+        return self._log_likelihood(counts.reshape(-1, n_classes))
+
+
+class StructureCache:
+    """A cache of the label parent sets learned by models.bayesian.BayesNet,
+    keyed by the support, the structure search settings and a fingerprint of
+    the encoded data. The most recent structure of each support is also kept
+    (regardless of the data) so that it can warm start a search on nearly
+    identical data, i.e. the next fold of a cross validation. If given a
+    directory, then the structures are also saved there to be shared
+    between runs
+    """
+
+    def __init__(self, capacity=256, directory=None):
+        """Initializes a new empty cache
+
+        Arguments:
+            capacity: The number of structures kept in memory
+            directory: The directory to save structures to. If None, then
+                they are only kept in memory
+        """
+        self.capacity = capacity
+        self.directory = directory
+        self.structures = LRUCache(capacity)
+        self.latest = LRUCache(capacity)
+        self.time_saved = 0.
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, support, codes, labels, vocabularies, settings=()):
+        """Creates the key of a structure
+
+        Arguments:
+            support: The feature indices of the network
+            codes: The encoded support of the training data
+            labels: The training labels
+            vocabularies: The vocabulary of each feature in the support
+            settings: Anything else which changes the learned structure
+                (i.e. the structure algorithm)
+        """
+        digest = hashlib.sha1()
+        digest.update(np.ascontiguousarray(codes, dtype=np.int64).tobytes())
+        digest.update('\x00'.join(np.asarray(labels).astype(str).ravel())
+                      .encode())
+        for vocab in vocabularies:
+            digest.update(('\x01' + '\x00'.join(vocab)).encode())
+        return (tuple(int(s) for s in support), tuple(settings),
+                digest.hexdigest())
+
+    def get(self, key):
+        """Returns the parents cached for key, or None if it is unknown
+
+        Arguments:
+            key: The key from self.key
+        """
+        if key not in self.structures and self.directory is not None and \
+                os.path.exists(self._path(key)):
+            with open(self._path(key), 'rb') as f:
+                self.structures.put(key, pickle.load(f))
+        entry = self.structures.get(key)
+        if entry is None:
+            return None
+
+        parents, elapsed = entry
+        self.time_saved += elapsed
+        return parents
+
+    def put(self, key, parents, elapsed, completed=True):
+        """Caches the parents learned for key
+
+        Arguments:
+            key: The key from self.key
+            parents: The learned parent set
+            elapsed: The seconds it took to learn, which are saved on each
+                later hit
+            completed: Whether the search finished. If not (i.e. it ran out
+                of budget), then parents is only kept for warm starts
+        """
+        parents = tuple(int(p) for p in parents)
+        self.latest.put(key[:2], parents)
+        if not completed:
+            return
+
+        self.structures.put(key, (parents, elapsed))
+        if self.directory is not None:
+            with open(self._path(key), 'wb') as f:
+                pickle.dump((parents, elapsed), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+
+    def warm_start(self, key):
+        """Returns the most recent parents learned for the support and
+        settings of key on any data, or None if there are none
+
+        Arguments:
+            key: The key from self.key
+        """
+        return self.latest.get(key[:2])
+
+    @property
+    def hits(self):
+        return self.structures.hits
+
+    @property
+    def misses(self):
+        return self.structures.misses
+
+    @property
+    def hit_rate(self):
+        return self.structures.hit_rate
+
+    def counts(self):
+        """Returns the hits, misses and seconds saved so far, i.e. of the
+        copy of the cache in a worker process, to be added to the original's
+        by add_counts
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'time_saved': self.time_saved}
+
+    def add_counts(self, counts):
+        """Adds hits, misses and seconds saved counted elsewhere (from
+        counts)
+
+        Arguments:
+            counts: The dict from counts
+        """
+        self.structures.hits += counts['hits']
+        self.structures.misses += counts['misses']
+        self.time_saved += counts['time_saved']
+
+    def _path(self, key):
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, name + '.pkl')
@@ -0,0 +1,195 @@
+# surrogate.py
+#
+# Developed by Liam McInroy
+
+
+import numpy as np
+
+from estimators.models.information import pairwise_information
+
+
+class Surrogate:
+    """Pre-screens the candidate supports of a search so that only the most
+    promising are fully evaluated. Each support is given a cheap proxy
+    score from the count tables of a statistics.SufficientStatistics, which
+    is either its mRMR score (the relevance of its features less their mean
+    redundancy) or the training accuracy of a naive Bayes classifier on it.
+
+    A ridge regression is also learned online from the supports which were
+    fully evaluated, predicting their score from the support's bitset and
+    its proxy score. Once it has seen enough supports, its predictions rank
+    the candidates instead, and they're recorded against the full scores so
+    that its calibration can be reported
+    """
+
+    def __init__(self, proxy='mrmr', proposals=4, min_history=20,
+                 alpha=1., verbose=0):
+        """Initializes a new surrogate
+
+        Arguments:
+            proxy: 'mrmr' or 'naive-bayes', the cheap score of a support
+            proposals: The number of candidates proposed for each one which
+                is fully evaluated
+            min_history: The number of fully evaluated supports to see
+                before the online model ranks the candidates
+            alpha: The ridge penalty of the online model
+            verbose: Whether to print the calibration after each update
+        """
+        self.proxy = proxy
+        self.proposals = proposals
+        self.min_history = min_history
+        self.alpha = alpha
+        self.verbose = verbose
+        self.reset(None)
+
+    def reset(self, stats):
+        """Forgets everything learned, for a new search
+
+        Arguments:
+            stats: The statistics.SufficientStatistics of the search's data
+        """
+        if self.proxy not in ('mrmr', 'naive-bayes'):
+            raise ValueError('Unknown proxy ' + str(self.proxy))
+
+        self.stats = stats
+        self.proxies = {}
+        self.log_probs = None
+        self.log_prior = None
+        self.gram = None
+        self.moments = None
+        self.n_observed = 0
+        self.predictions = []
+
+    def screen(self, supports, n_keep):
+        """Returns the indices of the n_keep most promising supports
+
+        Arguments:
+            supports: The list of candidate supports (lists of indices)
+            n_keep: The number of supports to keep
+        """
+        predicted = self.predict(supports)
+        return np.argsort(-predicted, kind='stable')[:n_keep]
+
+    def predict(self, supports):
+        """Returns the predicted score of each support, which is its proxy
+        score until the online model has seen min_history supports
+
+        Arguments:
+            supports: The list of supports (lists of feature indices)
+        """
+        features = self._features(supports)
+        if self.n_observed < self.min_history:
+            return features[:, -2]
+        return features @ self._coefficients()
+
+    def observe(self, supports, scores):
+        """Updates the online model with fully evaluated supports
+
+        Arguments:
+            supports: The list of supports (lists of feature indices)
+            scores: Their full scores
+        """
+        scores = np.asarray(scores, dtype=float)
+        finite = np.isfinite(scores)
+        supports = [s for s, f in zip(supports, finite) if f]
+        scores = scores[finite]
+        if len(supports) == 0:
+            return
+
+        if self.n_observed >= self.min_history:
+            self.predictions.extend(zip(self.predict(supports), scores))
+
+        features = self._features(supports)
+        if self.gram is None:
+            self.gram = self.alpha * np.eye(features.shape[1])
+            # the bias isn't penalized
+            self.gram[-1, -1] = 0.
+            self.moments = np.zeros(features.shape[1])
+        self.gram += features.T @ features
+        self.moments += features.T @ scores
+        self.n_observed += len(supports)
+
+        if self.verbose and len(self.predictions) > 1:
+            print('Surrogate calibration:', self.calibration())
+
+    def calibration(self):
+        """Returns how well the online model's predictions matched the full
+        scores: the number of predictions, their mean absolute error, their
+        mean error (bias) and the rank correlation with the full scores
+        """
+        if len(self.predictions) == 0:
+            return {'n': 0, 'mae': np.nan, 'bias': np.nan,
+                    'spearman': np.nan}
+
+        predicted, actual = np.array(self.predictions).T
+        errors = predicted - actual
+        spearman = np.nan
+        if len(actual) > 1 and np.ptp(predicted) > 0 and np.ptp(actual) > 0:
+            spearman = np.corrcoef(np.argsort(np.argsort(predicted)),
+                                   np.argsort(np.argsort(actual)))[0, 1]
+        return {'n': len(actual), 'mae': float(np.abs(errors).mean()),
+                'bias': float(errors.mean()), 'spearman': float(spearman)}
+
+    def _coefficients(self):
+        return np.linalg.solve(self.gram, self.moments)
+
+    def _features(self, supports):
+        """The inputs of the online model: the support's bitset, its proxy
+        score and a bias
+        """
+        n_features = self.stats.codes.shape[1]
+        features = np.zeros((len(supports), n_features + 2))
+        for k, support in enumerate(supports):
+            features[k, np.asarray(support, dtype=int)] = 1.
+            features[k, -2] = self._proxy(support)
+        features[:, -1] = 1.
+        return features
+
+    def _proxy(self, support):
+        """The (memoized) proxy score of a support
+        """
+        key = tuple(sorted(int(s) for s in support))
+        if key not in self.proxies:
+            if len(key) == 0:
+                self.proxies[key] = 0.
+            elif self.proxy == 'mrmr':
+                self.proxies[key] = self._mrmr(list(key))
+            else:
+                self.proxies[key] = self._naive_bayes(list(key))
+        return self.proxies[key]
+
+    def _mrmr(self, support):
+        """The relevance of the support's features to the label less their
+        mean pairwise redundancy
+        """
+        info = pairwise_information(self.stats)
+        redundancy = 0.
+        for k, feature in enumerate(support[1:], 1):
+            redundancy += info.pairs(feature, support[:k])[0].sum()
+        return float(info.relevance[support].sum() -
+                     redundancy / len(support))
+
+    def _naive_bayes(self, support):
+        """The training accuracy of a naive Bayes classifier (with Laplace
+        smoothing) on the support, from the count tables
+        """
+        if self.log_probs is None:
+            tables = self.stats.feature_label_tables().astype(float)
+            cardinalities = np.maximum(
+                    self.stats.observed_cardinalities(), 1)
+            self.log_probs = np.log(
+                    (tables + 1.) /
+                    (tables.sum(axis=1, keepdims=True) +
+                     cardinalities[:, None, None]))
+            labels = self.stats.label_counts().astype(float)
+            self.log_prior = np.log((labels + 1.) /
+                                    (labels.sum() + len(labels)))
+
+        codes = self.stats.active_codes[:, support]
+        log_probs = self.log_probs[np.asarray(support)[None, :],
+                                   np.maximum(codes, 0)]
+        # missing values don't change the posterior
+        log_probs[codes < 0] = 0.
+        posterior = log_probs.sum(axis=1) + self.log_prior
+        return float(np.mean(np.argmax(posterior, axis=1) ==
+                             self.stats.active_labels))
@@ -6,8 +6,6 @@ setup(name='estimators',
       packages=['models'],
       package_dir={'models': 'estimators/models'},
       install_requires=[
-          # genetic
-          'deap',
           # lint
           'flake8',
           'keras',
@@ -19,6 +17,6 @@ setup(name='estimators',
           'pytest',
           'scipy',
           'scikit-learn',
-          'sklearn-genetic',
           'tensorflow'],
-      python_requires='>=3.5')
+      # multiprocessing.shared_memory (for n_jobs) needs 3.8
+      python_requires='>=3.8')
@@ -0,0 +1,107 @@
+# test_bayesian.py
+#
+# Developed by Liam McInroy
+
+
+import numpy as np
+import pytest
+
+from estimators.models.encoding import MISSING
+from estimators.models.statistics import SufficientStatistics
+
+bayesian = pytest.importorskip('estimators.models.bayesian')
+
+
+CLASSES = np.array(['0', '1'])
+
+
+@pytest.fixture
+def network():
+    """A label CPT with two parents (of 2 and 3 categories), and the
+    marginal of each parent
+    """
+    rng = np.random.RandomState(0)
+    cpt = rng.dirichlet(np.ones(2), (2, 3))
+    marginals = [np.array([.3, .7]), np.array([.2, .5, .3])]
+    return cpt, marginals
+
+
+def compiled(cpt, marginals, parents=(0, 2), max_table_size=2 ** 20):
+    net = bayesian.BayesNet(compiled=True, max_table_size=max_table_size)
+    net._set_compiled(CLASSES, list(parents), cpt, marginals)
+    return net
+
+
+def all_codes():
+    """Every observation of three features (the middle one not a parent),
+    where each parent may be missing
+    """
+    return np.array([[a, b, c] for a in (0, 1, MISSING) for b in (0, 1)
+                     for c in (0, 1, 2, MISSING)])
+
+
+def test_missing_parent_is_marginalized(network):
+    cpt, marginals = network
+    net = compiled(cpt, marginals)
+    assert net.posterior_table is not None
+
+    posterior = net._compiled_posterior(all_codes())
+    for codes, probs in zip(all_codes(), posterior):
+        a, c = codes[0], codes[2]
+        if a != MISSING and c != MISSING:
+            expected = cpt[a, c]
+        elif a == MISSING and c != MISSING:
+            expected = sum(marginals[0][i] * cpt[i, c] for i in range(2))
+        elif a != MISSING:
+            expected = sum(marginals[1][j] * cpt[a, j] for j in range(3))
+        else:
+            expected = sum(marginals[0][i] * marginals[1][j] * cpt[i, j]
+                           for i in range(2) for j in range(3))
+        assert np.allclose(probs, expected)
+        assert np.isclose(probs.sum(), 1.)
+
+
+def test_factorized_matches_dense_table(network):
+    cpt, marginals = network
+    dense = compiled(cpt, marginals)
+    factorized = compiled(cpt, marginals, max_table_size=1)
+    assert factorized.posterior_table is None
+
+    codes = all_codes()[np.random.RandomState(1).permutation(len(all_codes()))]
+    assert np.allclose(factorized._compiled_posterior(codes),
+                       dense._compiled_posterior(codes))
+
+
+def test_no_parents_gives_the_prior():
+    net = compiled(np.array([.4, .6]), [], parents=())
+
+    posterior = net._compiled_posterior(all_codes())
+    assert np.allclose(posterior, [.4, .6])
+
+
+def test_stats_are_only_compared_in_full_when_checked(monkeypatch):
+    rng = np.random.RandomState(2)
+    X = rng.randint(0, 3, (30, 4)).astype(str)
+    y = rng.randint(0, 2, 30)
+    stats = SufficientStatistics(X, y)
+    other = X[::-1].copy()
+
+    with pytest.raises(ValueError):
+        bayesian.BayesNet(stats=stats).fit(X[:-1], y[:-1])
+    with pytest.raises(ValueError):
+        bayesian.BayesNet(stats=stats, check_stats=True).fit(other, y)
+
+    class Searched(Exception):
+        pass
+
+    def from_samples(*args, **kwargs):
+        raise Searched()
+
+    # the structure search is only reached once the statistics are checked
+    calls = []
+    monkeypatch.setattr(stats, 'matches', lambda *args: calls.append(args))
+    monkeypatch.setattr(bayesian.BayesianNetwork, 'from_samples',
+                        from_samples, raising=False)
+    with pytest.raises(Searched):
+        bayesian.BayesNet(stats=stats).fit(other, y)
+    assert calls == []
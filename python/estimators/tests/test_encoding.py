@@ -0,0 +1,52 @@
+# test_encoding.py
+#
+# Developed by Liam McInroy
+
+
+import numpy as np
+
+from estimators.models.encoding import CategoricalEncoder, MISSING
+
+
+def test_unseen_and_missing_values_are_missing():
+    X = np.array([['a', 'x'], ['b', 'None'], ['a', 'y']])
+    encoder = CategoricalEncoder(missing_values=('None',)).fit(X)
+
+    assert encoder.vocabularies[1].tolist() == ['x', 'y']
+    codes = encoder.transform(np.array([['c', 'None'], ['b', 'z'],
+                                        ['0', 'a']]))
+    assert codes.tolist() == [[MISSING, MISSING], [1, MISSING],
+                              [MISSING, MISSING]]
+
+
+def test_codes_roundtrip_to_values():
+    rng = np.random.RandomState(0)
+    X = rng.choice(['lo', 'mid', 'hi', '7'], (50, 3))
+    encoder = CategoricalEncoder()
+    codes = encoder.fit_transform(X)
+
+    assert (codes >= 0).all()
+    decoded = np.stack([encoder.vocabularies[j][codes[:, k]]
+                        for k, j in enumerate(encoder.columns)], axis=1)
+    assert (decoded == X).all()
+    assert encoder.cardinalities.tolist() == [4, 4, 4]
+
+
+def test_given_vocabularies_match_fit():
+    rng = np.random.RandomState(1)
+    X = rng.randint(0, 5, (40, 4))
+    fitted = CategoricalEncoder(columns=[3, 1]).fit(X)
+    loaded = CategoricalEncoder(
+            vocabularies={j: list(v) for j, v in fitted.vocabularies.items()})
+
+    assert loaded.columns == [1, 3]
+    assert (loaded.transform(X) == fitted.transform(X)[:, ::-1]).all()
+    assert (fitted.transform(np.full((2, 4), 9)) == MISSING).all()
+
+
+def test_column_with_only_missing_values():
+    X = np.array([['None', 'a'], ['None', 'b']])
+    encoder = CategoricalEncoder(missing_values=('None',))
+
+    assert encoder.fit_transform(X)[:, 0].tolist() == [MISSING, MISSING]
+    assert encoder.cardinalities.tolist() == [0, 2]
@@ -0,0 +1,182 @@
+# test_evaluator.py
+#
+# Developed by Liam McInroy
+
+
+import numpy as np
+import pytest
+
+from estimators.models.dummy import DummyGenerator, UpdatableDummyClassifier
+from estimators.models.evaluator import ModelEvaluator, ModularModelEvaluator
+from estimators.models.mim import MIM, MIMGenerator
+from estimators.models.racing import RacingEvaluator
+from estimators.models.statistics import CannotUpdate
+
+
+MODELS = {'dummy': DummyGenerator, 'mim': MIMGenerator(n=2)}
+
+
+def PriorEstimator(support=None):
+    return UpdatableDummyClassifier(strategy='prior')
+
+
+@pytest.fixture
+def dataset():
+    rng = np.random.RandomState(0)
+    X = rng.randint(0, 3, (60, 6))
+    y = (X[:, 1] + X[:, 4] > 2).astype(int)
+    return X, y
+
+
+def test_parallel_equals_serial(dataset):
+    X, y = dataset
+    serial = list(ModelEvaluator(MODELS, X, y, random_state=7).run(5))
+    parallel = list(ModelEvaluator(MODELS, X, y, random_state=7)
+                    .run(5, n_jobs=2))
+    assert len(serial) == 6
+    assert repr(parallel) == repr(serial)
+
+
+def test_updated_folds_equal_refit_folds(monkeypatch):
+    # without a signal, the selected features depend on every row counted
+    rng = np.random.RandomState(3)
+    X = rng.randint(0, 3, (60, 6))
+    y = rng.randint(0, 2, 60)
+    models = {'dummy': DummyGenerator,
+              'mim': MIMGenerator(estimator=PriorEstimator, n=3)}
+    updates = []
+
+    def update(model):
+        def counted(self, *args):
+            updated = model(self, *args)
+            updates.append(model.__qualname__)
+            return updated
+        return counted
+
+    monkeypatch.setattr(UpdatableDummyClassifier, 'update',
+                        update(UpdatableDummyClassifier.update))
+    monkeypatch.setattr(MIM, 'update', update(MIM.update))
+    updated = list(ModelEvaluator(models, X, y, random_state=7).run(5))
+    assert set(updates) == {'MIM.update', 'UpdatableDummyClassifier.update'}
+
+    def refit(self, *args):
+        raise CannotUpdate()
+
+    monkeypatch.setattr(UpdatableDummyClassifier, 'update', refit)
+    monkeypatch.setattr(MIM, 'update', refit)
+    refitted = list(ModelEvaluator(models, X, y, random_state=7).run(5))
+    assert repr(updated) == repr(refitted)
+
+
+def test_racing_eliminates_the_worse_model(dataset):
+    X, y = dataset
+    evaluator = ModelEvaluator(MODELS, X, y, random_state=7)
+    results = list(evaluator.run(10, racing=RacingEvaluator(min_folds=3)))
+    assert list(evaluator.eliminated) == ['dummy']
+    n_folds = evaluator.eliminated['dummy']
+    assert 3 <= n_folds < 10
+
+    folds = results[:-1]
+    assert len(folds) == 10
+    dummy_scores = [scores['dummy'][1] for scores, _ in folds
+                    if 'dummy' in scores]
+    assert len(dummy_scores) == n_folds
+    assert all('mim' in scores for scores, _ in folds)
+    # its total is over the folds it ran
+    totals, _ = results[-1]
+    assert totals['dummy'] == pytest.approx(np.mean(dummy_scores))
+
+
+def test_max_folds_stops_early(dataset):
+    X, y = dataset
+    evaluator = ModelEvaluator(MODELS, X, y, random_state=7)
+    results = list(evaluator.run(10, max_folds=4))
+    folds = results[:-1]
+    assert len(folds) == 4
+    totals, _ = results[-1]
+    for name in MODELS:
+        assert totals[name] == np.mean([scores[name][1]
+                                        for scores, _ in folds])
+
+
+def test_tolerance_stops_once_intervals_are_tight(dataset):
+    X, _ = dataset
+    y = np.ones(len(X), dtype=int)
+    evaluator = ModelEvaluator({'dummy': DummyGenerator}, X, y,
+                               random_state=7)
+    results = list(evaluator.run(10, tolerance=.01, min_folds=3))
+    # every fold is perfectly accurate, so it stops at min_folds
+    assert len(results) - 1 == 3
+    assert evaluator.intervals['dummy']['accuracy'] == 0
+    assert results[-1][0]['dummy'] == 1
+
+
+def test_adaptive_fold_order_is_seeded(dataset):
+    X, y = dataset
+    runs = [list(ModelEvaluator(MODELS, X, y, random_state=7)
+                 .run(10, max_folds=4)) for _ in range(2)]
+    assert repr(runs[0]) == repr(runs[1])
+
+
+def test_seeded_run_keeps_the_global_random_state(dataset):
+    X, y = dataset
+    np.random.seed(0)
+    expected = np.random.rand()
+    np.random.seed(0)
+    list(ModelEvaluator(MODELS, X, y, random_state=7).run(5))
+    assert np.random.rand() == expected
+
+
+def baseline_data_with_id(evaluator, pids):
+    """The original ModularModelEvaluator.get_data_with_id, which scanned
+    every table for each ID
+    """
+    X = []
+    y = []
+    for i, t_pids in enumerate(evaluator.table_pids):
+        arr = []
+        for j, pid in enumerate(pids):
+            y.append(None)
+            if pid in t_pids:
+                indices, = np.where(evaluator.X[i][:, 0] == pid)
+                arr.append(np.vstack(evaluator.X[i][indices]).astype(object))
+                y[j] = evaluator.X[i][indices[-1], -1]
+            else:
+                dat = np.full(evaluator.X[i][0].shape, None, dtype=None)
+                dat[0] = pid
+                arr.append(dat)
+        X.append(np.vstack(arr).astype(object))
+
+    for k in range(len(X)):
+        X[k][np.where(X[k] == -1)] = None
+
+    return tuple(x for x in X), np.array(y)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_join_index_matches_the_baseline(seed):
+    rng = np.random.RandomState(seed)
+    pids = ['seq{}'.format(k) for k in range(12)]
+    tables = []
+    for n_features in (3, 1, 4):
+        # each table has some of the IDs, with any number of rows each
+        rows = []
+        for pid in rng.choice(pids, rng.randint(1, len(pids)),
+                              replace=False):
+            for _ in range(rng.randint(1, 4)):
+                rows.append([pid] + rng.randint(-1, 3, n_features).tolist() +
+                            [rng.randint(0, 2)])
+        tables.append(np.array(rows, dtype=object)[rng.permutation(
+            len(rows))])
+    evaluator = ModularModelEvaluator({}, tables)
+
+    subset = [evaluator.pids[k]
+              for k in rng.permutation(len(evaluator.pids))[:8]]
+    X, y = evaluator.get_data_with_id(subset)
+    expected_X, expected_y = baseline_data_with_id(evaluator, subset)
+    assert len(X) == len(expected_X)
+    for x, expected in zip(X, expected_X):
+        assert x.dtype == expected.dtype
+        assert x.tolist() == expected.tolist()
+    assert y.dtype == expected_y.dtype
+    assert y.tolist() == expected_y.tolist()
@@ -0,0 +1,61 @@
+# test_information.py
+#
+# Developed by Liam McInroy
+
+
+import numpy as np
+import pytest
+
+from sklearn.metrics import mutual_info_score
+
+from estimators.models.information import (
+        MISSING_VALUES, label_relevance, mutual_information,
+        pairwise_information)
+from estimators.models.statistics import SufficientStatistics
+
+
+@pytest.fixture
+def dataset():
+    rng = np.random.RandomState(0)
+    X = rng.randint(0, 4, (200, 6)).astype(str)
+    y = ((X[:, 1].astype(int) + rng.randint(0, 2, 200)) > 2).astype(int)
+    return X, y
+
+
+def test_mutual_information_of_table(dataset):
+    X, y = dataset
+    table = np.zeros((4, 2))
+    np.add.at(table, (X[:, 1].astype(int), y), 1)
+    assert mutual_information(table) == \
+        pytest.approx(mutual_info_score(X[:, 1], y))
+
+
+def test_label_relevance(dataset):
+    X, y = dataset
+    relevance = label_relevance(SufficientStatistics(X, y))
+    expected = [mutual_info_score(X[:, j], y) for j in range(X.shape[1])]
+    assert relevance == pytest.approx(expected)
+
+
+def test_label_relevance_leaves_out_missing_values(dataset):
+    X, y = dataset
+    X = X.copy()
+    X[::7, 2] = 'None'
+    X[::5, 4] = '-1'
+    stats = SufficientStatistics(X, y, missing_values=MISSING_VALUES)
+    relevance = label_relevance(stats)
+    for j in range(X.shape[1]):
+        observed = ~np.isin(X[:, j], MISSING_VALUES)
+        assert relevance[j] == \
+            pytest.approx(mutual_info_score(X[observed, j], y[observed]))
+
+
+def test_pairwise_information(dataset):
+    X, y = dataset
+    redundancy, joint_relevance = \
+        pairwise_information(SufficientStatistics(X, y)).pairs(0, [1, 3, 5])
+    for k, j in enumerate([1, 3, 5]):
+        pair = np.char.add(np.char.add(X[:, 0], ','), X[:, j])
+        assert redundancy[k] == \
+            pytest.approx(mutual_info_score(X[:, 0], X[:, j]))
+        assert joint_relevance[k] == pytest.approx(mutual_info_score(pair, y))
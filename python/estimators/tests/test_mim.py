@@ -0,0 +1,42 @@
+# test_mim.py
+#
+# Developed by Liam McInroy
+
+
+import numpy as np
+import pytest
+
+from estimators.models.dummy import UpdatableDummyClassifier
+from estimators.models.mim import MIM
+from estimators.models.statistics import CannotUpdate
+
+
+def DummyEstimator(support=None):
+    return UpdatableDummyClassifier(strategy='prior')
+
+
+@pytest.fixture
+def dataset():
+    rng = np.random.RandomState(0)
+    X = rng.randint(0, 3, (80, 8))
+    y = ((X[:, 2] + X[:, 5] + rng.randint(0, 2, 80)) > 3).astype(int)
+    return X, y
+
+
+def test_update_matches_refit(dataset):
+    X, y = dataset
+    model = MIM(estimator=DummyEstimator, n=2).fit(X[:60], y[:60])
+    model.update(X[60:], y[60:], X[:20], y[:20])
+    refit = MIM(estimator=DummyEstimator, n=2).fit(X[20:], y[20:])
+    assert model.support == refit.support
+    np.testing.assert_allclose(model.current_estimator.class_prior_,
+                               refit.current_estimator.class_prior_)
+
+
+def test_update_checks_the_estimator_first(dataset):
+    X, y = dataset
+    model = MIM(n=2).fit(X[:60], y[:60])
+    labels = model.fit_stats.active_labels.copy()
+    with pytest.raises(CannotUpdate):
+        model.update(X[60:], y[60:], X[:20], y[:20])
+    np.testing.assert_array_equal(model.fit_stats.active_labels, labels)
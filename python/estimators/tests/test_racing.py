@@ -0,0 +1,44 @@
+# test_racing.py
+#
+# Developed by Liam McInroy
+
+
+import numpy as np
+
+from estimators.models.racing import RacingEvaluator, dominated, half_width
+
+
+def test_dominated():
+    leader, worse = dominated([[.9, .8, .9, .85], [.5, .6, .4, .55],
+                               [.9, .85, .8, .9]], .95)
+    assert leader == 0
+    assert list(worse) == [False, True, False]
+
+
+def test_half_width():
+    assert half_width([1.], .95) == np.inf
+    assert half_width([.5, .5, .5], .95) == 0
+    np.testing.assert_allclose(half_width([[1., 0.], [0., 0.]], .95),
+                               [6.353102, 0.], rtol=1e-6)
+
+
+def test_race_eliminates_and_remembers_folds():
+    calls = []
+
+    def score_folds(jobs):
+        calls.extend((tuple(support), fold) for support, fold in jobs)
+        return [.9 + .01 * (fold % 2) if support == [0, 1]
+                else .5 + .01 * (fold % 3) for support, fold in jobs]
+
+    racing = RacingEvaluator(cv=10, min_folds=3)
+    scores = racing.race([[1, 0], [2], []], score_folds)
+    assert scores[0] == np.mean([.9 + .01 * (f % 2) for f in range(10)])
+    assert scores[1] == np.mean([.5 + .01 * (f % 3) for f in range(3)])
+    assert scores[2] == -np.inf
+    assert racing.completed([0, 1]) and not racing.completed([2])
+    assert [key for key, _, _, _ in racing.eliminations] == [(2,)]
+
+    # a support raced again only runs the folds it hasn't yet
+    calls.clear()
+    racing.race([[0, 1], [3]], score_folds)
+    assert all(support == (3,) for support, _ in calls)
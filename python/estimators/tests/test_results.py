@@ -0,0 +1,57 @@
+# test_results.py
+#
+# Developed by Liam McInroy
+
+
+import numpy as np
+import pytest
+
+from estimators.models.results import ResultsLog
+
+
+PLAN = {'n_splits': 3, 'dataset': 'abc', 'indices': [2, 0, 1]}
+
+
+def test_reopen_loads_results(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    log = ResultsLog(path)
+    log.plan(PLAN)
+    log.record(0, 'mim', (1., .5), [3, 1])
+    log.record(1, 'mim', (np.float64(.75), .25), np.array([2]))
+    log.close()
+
+    log = ResultsLog(path)
+    assert log.plan({'n_splits': 3, 'dataset': 'abc', 'indices': [0, 1, 2]},
+                    match=('n_splits', 'dataset')) == PLAN
+    assert log.get(0, 'mim') == ((1., .5), [3, 1])
+    assert log.get(1, 'mim') == ((.75, .25), [2])
+    assert log.get(2, 'mim') is None
+
+
+def test_resume_after_truncated_line(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    log = ResultsLog(path)
+    log.plan(PLAN)
+    log.record(0, 'mim', (1., .5), [3, 1])
+    log.close()
+    # a crash mid write leaves part of a line
+    with open(path, 'a') as f:
+        f.write('{"fold": 1, "model": "mim", "sco')
+
+    log = ResultsLog(path)
+    assert len(log) == 1
+    assert log.get(1, 'mim') is None
+    log.record(1, 'mim', (.75, .25), [2])
+    log.close()
+
+    log = ResultsLog(path)
+    assert len(log) == 2
+    assert log.get(0, 'mim') == ((1., .5), [3, 1])
+    assert log.get(1, 'mim') == ((.75, .25), [2])
+
+
+def test_plan_mismatch_raises(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    ResultsLog(path).plan(PLAN)
+    with pytest.raises(ValueError):
+        ResultsLog(path).plan(dict(PLAN, n_splits=4), match=('n_splits',))
@@ -0,0 +1,192 @@
+# test_search.py
+#
+# Developed by Liam McInroy
+
+
+import os
+
+import numpy as np
+import pytest
+
+from estimators.models.racing import RacingEvaluator
+from estimators.models.search import FloatingFeatureSearch, \
+    GeneticFeatureSearch, MIMnFeatureSearch, SimulatedAnnealingFeatureSearch
+from estimators.models.surrogate import Surrogate
+
+
+class TableClassifier:
+    """Predicts the most common label of each configuration of the support's
+    features, which is quick to fit and fits an empty support
+    """
+
+    def __init__(self, support=None):
+        self.support = support
+
+    def fit(self, X, y):
+        y = np.asarray(y).ravel()
+        labels, counts = np.unique(y, return_counts=True)
+        self.default = labels[np.argmax(counts)]
+        self.table = {}
+        for key, label in zip(self._keys(X), y):
+            self.table.setdefault(key, []).append(label)
+        self.table = {key: max(set(found), key=found.count)
+                      for key, found in self.table.items()}
+        return self
+
+    def predict(self, X):
+        return np.array([self.table.get(key, self.default)
+                         for key in self._keys(X)])
+
+    def score(self, X, y):
+        return float(np.mean(self.predict(X) == np.asarray(y).ravel()))
+
+    def _keys(self, X):
+        return [tuple(row) for row in np.asarray(X)[:, list(self.support)]]
+
+
+@pytest.fixture
+def dataset():
+    rng = np.random.RandomState(0)
+    X = rng.randint(0, 3, (120, 8))
+    y = (X[:, 1] + X[:, 4] > 2).astype(int)
+    y[rng.rand(120) < .05] ^= 1
+    return X, y
+
+
+@pytest.mark.parametrize('n_features', [1, 5, 63, 64, 65, 130])
+def test_pack_unpack_roundtrip(n_features):
+    rng = np.random.default_rng(0)
+    bits = rng.random((7, n_features)) < .5
+    search = GeneticFeatureSearch()
+    genomes = search._pack(bits)
+    assert genomes.dtype == np.dtype('<u8')
+    assert genomes.shape == (7, -(-n_features // 64))
+    np.testing.assert_array_equal(search._unpack(genomes, n_features), bits)
+    assert search._support(genomes[2], n_features) == \
+        np.flatnonzero(bits[2]).tolist()
+
+
+@pytest.mark.parametrize('n_features', [1, 3, 70])
+def test_offspring_supports_are_valid(n_features):
+    rng = np.random.default_rng(0)
+    search = GeneticFeatureSearch(crossover_proba=1.,
+                                  crossover_independent_proba=.5,
+                                  mutation_proba=1.,
+                                  mutation_independent_proba=.5)
+    genomes = search._repair(search._pack(rng.random((40, n_features)) < .3),
+                             n_features, rng)
+    for _ in range(20):
+        for genomes in (search._crossover(genomes, n_features, rng),
+                        search._mutate(genomes, n_features, rng)):
+            bits = np.unpackbits(genomes.view(np.uint8), axis=1,
+                                 bitorder='little')
+            # no bits past the features, and at least one feature
+            assert not np.any(bits[:, n_features:])
+            assert np.all(np.any(bits[:, :n_features], axis=1))
+
+
+def test_seeded_search_is_reproducible(dataset):
+    X, y = dataset
+    supports = [GeneticFeatureSearch(TableClassifier, population=8,
+                                     generations=4, cv=3, random_state=3)
+                .search(X, y).support for _ in range(2)]
+    assert supports[0] == supports[1]
+    assert {1, 4} <= set(supports[0])
+
+
+@pytest.mark.parametrize('direction', ['forward', 'backward'])
+@pytest.mark.parametrize('raced', [False, True])
+def test_floating_search_finds_the_informative_features(dataset, direction,
+                                                        raced):
+    X, y = dataset
+    # the training accuracy only grows with more features, so without
+    # racing (cross validation) the support must be limited
+    search = FloatingFeatureSearch(
+            TableClassifier, direction=direction,
+            max_features=None if raced else 2,
+            racing=RacingEvaluator(cv=5) if raced else None)
+    assert sorted(search.search(X, y).support) == [1, 4]
+    assert search.n_evals > 0
+
+
+class RecordingSurrogate(Surrogate):
+    """A surrogate which remembers the supports it was given
+    """
+
+    def reset(self, stats):
+        super().reset(stats)
+        self.observed = []
+
+    def observe(self, supports, scores):
+        self.observed.extend(supports)
+        super().observe(supports, scores)
+
+
+@pytest.mark.parametrize('make', [
+    lambda racing, surrogate: SimulatedAnnealingFeatureSearch(
+        TableClassifier, iterations=15, random_state=0, racing=racing,
+        surrogate=surrogate),
+    lambda racing, surrogate: SimulatedAnnealingFeatureSearch(
+        TableClassifier, iterations=8, n_chains=3, random_state=0,
+        racing=racing, surrogate=surrogate),
+    lambda racing, surrogate: GeneticFeatureSearch(
+        TableClassifier, population=8, generations=3, random_state=0,
+        racing=racing, surrogate=surrogate)],
+    ids=['annealing', 'tempering', 'genetic'])
+def test_surrogate_only_observes_completed_races(dataset, make):
+    X, y = dataset
+    racing = RacingEvaluator(cv=5, min_folds=2, confidence=.8)
+    surrogate = RecordingSurrogate(min_history=5)
+    make(racing, surrogate).search(X, y)
+    assert len(racing.eliminations) > 0
+    assert len(surrogate.observed) > 0
+    assert all(racing.completed(support) for support in surrogate.observed)
+
+
+SEARCHERS = {
+    'annealing': lambda **kwargs: SimulatedAnnealingFeatureSearch(
+        TableClassifier, iterations=20, random_state=3, **kwargs),
+    'tempering': lambda **kwargs: SimulatedAnnealingFeatureSearch(
+        TableClassifier, iterations=10, n_chains=3, random_state=3,
+        **kwargs),
+    'genetic': lambda **kwargs: GeneticFeatureSearch(
+        TableClassifier, population=6, generations=5, cv=3, random_state=3,
+        **kwargs),
+    'mimn': lambda **kwargs: MIMnFeatureSearch(TableClassifier, 1, 6,
+                                               **kwargs),
+    'floating': lambda **kwargs: FloatingFeatureSearch(
+        TableClassifier, max_features=4, **kwargs),
+    'raced annealing': lambda **kwargs: SimulatedAnnealingFeatureSearch(
+        TableClassifier, iterations=20, random_state=3,
+        racing=RacingEvaluator(cv=4), **kwargs),
+}
+
+
+@pytest.mark.parametrize('name', list(SEARCHERS))
+def test_resumed_search_matches_uninterrupted(dataset, tmp_path, name):
+    X, y = dataset
+    make = SEARCHERS[name]
+    expected = make().search(X, y).support
+    assert all(type(f) is int for f in expected)
+
+    checkpoint = str(tmp_path / 'search.pkl')
+    stopped = make(max_evals=5, checkpoint=checkpoint)
+    stopped.search(X, y)
+    assert stopped.stopped
+    assert os.path.exists(stopped._checkpoint_path())
+
+    resumed = make(checkpoint=checkpoint)
+    assert list(resumed.search(X, y).support) == list(expected)
+    assert resumed.n_evals > 5
+    # the checkpoint of a completed search is removed
+    assert not resumed.stopped
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_annealing_supports_are_ints(dataset):
+    X, y = dataset
+    # with one iteration, the support is the random initial state
+    support = SimulatedAnnealingFeatureSearch(
+        TableClassifier, iterations=1, random_state=3).search(X, y).support
+    assert len(support) > 0
+    assert all(type(f) is int for f in support)
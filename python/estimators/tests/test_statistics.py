@@ -0,0 +1,147 @@
+# test_statistics.py
+#
+# Developed by Liam McInroy
+
+
+import numpy as np
+import pytest
+
+from estimators.models.statistics import SufficientStatistics
+
+
+MISSING = ('None',)
+
+
+@pytest.fixture
+def dataset():
+    rng = np.random.RandomState(0)
+    X = rng.randint(0, 3, (60, 4)).astype(str)
+    X[::9, 1] = 'None'
+    y = rng.randint(0, 2, 60)
+    return X, y
+
+
+def counts(stats, features):
+    """The nonzero counts of the joint table of the features with the label,
+    by their values, so that statistics with different vocabularies compare
+    """
+    table = stats.joint_counts(features)
+    vocabularies = [stats.encoder.vocabularies[j] for j in features] + \
+        [stats.classes]
+    return {tuple(vocab[i] for vocab, i in zip(vocabularies, index)):
+            int(table[index]) for index in zip(*np.nonzero(table))}
+
+
+def tables(stats):
+    """The counts of every single feature and pair of features
+    """
+    n_features = stats.codes.shape[1]
+    return {features: counts(stats, features)
+            for features in [(j,) for j in range(n_features)] +
+            [(i, j) for i in range(n_features)
+             for j in range(i + 1, n_features)]}
+
+
+def test_excluding_matches_fresh_counts(dataset):
+    X, y = dataset
+    stats = SufficientStatistics(X, y, missing_values=MISSING)
+    # memoized before excluding, so the fold derives from them
+    tables(stats)
+    excluded = np.arange(10, 22)
+    fold = stats.excluding(excluded)
+    remaining = np.setdiff1d(np.arange(len(y)), excluded)
+    fresh = SufficientStatistics(X[remaining], y[remaining],
+                                 missing_values=MISSING)
+    assert tables(fold) == tables(fresh)
+    assert fold.n_samples == len(remaining)
+    # the full statistics are left as they were
+    assert tables(stats) == tables(SufficientStatistics(
+        X, y, missing_values=MISSING))
+
+
+def test_excluding_feature_label_tables(dataset):
+    X, y = dataset
+    stats = SufficientStatistics(X, y, missing_values=MISSING)
+    stats.feature_label_tables()
+    fold = stats.excluding(np.arange(0, 60, 4))
+    remaining = np.setdiff1d(np.arange(len(y)), np.arange(0, 60, 4))
+    fresh = SufficientStatistics(X[remaining], y[remaining],
+                                 missing_values=MISSING)
+    np.testing.assert_array_equal(fold.feature_label_tables(),
+                                  fresh.feature_label_tables())
+
+
+def test_update_matches_fresh_counts(dataset):
+    X, y = dataset
+    stats = SufficientStatistics(X[:40], y[:40], missing_values=MISSING)
+    tables(stats)
+    stats.feature_label_tables()
+    updated = stats.update(X[40:], y[40:], X[:20], y[:20])
+    fresh = SufficientStatistics(X[20:], y[20:], missing_values=MISSING)
+    assert tables(updated) == tables(fresh)
+    np.testing.assert_array_equal(updated.feature_label_tables(),
+                                  fresh.feature_label_tables())
+    np.testing.assert_array_equal(updated.cardinalities, fresh.cardinalities)
+    assert updated.n_samples == fresh.n_samples
+
+
+def test_update_recounts_a_removed_category(dataset):
+    X, y = dataset
+    X = X.copy()
+    X[:5, 0] = '7'
+    stats = SufficientStatistics(X[:40], y[:40], missing_values=MISSING)
+    tables(stats)
+    updated = stats.update(X[40:], y[40:], X[:10], y[:10])
+    fresh = SufficientStatistics(X[10:], y[10:], missing_values=MISSING)
+    assert '7' not in updated.encoder.vocabularies[0]
+    assert tables(updated) == tables(fresh)
+    np.testing.assert_array_equal(updated.cardinalities, fresh.cardinalities)
+
+
+def test_update_of_excluded_statistics_raises(dataset):
+    X, y = dataset
+    fold = SufficientStatistics(X, y).excluding([0, 1])
+    with pytest.raises(ValueError):
+        fold.update(X[:2], y[:2], X[2:4], y[2:4])
+
+
+def brute_force_match(stats, X, y):
+    """The first unmatched active row equal to each row, in turn
+    """
+    rows = [i for i in np.flatnonzero(stats.active)]
+    decoded = stats._decode(np.arange(len(stats.labels)))
+    indices = []
+    for row, label in zip(np.asarray(X).astype(str), np.asarray(y)):
+        i = next(i for i in rows if (decoded[i] == row).all() and
+                 stats.classes[stats.labels[i]] == str(label))
+        rows.remove(i)
+        indices.append(i)
+    return indices
+
+
+@pytest.mark.parametrize('n_features', [4, 40])
+def test_match_pairs_duplicates_in_order(n_features):
+    # 40 features of 3 values don't fit in an integer key
+    rng = np.random.RandomState(n_features)
+    X = rng.randint(0, 2, (80, n_features)).astype(str)
+    X[:, 0] = rng.choice(['0', '1', 'None'], 80)
+    X[40:, 1:] = X[0, 1:]
+    y = rng.randint(0, 2, 80)
+    stats = SufficientStatistics(X, y, missing_values=MISSING)
+    stats.remove(np.arange(0, 80, 7))
+
+    rows = rng.permutation(np.flatnonzero(stats.active))[:30]
+    assert stats.match(X[rows], y[rows]).tolist() == \
+        brute_force_match(stats, X[rows], y[rows])
+
+
+def test_match_raises_for_rows_which_are_not_active(dataset):
+    X, y = dataset
+    stats = SufficientStatistics(X, y, missing_values=MISSING)
+    stats.remove([5])
+    with pytest.raises(ValueError):
+        stats.match(X[[5]], y[[5]])
+    with pytest.raises(ValueError):
+        stats.match(X[[4] * 60], y[[4] * 60])
+    with pytest.raises(ValueError):
+        stats.match(X[[4]], [7])
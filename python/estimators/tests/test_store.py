@@ -0,0 +1,47 @@
+# test_store.py
+#
+# Developed by Liam McInroy
+
+
+import numpy as np
+import pytest
+
+from estimators.models.mim import MIM, MIMGenerator
+from estimators.models.store import ScoreStore
+
+
+def test_nested_configs_have_different_keys():
+    store = ScoreStore()
+    dataset = store.fingerprint(np.zeros((2, 3)), np.zeros(2))
+    keys = [store.key(dataset, store.identity(estimator), [0, 2], 3, 'cv')
+            for estimator in (MIMGenerator(estimator=MIMGenerator(n=2)),
+                              MIMGenerator(estimator=MIMGenerator(n=3)),
+                              MIM(estimator=MIMGenerator(n=2), n=None),
+                              MIM(estimator=MIMGenerator(n=3), n=None))]
+    assert len(set(keys)) == 4
+    assert store.identity(MIMGenerator(estimator=MIMGenerator(n=2))) == \
+        store.identity(MIMGenerator(estimator=MIMGenerator(n=2)))
+
+
+def test_nested_bayes_net_configs_have_different_identities():
+    bayesian = pytest.importorskip('estimators.models.bayesian')
+    store = ScoreStore()
+    identities = [store.identity(MIMGenerator(
+                      estimator=bayesian.BayesNetGenerator(**kwargs)))
+                  for kwargs in ({}, {'compiled': True},
+                                 {'structure_algorithm': 'branch-and-bound',
+                                  'max_parents': 2})]
+    assert len(set(identities)) == 3
+
+
+def test_scores_persist(tmp_path):
+    path = str(tmp_path / 'scores.sqlite')
+    store = ScoreStore(path=path)
+    key = store.key('data', store.identity(MIMGenerator()), [1], 4, 'cv')
+    assert store.get(key) is None
+    store.put(key, .75)
+    store.close()
+
+    store = ScoreStore(path=path)
+    assert store.get(key) == .75
+    assert (store.hits, store.misses) == (1, 0)
@@ -0,0 +1,89 @@
+# test_structure.py
+#
+# Developed by Liam McInroy
+
+
+import itertools
+
+import numpy as np
+import pytest
+
+from estimators.models.statistics import SufficientStatistics
+from estimators.models.structure import LabelParentSearch, StructureCache
+
+
+def bic(X, y, parents):
+    """The BIC score of the label's node with the parents, counted from
+    the samples directly
+    """
+    n_classes = len(np.unique(y))
+    configs = np.unique(X[:, list(parents)], axis=0,
+                        return_inverse=True)[1].ravel() \
+        if len(parents) > 0 else np.zeros(len(y), dtype=int)
+    log_likelihood = 0.
+    for config in np.unique(configs):
+        counts = np.unique(y[configs == config], return_counts=True)[1]
+        log_likelihood += np.sum(counts * np.log(counts / counts.sum()))
+    n_params = (n_classes - 1) * np.prod([len(np.unique(X[:, f]))
+                                          for f in parents])
+    return log_likelihood - np.log(len(y)) / 2. * n_params
+
+
+@pytest.mark.parametrize('max_parents', [1, 2, 3, 4])
+@pytest.mark.parametrize('seed', range(5))
+def test_search_matches_brute_force(max_parents, seed):
+    rng = np.random.RandomState(seed)
+    X = rng.randint(0, 4, (200, 7))
+    X[:, 5:] = rng.randint(0, 2, (200, 2))
+    noise = rng.rand(200) < .2
+    y = ((X[:, 1] + X[:, 3 + seed % 3] > 3) ^ noise).astype(int)
+    features = list(range(X.shape[1]))
+
+    search = LabelParentSearch(max_parents=max_parents)
+    best = search.search(SufficientStatistics(X, y), features)
+    expected = max(bic(X, y, parents)
+                   for k in range(max_parents + 1)
+                   for parents in itertools.combinations(features, k))
+    assert search.completed
+    # so that the bound is what's tested
+    assert search.n_pruned > 0 or max_parents < 3
+    assert len(best) <= max_parents
+    assert bic(X, y, best) == pytest.approx(expected)
+
+
+def test_warm_start_finds_the_same_parents():
+    rng = np.random.RandomState(0)
+    X = rng.randint(0, 3, (150, 6))
+    y = (X[:, 0] + X[:, 2] > 2).astype(int)
+    stats = SufficientStatistics(X, y)
+    best = LabelParentSearch(max_parents=3).search(stats, range(6))
+    assert LabelParentSearch(max_parents=3).search(
+        stats, range(6), initial=(1, 4)) == best
+
+
+def test_cache_returns_the_same_structure(tmp_path):
+    rng = np.random.RandomState(0)
+    codes = rng.randint(0, 3, (20, 3))
+    labels = rng.randint(0, 2, 20)
+    vocabularies = [['0', '1', '2']] * 3
+    cache = StructureCache(directory=str(tmp_path))
+    key = cache.key([4, 7, 9], codes, labels, vocabularies, ('exact',))
+    assert cache.get(key) is None
+    cache.put(key, (7, 9), 2.)
+    assert cache.get(key) == (7, 9)
+    assert (cache.hits, cache.misses, cache.time_saved) == (1, 1, 2.)
+
+    # the same data has the same key, and is shared through the directory
+    other = StructureCache(directory=str(tmp_path))
+    assert other.get(cache.key([4, 7, 9], codes.copy(), labels,
+                               vocabularies, ('exact',))) == (7, 9)
+    assert cache.get(cache.key([4, 7, 9], codes, 1 - labels,
+                               vocabularies, ('exact',))) is None
+
+
+def test_cache_only_warm_starts_an_incomplete_search():
+    cache = StructureCache()
+    key = cache.key([0, 1], np.zeros((4, 2)), np.zeros(4), [['0']] * 2)
+    cache.put(key, (1,), 1., completed=False)
+    assert cache.get(key) is None
+    assert cache.warm_start(key) == (1,)
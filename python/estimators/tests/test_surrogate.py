@@ -0,0 +1,100 @@
+# test_surrogate.py
+#
+# Developed by Liam McInroy
+
+
+import numpy as np
+import pytest
+
+from sklearn.linear_model import Ridge
+from sklearn.metrics import mutual_info_score
+from sklearn.naive_bayes import CategoricalNB
+
+from estimators.models.statistics import SufficientStatistics
+from estimators.models.surrogate import Surrogate
+
+
+@pytest.fixture
+def dataset():
+    rng = np.random.RandomState(0)
+    X = rng.randint(0, 3, (150, 8))
+    y = (X[:, 1] + X[:, 4] > 2).astype(int)
+    y[rng.rand(150) < .1] ^= 1
+    return X, y
+
+
+def surrogate(X, y, **kwargs):
+    surrogate = Surrogate(**kwargs)
+    surrogate.reset(SufficientStatistics(X, y))
+    return surrogate
+
+
+def test_mrmr_proxy(dataset):
+    X, y = dataset
+    support = [1, 3, 4]
+    redundancy = sum(mutual_info_score(X[:, support[i]], X[:, support[j]])
+                     for i in range(3) for j in range(i))
+    expected = sum(mutual_info_score(X[:, f], y) for f in support) - \
+        redundancy / 3
+    assert surrogate(X, y)._proxy(support) == pytest.approx(expected)
+
+
+def test_naive_bayes_proxy(dataset):
+    X, y = dataset
+    support = [1, 4, 6]
+    labels = np.bincount(y)
+    model = CategoricalNB(alpha=1.,
+                          class_prior=(labels + 1.) / (labels.sum() + 2))
+    expected = model.fit(X[:, support], y).score(X[:, support], y)
+    assert surrogate(X, y, proxy='naive-bayes')._proxy(support) == \
+        pytest.approx(expected)
+
+
+def test_online_model_is_ridge(dataset):
+    X, y = dataset
+    rng = np.random.RandomState(1)
+    model = surrogate(X, y, alpha=2., min_history=5)
+    supports = [np.flatnonzero(rng.rand(8) < .5).tolist() for _ in range(30)]
+    scores = rng.rand(30)
+    model.observe(supports[:10], scores[:10])
+    model.observe(supports[10:], scores[10:])
+
+    features = model._features(supports)
+    ridge = Ridge(alpha=2.).fit(features[:, :-1], scores)
+    np.testing.assert_allclose(model._coefficients(),
+                               np.append(ridge.coef_, ridge.intercept_),
+                               atol=1e-8)
+    # only the second batch was predicted, once min_history were seen
+    assert model.calibration()['n'] == 20
+
+
+def test_ranking_is_learned(dataset):
+    X, y = dataset
+    rng = np.random.RandomState(2)
+
+    def score(support):
+        # the informative features help, and every other one hurts
+        return len({1, 4} & set(support)) - .1 * len(support)
+
+    model = surrogate(X, y, min_history=20)
+    supports = [np.flatnonzero(rng.rand(8) < .5).tolist() for _ in range(60)]
+    model.observe(supports, [score(s) for s in supports])
+
+    candidates = [[0, 2, 3, 5], [1], [1, 4], [4, 6, 7], [0, 1, 2, 3, 4, 5]]
+    assert candidates[model.screen(candidates, 1)[0]] == [1, 4]
+    predicted = model.predict(candidates)
+    actual = [score(s) for s in candidates]
+    assert np.corrcoef(np.argsort(np.argsort(predicted)),
+                       np.argsort(np.argsort(actual)))[0, 1] > .8
+
+
+def test_calibration(dataset):
+    X, y = dataset
+    model = surrogate(X, y)
+    assert model.calibration()['n'] == 0
+    model.predictions = [(.5, .4), (.7, .8), (.9, .9)]
+    calibration = model.calibration()
+    assert calibration['n'] == 3
+    assert calibration['mae'] == pytest.approx(.2 / 3)
+    assert calibration['bias'] == pytest.approx(0.)
+    assert calibration['spearman'] == pytest.approx(1.)